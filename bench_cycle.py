@@ -0,0 +1,91 @@
+"""
+End-to-end cycle benchmark against the local fake NSE server (fake_nse_server.py).
+
+Starts the fake server in-process, points the monitor at it (NSE_HOME_URL), and drives
+run_cycle() — expiry lookup, fetch, decode, StrikeChain, oi_ticks write, baseline,
+alerts — back to back with simulated poll times from 09:18 IST, with Telegram and
+Gemini disabled and a throwaway SQLite file. Reports cycles/sec, cycle latency
+percentiles and mean time per stage (the monitor's own span metrics), plus what the
+server saw.
+
+Usage:
+    python bench_cycle.py --cycles 300 --strikes 200
+    python bench_cycle.py --cycles 100 --snapshot-seconds 0.5
+    python bench_cycle.py --cycles 200 --latency-ms 80 --jitter-ms 40 --p-401 0.05 --p-timeout 0.02 --hang-seconds 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fake_nse_server import FakeNSE, PayloadSource, add_fault_args, faults_from_args
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark full monitor cycles against a fake NSE server.")
+    parser.add_argument("--cycles", type=int, default=300)
+    parser.add_argument("--deadline", type=float, default=20.0, help="FETCH_DEADLINE_SECONDS for the run")
+    parser.add_argument("--verbose", action="store_true", help="show the monitor's own log output")
+    add_fault_args(parser)
+    args = parser.parse_args(argv)
+
+    fake = FakeNSE(
+        0, faults_from_args(args),
+        PayloadSource(args.strikes, args.payloads, snapshot_seconds=args.snapshot_seconds),
+    )
+    base_url = fake.start()
+    tmpdir = tempfile.mkdtemp(prefix="oi-bench-")
+
+    # The monitor reads these at import time
+    os.environ["NSE_HOME_URL"] = base_url
+    os.environ.pop("NSE_API_URL", None)
+    os.environ["DB_FILE"] = os.path.join(tmpdir, "bench.db")
+    os.environ["FETCH_DEADLINE_SECONDS"] = str(args.deadline)
+    os.environ["PAYLOAD_ARCHIVE_DIR"] = os.path.join(tmpdir, "payload_archive")
+    for key in ("TELEGRAM_TOKEN", "TELEGRAM_CHAT_ID", "GEMINI_API_KEY"):
+        os.environ.pop(key, None)
+    import nifty_oi_monitor as mon
+
+    mon.init_db()
+    if not args.verbose:
+        # Still format and write every record, just not to the terminal
+        mon.configure_logging(stream=open(os.devnull, "w"))
+    start = datetime.now(mon.IST).replace(hour=9, minute=18, second=0, microsecond=0)
+    latencies = []
+    completed = 0
+    t_start = time.perf_counter()
+    for k in range(args.cycles):
+        now_ist = start + timedelta(seconds=k * mon.POLL_INTERVAL_SECONDS)
+        t0 = time.perf_counter()
+        completed += mon.run_cycle(now_ist)
+        latencies.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - t_start
+    fake.stop()
+    mon.payload_archive.drain()
+
+    ordered = sorted(latencies)
+    percentile = mon.percentile
+    print(f"Fake NSE: {args.strikes} strikes, latency {args.latency_ms}±{args.jitter_ms} ms, "
+          f"p401={args.p_401} p403={args.p_403} ptimeout={args.p_timeout} pmalformed={args.p_malformed}")
+    print(f"Cycles       : {args.cycles} ({completed} reached alert evaluation, {args.cycles - completed} cut short)")
+    print(f"Throughput   : {args.cycles / wall:.1f} cycles/sec ({wall:.2f}s wall)")
+    print(
+        f"Cycle latency: p50 {percentile(ordered, 50) * 1000:.1f} ms | "
+        f"p90 {percentile(ordered, 90) * 1000:.1f} ms | p99 {percentile(ordered, 99) * 1000:.1f} ms | "
+        f"max {ordered[-1] * 1000:.1f} ms"
+    )
+    stages = mon.metrics.stage_stats()
+    print("Stage means  : " + " | ".join(
+        f"{stage} {total / n * 1000:.1f} ms" for stage, (n, total) in stages.items() if n and stage != "cycle"
+    ))
+    print(f"Server saw   : {fake.stats}")
+    print(f"Unchanged    : {sum(state.unchanged_skips for state in mon.get_symbol_states())} chain payloads skipped")
+    print(f"NSE session  : {mon.nse_session.stats_str()}")
+    print(f"Archive      : {mon.payload_archive.stats_str()} in {mon.payload_archive.directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Compare decode_option_chain() against the old resp.json() path: parse time and peak memory.
+
+Usage:
+    python bench_decoder.py                       # synthetic payloads (200 strikes x 1 and 6 expiries)
+    python bench_decoder.py saved_payload.json    # a recorded NSE response
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+from nifty_oi_monitor import decode_option_chain
+from nse_fixtures import synthetic_expiries, synthetic_option_chain
+
+
+def measure(fn, raw: bytes, repeat: int = 5) -> tuple[float, float, object]:
+    """Returns (best parse time ms, peak traced allocation MiB while parsing and holding the result, result)."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(raw)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    result = fn(raw)
+    _, peak = tracemalloc.get_traced_memory()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / 2**20, (result, retained / 2**20)
+
+
+def compare(label: str, raw: bytes):
+    full_ms, full_peak, (_, full_kept) = measure(json.loads, raw)
+    lean_ms, lean_peak, (_, lean_kept) = measure(decode_option_chain, raw)
+    print(f"{label}: payload {len(raw) / 2**20:.2f} MiB")
+    print(f"  {'path':<22}{'parse ms':>10}{'peak MiB':>10}{'retained MiB':>14}")
+    print(f"  {'json.loads (old)':<22}{full_ms:>10.1f}{full_peak:>10.2f}{full_kept:>14.2f}")
+    print(f"  {'decode_option_chain':<22}{lean_ms:>10.1f}{lean_peak:>10.2f}{lean_kept:>14.2f}")
+
+
+def main(argv: list[str]):
+    if argv:
+        for path in argv:
+            with open(path, "rb") as f:
+                compare(path, f.read())
+        return
+    for n_expiries in (1, 6):
+        payload = synthetic_option_chain(n_strikes=200, expiries=synthetic_expiries(n_expiries))
+        compare(f"synthetic 200 strikes x {n_expiries} expiries", json.dumps(payload).encode())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,222 @@
+"""
+Micro-benchmarks for the per-cycle hot path across chain sizes, with a saved baseline.
+
+Each case is a synthetic option-chain payload (nse_fixtures.py) of N strikes for E expiries.
+Per case, every function is timed (best and median per call over several repeats) and run
+once under tracemalloc for its peak allocation. Results can be saved as a JSON baseline and
+later runs compared against it; anything slower or hungrier than the tolerance is flagged
+and the exit status is 1.
+
+Functions covered: decode_option_chain, build_strike_map (which now also yields spot and
+step — the old get_spot_price_and_step), find_atm_strike, evaluate_cycle over the full
+chain, check_alerts over the live strike window, OIVelocityTracker.update and
+evaluate_velocity over a full ring, chain_levels (prefix-sum max pain and OI walls) over
+the full chain, store/load_baseline_snapshot and store_tick_snapshot. DB work goes to a throwaway SQLite file; Telegram/Gemini are disabled.
+
+Usage:
+    python bench_hot_path.py --save bench_baseline.json
+    python bench_hot_path.py --compare bench_baseline.json
+    python bench_hot_path.py --strikes 100 1000 --expiries 1 --repeat 3
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from nse_fixtures import evolve_chain, synthetic_expiries, synthetic_option_chain
+
+# The monitor reads these at import time
+os.environ["DB_FILE"] = os.path.join(tempfile.mkdtemp(prefix="oi-bench-"), "bench.db")
+for _key in ("TELEGRAM_TOKEN", "TELEGRAM_CHAT_ID", "GEMINI_API_KEY"):
+    os.environ.pop(_key, None)
+
+import numpy as np  # noqa: E402
+
+import nifty_oi_monitor as mon  # noqa: E402
+
+MIN_RUN_SECONDS = 0.05
+
+
+def time_call(fn, repeat: int) -> tuple[float, float]:
+    """(best, median) seconds per call; each repeat loops enough calls to run >= MIN_RUN_SECONDS."""
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= MIN_RUN_SECONDS or number >= 1 << 20:
+            break
+        number *= 10 if elapsed < MIN_RUN_SECONDS / 10 else 2
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) / number)
+    return min(samples), statistics.median(samples)
+
+
+def peak_alloc(fn) -> float:
+    """Peak traced allocation (KiB) during one call."""
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def case_functions(n_strikes: int, n_expiries: int) -> dict:
+    """name -> zero-argument callable for one chain size, with all inputs prepared up front."""
+    expiries = synthetic_expiries(n_expiries)
+    expiry = expiries[0]
+    base_payload = synthetic_option_chain(n_strikes, expiries=expiries)
+    curr_payload = evolve_chain(base_payload, seed=1, drift=3.0)
+    raw = json.dumps(curr_payload).encode()
+    decoded = mon.decode_option_chain(raw)
+    current = mon.build_strike_map(decoded)
+    baseline = mon.build_strike_map(mon.decode_option_chain(json.dumps(base_payload).encode()))
+    strike_list = current.strikes.tolist()
+    spot, step = current.spot, current.step
+    atm = mon.find_atm_strike(spot, strike_list)
+    now_ist = datetime.now(mon.IST).replace(hour=10, minute=15, second=0, microsecond=0)
+    trading_date = now_ist.date().isoformat()
+    full_chain = mon.AlertConfig(full_chain=True)
+    state = mon.get_symbol_states()[0]
+    symbol = state.symbol
+    mon.store_baseline_snapshot(trading_date, symbol, expiry, now_ist, baseline)
+
+    def evaluate_full_chain():
+        mon.evaluate_cycle(current, baseline, atm, step, trading_date, {}, full_chain)
+
+    windows = (300, 900, 1800)
+    tracker = mon.OIVelocityTracker(windows, mon.velocity_capacity(windows))
+    t0 = now_ist.timestamp()
+    for k in range(tracker.capacity):
+        tracker.update(t0 + 15 * k, baseline if k % 2 else current)
+    monitored = current.strike_array()
+    velocity_config = mon.AlertConfig(velocity_windows=((5, 25.0), (15, 40.0), (30, 60.0)))
+    t_next = [t0 + 15 * tracker.capacity]
+
+    def velocity_update():
+        tracker.update(t_next[0], current)
+        t_next[0] += 15
+
+    def check_alerts():
+        state.alert_active = {}  # same alerts fire on every call
+        mon.check_alerts(state, spot, current, baseline, atm, step, now_ist, trading_date, expiry)
+
+    return {
+        "decode_option_chain": lambda: mon.decode_option_chain(raw),
+        "build_strike_map": lambda: mon.build_strike_map(decoded),
+        "find_atm_strike": lambda: mon.find_atm_strike(spot, strike_list),
+        "evaluate_cycle[full]": evaluate_full_chain,
+        "check_alerts": check_alerts,
+        "chain_levels": lambda: mon.chain_levels(current, spot),
+        "velocity_update": velocity_update,
+        "evaluate_velocity[full]": lambda: mon.evaluate_velocity(
+            tracker, monitored, trading_date, {}, velocity_config
+        ),
+        "store_baseline_snapshot": lambda: mon.store_baseline_snapshot(
+            trading_date, symbol, expiry, now_ist, baseline
+        ),
+        "load_baseline_snapshot": lambda: mon.load_baseline_snapshot(trading_date, symbol, expiry),
+        "store_tick_snapshot": lambda: mon.store_tick_snapshot(trading_date, symbol, expiry, now_ist, current),
+    }
+
+
+def run(sizes: list[int], expiry_counts: list[int], repeat: int) -> dict:
+    results = {}
+    for n_expiries in expiry_counts:
+        for n_strikes in sizes:
+            case = f"{n_strikes}x{n_expiries}"
+            print(f"Case {case} (strikes x expiries)...", file=sys.stderr)
+            fns = case_functions(n_strikes, n_expiries)
+            for name, fn in fns.items():
+                best, median = time_call(fn, repeat)
+                results[f"{name}[{case}]"] = {
+                    "best_us": round(best * 1e6, 2),
+                    "median_us": round(median * 1e6, 2),
+                    "peak_kib": round(peak_alloc(fn), 1),
+                }
+    return results
+
+
+def print_results(results: dict, baseline: dict | None = None):
+    print(f"{'benchmark':<44}{'best us':>12}{'median us':>12}{'peak KiB':>11}" + ("   vs baseline" if baseline else ""))
+    for key, r in results.items():
+        line = f"{key:<44}{r['best_us']:>12.1f}{r['median_us']:>12.1f}{r['peak_kib']:>11.1f}"
+        old = (baseline or {}).get(key)
+        if old:
+            line += f"   time x{r['best_us'] / max(old['best_us'], 1e-9):.2f}, mem x{r['peak_kib'] / max(old['peak_kib'], 1e-9):.2f}"
+        print(line)
+
+
+def regressions(results: dict, baseline: dict, time_tol: float, mem_tol: float) -> list[str]:
+    """Benchmarks whose best time or peak allocation grew by more than the tolerance."""
+    found = []
+    for key, r in results.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        # Sub-5us differences are timer and scheduler noise, not regressions
+        if r["best_us"] > old["best_us"] * (1 + time_tol) and r["best_us"] - old["best_us"] > 5:
+            found.append(f"{key}: {old['best_us']:.1f} -> {r['best_us']:.1f} us")
+        # Ignore tiny absolute allocations where interpreter noise dominates
+        if r["peak_kib"] > old["peak_kib"] * (1 + mem_tol) and r["peak_kib"] - old["peak_kib"] > 16:
+            found.append(f"{key}: {old['peak_kib']:.1f} -> {r['peak_kib']:.1f} KiB peak")
+    return found
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Hot-path micro-benchmarks across chain sizes.")
+    parser.add_argument("--strikes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--expiries", type=int, nargs="+", default=[1, 4], help="expiries per payload")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", metavar="FILE", help="write results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a saved baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--mem-tolerance", type=float, default=0.10, help="allowed peak allocation growth")
+    args = parser.parse_args(argv)
+
+    mon.init_db()
+    # Log records are still created for enabled levels; only the writing is silenced
+    mon.configure_logging(stream=open(os.devnull, "w"))
+    results = run(args.strikes, args.expiries, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "saved_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if baseline is not None:
+        found = regressions(results, baseline, args.time_tolerance, args.mem_tolerance)
+        if found:
+            print(f"\n{len(found)} regression(s) vs {args.compare}:")
+            for line in found:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions vs {args.compare}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Local stand-in for the NSE option-chain-v3 API, for offline runs and load tests.
+
+Serves the homepage cookie warmup at "/" and option-chain payloads at
+"/api/option-chain-v3" — synthetic chains (nse_fixtures.py) whose OI drifts on every
+request (or, with --snapshot-seconds, only once per refresh interval, the same snapshot
+and records.timestamp being served again in between, as NSE does), or recorded payload
+files replayed in order. Faults can be injected:
+added latency, 401/403 responses, hung requests (client timeouts) and truncated JSON.
+Like NSE, API calls without the warmup cookies get a 401.
+
+Usage:
+    python fake_nse_server.py --port 8765 --strikes 200 --latency-ms 80 --p-401 0.02 --p-timeout 0.01
+    NSE_HOME_URL=http://127.0.0.1:8765 python -u nifty_oi_monitor.py
+    NSE_HOME_URL=http://127.0.0.1:8765 python test_expiry_helper.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from nse_fixtures import evolve_chain, synthetic_expiries, synthetic_option_chain
+
+
+@dataclass
+class FaultConfig:
+    latency_ms: float = 0.0          # added to every API response
+    jitter_ms: float = 0.0           # uniform +/- jitter on top of latency_ms
+    p_401: float = 0.0               # probability of a 401 (cookies rejected)
+    p_403: float = 0.0               # probability of a 403 (blocked)
+    p_timeout: float = 0.0           # probability of hanging for hang_seconds before answering
+    hang_seconds: float = 30.0
+    p_malformed: float = 0.0         # probability of a truncated JSON body
+    cookie_max_age: int = 600        # Max-Age of the warmup cookies
+    seed: int | None = None
+    rng: random.Random = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+
+
+class PayloadSource:
+    """
+    Payload bytes per (symbol, expiry). Synthetic chains evolve on every call, or at most once
+    per `snapshot_seconds`; each new snapshot gets a later records.timestamp. Recorded files cycle.
+    """
+
+    def __init__(self, n_strikes: int = 200, recorded: list[str] | None = None, seed: int = 0,
+                 snapshot_seconds: float = 0.0):
+        self.n_strikes = n_strikes
+        self.snapshot_seconds = snapshot_seconds
+        self.expiries = synthetic_expiries(4, start=datetime.now())
+        self._recorded = []
+        for path in recorded or []:
+            with open(path, "rb") as f:
+                self._recorded.append(f.read())
+        # (symbol, expiry) -> (chain, encoded payload, records.timestamp, monotonic time taken)
+        self._chains: dict[tuple[str, str], tuple[dict, bytes, datetime, float]] = {}
+        self._calls = 0
+        self._seed = seed
+        self._lock = threading.Lock()
+
+    def payload(self, symbol: str, expiry: str | None) -> bytes:
+        with self._lock:
+            self._calls += 1
+            if self._recorded:
+                return self._recorded[(self._calls - 1) % len(self._recorded)]
+            key = (symbol, expiry or "")
+            entry = self._chains.get(key)
+            taken = time.monotonic()
+            if entry is not None and taken - entry[3] < self.snapshot_seconds:
+                return entry[1]
+            # NSE timestamps have 1s resolution; keep them strictly increasing per snapshot
+            stamp_dt = datetime.now().replace(microsecond=0)
+            if entry is None:
+                chain = synthetic_option_chain(
+                    self.n_strikes, expiries=[expiry] if expiry else self.expiries,
+                    symbol=symbol, seed=self._seed, timestamp=stamp_dt.strftime("%d-%b-%Y %H:%M:%S"),
+                )
+            else:
+                stamp_dt = max(stamp_dt, entry[2] + timedelta(seconds=1))
+                chain = evolve_chain(
+                    entry[0], seed=self._seed + self._calls, timestamp=stamp_dt.strftime("%d-%b-%Y %H:%M:%S")
+                )
+            body = json.dumps(chain).encode()
+            self._chains[key] = (chain, body, stamp_dt, taken)
+            return body
+
+
+class FakeNSE:
+    """Threaded HTTP server on 127.0.0.1; start() returns the base URL to use as NSE_HOME_URL."""
+
+    def __init__(self, port: int = 0, faults: FaultConfig | None = None, source: PayloadSource | None = None):
+        self.faults = faults or FaultConfig()
+        self.source = source or PayloadSource()
+        self.stats = {"warmups": 0, "api": 0, "401": 0, "403": 0, "timeouts": 0, "malformed": 0}
+        self._stats_lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True, name="fake-nse")
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json", headers=()):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in headers:
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path in ("", "/"):
+                    fake.count("warmups")
+                    age = fake.faults.cookie_max_age
+                    self._send(200, b"<html><body>NSE</body></html>", "text/html", [
+                        ("Set-Cookie", f"nsit=fake{time.time_ns()}; Path=/; Max-Age={age}"),
+                        ("Set-Cookie", f"nseappid=fake; Path=/; Max-Age={age}"),
+                    ])
+                    return
+                if url.path.rstrip("/") != "/api/option-chain-v3":
+                    self._send(404, b'{"error": "not found"}')
+                    return
+                self._api(parse_qs(url.query))
+
+            def _api(self, query: dict):
+                f = fake.faults
+                fake.count("api")
+                delay = f.latency_ms + (f.rng.uniform(-f.jitter_ms, f.jitter_ms) if f.jitter_ms else 0.0)
+                if delay > 0:
+                    time.sleep(delay / 1000)
+
+                if "nsit=" not in (self.headers.get("Cookie") or ""):
+                    fake.count("401")
+                    self._send(401, b'{"error": "unauthorised"}')
+                    return
+                roll = f.rng.random()
+                if roll < f.p_401:
+                    fake.count("401")
+                    self._send(401, b'{"error": "unauthorised"}')
+                    return
+                roll -= f.p_401
+                if roll < f.p_403:
+                    fake.count("403")
+                    self._send(403, b"<html>Access Denied</html>", "text/html")
+                    return
+                roll -= f.p_403
+                malformed = False
+                if roll < f.p_timeout:
+                    fake.count("timeouts")
+                    time.sleep(f.hang_seconds)
+                elif roll - f.p_timeout < f.p_malformed:
+                    fake.count("malformed")
+                    malformed = True
+
+                symbol = query.get("symbol", ["NIFTY"])[0]
+                expiry = query.get("expiry", [None])[0]
+                body = fake.source.payload(symbol, expiry)
+                if malformed:
+                    body = body[: len(body) // 2]
+                self._send(200, body)
+
+        return Handler
+
+
+def add_fault_args(p: argparse.ArgumentParser):
+    """Payload and fault-injection options, shared with bench_cycle.py."""
+    p.add_argument("--strikes", type=int, default=200, help="strikes per synthetic chain")
+    p.add_argument("--payloads", nargs="+", metavar="FILE", help="serve recorded payload files in order instead")
+    p.add_argument("--snapshot-seconds", type=float, default=0.0,
+                   help="serve the same synthetic snapshot for this long before it moves (NSE refresh interval)")
+    p.add_argument("--latency-ms", type=float, default=0.0)
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    p.add_argument("--p-401", type=float, default=0.0)
+    p.add_argument("--p-403", type=float, default=0.0)
+    p.add_argument("--p-timeout", type=float, default=0.0)
+    p.add_argument("--hang-seconds", type=float, default=30.0)
+    p.add_argument("--p-malformed", type=float, default=0.0)
+    p.add_argument("--cookie-max-age", type=int, default=600)
+    p.add_argument("--seed", type=int)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Local fake NSE option-chain-v3 server.")
+    p.add_argument("--port", type=int, default=8765)
+    add_fault_args(p)
+    return p
+
+
+def faults_from_args(args) -> FaultConfig:
+    return FaultConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, p_401=args.p_401, p_403=args.p_403,
+        p_timeout=args.p_timeout, hang_seconds=args.hang_seconds, p_malformed=args.p_malformed,
+        cookie_max_age=args.cookie_max_age, seed=args.seed,
+    )
+
+
+def main():
+    args = build_parser().parse_args()
+    fake = FakeNSE(
+        args.port, faults_from_args(args),
+        PayloadSource(args.strikes, args.payloads, snapshot_seconds=args.snapshot_seconds),
+    )
+    print(f"Fake NSE listening on {fake.base_url} (set NSE_HOME_URL to this)")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served: {fake.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,51 @@
+import time
+_MODULE_LOAD_STARTED = time.perf_counter()
+
 import os
+import sys
+import asyncio
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
 import requests
-import time
+import hashlib
+import queue
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import NamedTuple
 from datetime import datetime, time as dtime, timezone, timedelta
-from math import inf
+from math import inf, ceil, isfinite
+from collections import deque, OrderedDict
+from array import array
+from bisect import bisect_left
 import sqlite3
+import subprocess
+import importlib.util
+
+
+def _lazy_import(name: str):
+    """
+    Module object whose real import runs on first attribute access. Keeps numpy off the
+    startup path (holiday exit, startup ping) until the first alert evaluation needs it.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+np = _lazy_import("numpy")
+
+log = logging.getLogger("oi_monitor")  # handlers are set up by configure_logging()
 
 # -------------------------------------------------------------------
 # TIMEZONE (IST)
@@ -14,22 +56,47 @@ IST = timezone(timedelta(hours=5, minutes=30))
 # Optional: Gemini LLM analysis
 # -------------------------------------------------------------------
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai = None
-if GEMINI_API_KEY:
-    try:
-        from google import genai
-        genai = genai.Client(api_key=GEMINI_API_KEY)
-    except ImportError:
-        print("GEMINI_API_KEY set but google-genai package not installed.")
-        genai = None
+_gemini_client = None  # built on first use; False once it has failed
+_gemini_lock = threading.Lock()
+
 
-print("=== Starting NIFTY OI Monitor (Baseline vs 09:18 Snapshot) ===")
+def get_gemini_client():
+    """
+    The google-genai client, imported and built on first use (the import alone takes
+    seconds on a cold runner). None if GEMINI_API_KEY is unset or the package is missing.
+    Requests time out after LLM_BUDGET_SECONDS, so a hung call frees its GeminiAnalyst
+    worker instead of holding it past the point its answer would be dropped anyway.
+    """
+    global _gemini_client
+    if not GEMINI_API_KEY:
+        return None
+    with _gemini_lock:
+        if _gemini_client is None:
+            try:
+                from google import genai
+                from google.genai import types
+                _gemini_client = genai.Client(
+                    api_key=GEMINI_API_KEY,
+                    http_options=types.HttpOptions(timeout=int(LLM_BUDGET_SECONDS * 1000)),  # ms
+                )
+            except ImportError:
+                log.warning("GEMINI_API_KEY set but google-genai package not installed.")
+                _gemini_client = False
+            except Exception as e:
+                log.warning("Could not create Gemini client: %s", e)
+                _gemini_client = False
+        return _gemini_client or None
 
 # ===========================
 # CONFIGURATION
 # ===========================
 
 SYMBOL = os.getenv("SYMBOL", "NIFTY")
+# Indices monitored by this process, comma-separated, e.g. "NIFTY,BANKNIFTY,FINNIFTY,MIDCPNIFTY".
+# Per-symbol overrides: LOT_SIZE_<SYMBOL>, OI_CHANGE_THRESHOLD_PERCENT_<SYMBOL>,
+# OI_RATIO_THRESHOLD_<SYMBOL>, STRIKE_RANGE_<SYMBOL>, EXPIRY_COUNT_<SYMBOL>, SKIP_EXPIRY_DAY_<SYMBOL>,
+# INCLUDE_MONTHLY_EXPIRY_<SYMBOL>.
+SYMBOLS = [s.strip().upper() for s in (os.getenv("SYMBOLS") or SYMBOL).split(",") if s.strip()]
 
 # % change vs BASELINE required to trigger alert
 OI_CHANGE_THRESHOLD_PERCENT = float(os.getenv("OI_CHANGE_THRESHOLD_PERCENT", "400.0"))
@@ -37,13 +104,52 @@ OI_CHANGE_THRESHOLD_PERCENT = float(os.getenv("OI_CHANGE_THRESHOLD_PERCENT", "40
 OI_RATIO_THRESHOLD = float(os.getenv("OI_RATIO_THRESHOLD", "2.0"))
 # ATM +/- N strikes to monitor
 STRIKE_RANGE = int(os.getenv("STRIKE_RANGE", "6"))
+# Nearest N expiries to monitor per symbol, each with its own baseline and alerts
+EXPIRY_COUNT = int(os.getenv("EXPIRY_COUNT", "1"))
+# On expiry day, drop the expiry settling today (its OI is mostly square-off noise) and take the next N
+SKIP_EXPIRY_DAY = os.getenv("SKIP_EXPIRY_DAY", "false").lower() in ("1", "true", "yes")
+# Always monitor the monthly expiry as well, even when it is further out than EXPIRY_COUNT
+INCLUDE_MONTHLY_EXPIRY = os.getenv("INCLUDE_MONTHLY_EXPIRY", "false").lower() in ("1", "true", "yes")
+# Evaluate alerts on every strike in the chain instead of ATM +/- STRIKE_RANGE
+MONITOR_FULL_CHAIN = os.getenv("MONITOR_FULL_CHAIN", "false").lower() in ("1", "true", "yes")
+# OI velocity alerts: a strike side whose OI moves fast within a rolling window alerts even if
+# its move vs the 09:18 baseline is old news. "minutes:percent" pairs (VELOCITY_WINDOWS_<SYMBOL>
+# overrides), plus a minimum absolute move in contracts so thin strikes don't trip it
+VELOCITY_ALERTS = os.getenv("VELOCITY_ALERTS", "true").lower() in ("1", "true", "yes")
+VELOCITY_WINDOWS = os.getenv("VELOCITY_WINDOWS", "5:25,15:40,30:60")
+VELOCITY_MIN_CONTRACTS = int(os.getenv("VELOCITY_MIN_CONTRACTS", "20000"))
+# Max pain and OI walls: how many CE/PE walls to list, whether to message when max pain,
+# support or resistance moves, and for how many consecutive cycles a move must hold first
+LEVEL_WALLS = int(os.getenv("LEVEL_WALLS", "3"))
+LEVEL_SHIFT_ALERTS = os.getenv("LEVEL_SHIFT_ALERTS", "true").lower() in ("1", "true", "yes")
+LEVEL_SHIFT_CONFIRM_CYCLES = int(os.getenv("LEVEL_SHIFT_CONFIRM_CYCLES", "2"))
 
 POLL_INTERVAL_SECONDS = int(os.getenv("POLL_INTERVAL_SECONDS", "60"))
+# Adaptive polling: tighten towards the floor while a monitored strike is near its alert
+# thresholds or spot is crossing strikes, relax towards the ceiling while everything is far away
+ADAPTIVE_POLLING = os.getenv("ADAPTIVE_POLLING", "true").lower() in ("1", "true", "yes")
+POLL_FLOOR_SECONDS = int(os.getenv("POLL_FLOOR_SECONDS", "15"))
+POLL_CEILING_SECONDS = int(os.getenv("POLL_CEILING_SECONDS", "120"))
+# "Near" = within this fraction of both triggers (0.2: change >= 320% of a 400% threshold and ratio >= 1.6x of 2x)
+POLL_NEAR_MARGIN = float(os.getenv("POLL_NEAR_MARGIN", "0.2"))
+# "Far" = every strike below this fraction of its triggers
+POLL_FAR_FRACTION = float(os.getenv("POLL_FAR_FRACTION", "0.5"))
+# Cap on NSE HTTP requests (API calls, retries and warmups) per rolling minute, across all symbols
+NSE_REQUEST_BUDGET_PER_MINUTE = int(os.getenv("NSE_REQUEST_BUDGET_PER_MINUTE", "30"))
+# Grace period before a late poll tick counts as missed (and is skipped rather than fired late)
+TICK_GRACE_SECONDS = float(os.getenv("TICK_GRACE_SECONDS", "1.0"))
+# Hard cap on one option-chain fetch, retries included — keeps a slow NSE from stalling the poll cycle
+FETCH_DEADLINE_SECONDS = float(os.getenv("FETCH_DEADLINE_SECONDS", "20"))
 # NSE changes lot size periodically — update via env var, not code
 LOT_SIZE = int(os.getenv("LOT_SIZE", "65"))
+# Defaults for the other indices (LOT_SIZE_<SYMBOL> overrides); LOT_SIZE applies to anything unlisted
+DEFAULT_LOT_SIZES = {"BANKNIFTY": 30, "FINNIFTY": 60, "MIDCPNIFTY": 120}
 
 DB_FILE = os.getenv("DB_FILE", "oi_history.db")
 
+# Baseline is captured on the first cycle at/after this time; poll ticks are anchored to it
+BASELINE_CAPTURE_TIME = dtime(9, 18)
+
 # ---------- NSE Market Holidays 2026 ----------
 # Source: NSE website. Script exits early on these days with a Telegram notification.
 MARKET_HOLIDAYS = {
@@ -74,9 +180,36 @@ def get_holiday_name(date_iso: str) -> str | None:
 # ---------- Telegram ----------
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+# Telegram allows about one message per second per chat and 20 per minute in groups
+TELEGRAM_MIN_INTERVAL_SECONDS = float(os.getenv("TELEGRAM_MIN_INTERVAL_SECONDS", "1.0"))
+TELEGRAM_MAX_PER_MINUTE = int(os.getenv("TELEGRAM_MAX_PER_MINUTE", "20"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "4"))
+TELEGRAM_RETRY_BASE_SECONDS = float(os.getenv("TELEGRAM_RETRY_BASE_SECONDS", "2.0"))
+# Pending notifications held for the background sender; new ones are dropped when full
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "200"))
+# How long to keep sending queued notifications when the process exits
+NOTIFY_DRAIN_SECONDS = float(os.getenv("NOTIFY_DRAIN_SECONDS", "30"))
+
+# ---------- Gemini analysis ----------
+# An analysis not back within this many seconds of its cycle's alerts is dropped
+LLM_BUDGET_SECONDS = float(os.getenv("LLM_BUDGET_SECONDS", "10"))
+# Reuse an answer for the same set of alert signatures for this long
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "1800"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "64"))
 
 # ---------- NSE API ----------
-NSE_BASE_URL = "https://www.nseindia.com/api/option-chain-v3"
+# Overridable so the monitor can be pointed at a local stand-in (fake_nse_server.py)
+NSE_HOME_URL = os.getenv("NSE_HOME_URL", "https://www.nseindia.com")
+NSE_BASE_URL = os.getenv("NSE_API_URL", f"{NSE_HOME_URL}/api/option-chain-v3")
+# Re-warm NSE cookies at least this often even if they claim a longer expiry
+NSE_COOKIE_MAX_AGE_SECONDS = float(os.getenv("NSE_COOKIE_MAX_AGE_SECONDS", "600"))
+
+# ---------- Logging ----------
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" = one JSON object per line; "text" = "[time] LEVEL message key=value ..."
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# With LOG_LEVEL=DEBUG, per-strike detail is logged on every Nth evaluation of a chain
+LOG_STRIKE_SAMPLE_EVERY = int(os.getenv("LOG_STRIKE_SAMPLE_EVERY", "5"))
 
 HEADERS = {
     "User-Agent": (
@@ -92,18 +225,198 @@ HEADERS = {
     "Origin": "https://www.nseindia.com",
 }
 
-session = requests.Session()
-session.headers.update(HEADERS)
+
+# ===========================
+# LOGGING
+# ===========================
+
+# Attributes every LogRecord has; anything else on a record came in through extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: ts (IST), level, msg, plus any extra= fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, IST).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """"[time IST] LEVEL message key=value ..." — the old print layout, for reading by eye."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        ts = datetime.fromtimestamp(record.created, IST).isoformat(sep=" ", timespec="milliseconds")
+        extra = " ".join(f"{k}={v}" for k, v in vars(record).items() if k not in _RECORD_ATTRS)
+        line = f"[{ts}] {record.levelname:<7} {record.getMessage()}" + (f"  {extra}" if extra else "")
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record as is. The stock prepare() formats the message
+    on the calling thread (so the record could be pickled); the queue here never leaves
+    the process, so formatting is left to the QueueListener's thread and the poll loop
+    only pays for a queue put.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_log_listener: logging.handlers.QueueListener | None = None
+
+
+def _stop_log_listener():
+    """Write everything still queued and stop the writer thread."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+atexit.register(_stop_log_listener)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None):
+    """(Re)configure the monitor's logger: level, JSON-lines or text, written by a background listener."""
+    global _log_listener
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+        handler.close()
+    _stop_log_listener()
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(TextFormatter() if fmt == "text" else JsonLinesFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(records, writer)
+    _log_listener.start()
+    log.addHandler(DeferredFormatQueueHandler(records))
+    log.setLevel(getattr(logging, level, logging.INFO))
+    log.propagate = False
+
+
+configure_logging()
+
+
+
+class NSESession:
+    """
+    Shared requests.Session with an NSE cookie lifecycle.
+
+    The homepage warmup (which sets the nsit/nseappid cookies the API checks) is only
+    performed when the cookies are missing, about to expire, older than
+    NSE_COOKIE_MAX_AGE_SECONDS, or when the API answers 401/403 — not before every call.
+    warmup_hits counts API calls served with cached cookies, warmup_misses counts warmups.
+    """
+
+    # Treat cookies as stale this many seconds before their stated expiry
+    EXPIRY_MARGIN_SECONDS = 5
+
+    def __init__(self, headers: dict):
+        self.http = requests.Session()
+        self.http.headers.update(headers)
+        self._lock = threading.Lock()
+        self._warmed_at: float | None = None      # time.monotonic() of last warmup
+        self._cookies_expire_at: float | None = None  # earliest cookie expiry (epoch), None = session cookies
+        self.warmup_hits = 0
+        self.warmup_misses = 0
+        self.auth_rewarms = 0
+        # time.monotonic() of every HTTP request, for the request budget
+        self.request_times: deque[float] = deque(maxlen=4096)
+        self.requests_total = 0
+
+    def _count_request(self):
+        """Caller must hold self._lock."""
+        self.request_times.append(time.monotonic())
+        self.requests_total += 1
+
+    def requests_in_last(self, seconds: float) -> int:
+        cutoff = time.monotonic() - seconds
+        with self._lock:
+            return sum(1 for t in self.request_times if t >= cutoff)
+
+    def _cookies_fresh(self) -> bool:
+        if self._warmed_at is None or not self.http.cookies:
+            return False
+        if time.monotonic() - self._warmed_at > NSE_COOKIE_MAX_AGE_SECONDS:
+            return False
+        if self._cookies_expire_at is not None:
+            return time.time() < self._cookies_expire_at - self.EXPIRY_MARGIN_SECONDS
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self._warmed_at = None
+
+    def _warmup(self, timeout: float):
+        """GET the NSE homepage to (re)issue cookies. Caller must hold self._lock."""
+        self.warmup_misses += 1
+        self.http.cookies.clear()
+        self._count_request()
+        with metrics.span("warmup"):
+            warm = self.http.get(NSE_HOME_URL, timeout=min(5.0, timeout))
+        log.info(
+            "NSE warmup status: %s (%d cookies)", warm.status_code, len(self.http.cookies),
+            extra={"status": warm.status_code},
+        )
+        expiries = [c.expires for c in self.http.cookies if c.expires]
+        self._cookies_expire_at = min(expiries) if expiries else None
+        self._warmed_at = time.monotonic()
+
+    def ensure_cookies(self, timeout: float):
+        with self._lock:
+            if self._cookies_fresh():
+                self.warmup_hits += 1
+            else:
+                self._warmup(timeout)
+
+    def get(self, url: str, timeout: float) -> requests.Response:
+        """GET an NSE API url, warming up cookies only when needed and once more on 401/403."""
+        self.ensure_cookies(timeout)
+        with self._lock:
+            self._count_request()
+        with metrics.span("nse_get"):
+            resp = self.http.get(url, timeout=timeout)
+        if resp.status_code in (401, 403):
+            log.warning("NSE returned %s — cookies rejected, re-warming.", resp.status_code, extra={"status": resp.status_code})
+            with self._lock:
+                self.auth_rewarms += 1
+                self._warmup(timeout)
+                self._count_request()
+            with metrics.span("nse_get"):
+                resp = self.http.get(url, timeout=timeout)
+        return resp
+
+    def stats_str(self) -> str:
+        total = self.warmup_hits + self.warmup_misses
+        return (
+            f"cookie reuse {self.warmup_hits}/{total} calls, {self.warmup_misses} warmups "
+            f"({self.auth_rewarms} after 401/403)"
+        )
+
+
+nse_session = NSESession(HEADERS)
 
 
 # ===========================
 # EXPIRY DATE DETECTION
 # ===========================
 
-# --- HARDCODED FALLBACK LIST (commented out) ---
-# If dynamic expiry detection fails consistently, uncomment this list and
-# replace `get_current_expiry()` call in main_loop with:
-#   expiry_str = get_current_weekly_expiry_from_list(now_ist)
+# --- HARDCODED FALLBACK LIST ---
+# Used as NIFTY's expiry list when NSE returns none (see get_active_expiries). If dynamic
+# expiry detection fails consistently, replace the get_active_expiries() call in run_cycle with:
+#   expiries = [get_current_weekly_expiry_from_list(now_ist)]
 #
 # NIFTY expires every Tuesday (Monday if Tuesday is a market holiday).
 # Update this list when it runs out or NSE changes the schedule.
@@ -134,93 +447,154 @@ def get_current_weekly_expiry_from_list(now_ist: datetime) -> str | None:
             continue
     return WEEKLY_EXPIRIES[-1]
 
-# Module-level cache: expiry is determined once per trading day per process
-_cached_expiry: str | None = None
-_cached_expiry_date: str | None = None
+def get_current_monthly_expiry(now_ist: datetime) -> str:
+    """
+    Hardcoded-rule fallback for the monthly-only indices (BANKNIFTY, FINNIFTY, MIDCPNIFTY):
+    last Tuesday of the month, a day earlier if that is a market holiday.
+    """
+    today = now_ist.date()
+    year, month = today.year, today.month
+    for _ in range(2):
+        next_month = datetime(year + (month == 12), month % 12 + 1, 1)
+        day = next_month - timedelta(days=1)
+        while day.weekday() != 1:
+            day -= timedelta(days=1)
+        if get_holiday_name(day.date().isoformat()):
+            day -= timedelta(days=1)
+        if day.date() >= today:
+            break
+        year, month = next_month.year, next_month.month
+    return day.strftime("%d-%b-%Y")
+
+
+def get_monthly_expiries(now_ist: datetime, months: int) -> list[str]:
+    """The next `months` monthly expiries by the get_current_monthly_expiry rule."""
+    expiries = []
+    start = now_ist
+    for _ in range(months):
+        expiry = get_current_monthly_expiry(start)
+        expiries.append(expiry)
+        start = datetime.strptime(expiry, "%d-%b-%Y") + timedelta(days=1)
+    return expiries
 
-# Alert deduplication — in-memory, resets each trading day
-# Key: (trading_date, strike, option_type)  e.g. ("2026-03-08", 23400, "CE")
-# Value: True = conditions currently breached (alert already fired)
-_alert_active: dict[tuple[str, int, str], bool] = {}
-_alert_dedup_date: str | None = None
 
 # Close message state — persists in-memory across cycles, backed by SQLite for cross-session use
 _close_message_sent_date: str | None = None
-_last_spot_price = None
-_last_atm_strike = None
-_last_pcr_str: str | None = None
-_last_expiry_str: str | None = None
 
 
-def fetch_expiry_dates_from_nse(now_ist: datetime) -> list[str]:
+def fetch_expiry_dates_from_nse(now_ist: datetime, symbol: str) -> list[str]:
     """
     Call NSE option chain API (no expiry param) to get the list of all
-    available expiry dates for SYMBOL. Returns list like ["10-Mar-2026", ...].
+    available expiry dates for `symbol`. Returns list like ["10-Mar-2026", ...].
     """
-    url = f"{NSE_BASE_URL}?type=Indices&symbol={SYMBOL}"
+    url = f"{NSE_BASE_URL}?type=Indices&symbol={symbol}"
+    metrics.count("nse_requests")
     try:
-        session.get("https://www.nseindia.com", timeout=5)
-        resp = session.get(url, timeout=10)
+        resp = nse_session.get(url, timeout=10)
         resp.raise_for_status()
-        data = resp.json()
+        with metrics.span("decode"):
+            data = decode_option_chain(resp.content)
         expiry_dates = data.get("records", {}).get("expiryDates", [])
-        print(f"[{now_ist}] NSE returned {len(expiry_dates)} expiry dates: {expiry_dates[:6]}")
+        log.info(
+            "%s: NSE returned %d expiry dates: %s", symbol, len(expiry_dates), expiry_dates[:6],
+            extra={"symbol": symbol},
+        )
         return expiry_dates
     except Exception as e:
-        print(f"[{now_ist}] Could not fetch expiry dates from NSE: {e}")
+        metrics.count("nse_errors")
+        log.warning("%s: could not fetch expiry dates from NSE: %s", symbol, e, extra={"symbol": symbol})
         return []
 
 
-def pick_next_expiry(expiry_dates: list[str], now_ist: datetime) -> str | None:
+def pick_active_expiries(
+    expiry_dates: list[str],
+    now_ist: datetime,
+    count: int = 1,
+    skip_expiry_day: bool = False,
+    include_monthly: bool = False,
+) -> list[str]:
     """
-    From the NSE expiry dates list, return the first expiry on or after today (IST).
-    This is the active expiry: on expiry day itself it returns that day's expiry;
-    the morning after expiry it naturally advances to the next one.
+    From one expiry list (NSE's, or a fallback), the expiries to monitor, nearest first:
+    the first `count` on or after today (IST). With skip_expiry_day, an expiry settling
+    today is passed over in favour of the next one; with include_monthly, the monthly
+    expiry (last listed expiry of the nearest month) is added if not already chosen.
     """
     today = now_ist.date()
-    parsed = []
+    upcoming = []
     for s in expiry_dates:
         try:
-            parsed.append((datetime.strptime(s, "%d-%b-%Y").date(), s))
+            exp_date = datetime.strptime(s, "%d-%b-%Y").date()
         except Exception:
             continue
-    parsed.sort()
-    for exp_date, exp_str in parsed:
         if exp_date >= today:
-            return exp_str
-    return None
+            upcoming.append((exp_date, s))
+    upcoming.sort()
+    if skip_expiry_day and len(upcoming) > 1 and upcoming[0][0] == today:
+        upcoming = upcoming[1:]
+    if not upcoming:
+        return []
 
+    chosen = upcoming[:max(count, 1)]
+    if include_monthly:
+        first = upcoming[0][0]
+        monthly = max(e for e in upcoming if (e[0].year, e[0].month) == (first.year, first.month))
+        if monthly not in chosen:
+            chosen.append(monthly)
+    return [exp_str for _, exp_str in chosen]
 
-def get_current_expiry(now_ist: datetime) -> str | None:
+
+def pick_next_expiry(expiry_dates: list[str], now_ist: datetime) -> str | None:
     """
-    Returns today's active expiry date string (e.g. "10-Mar-2026").
-    Fetches from NSE API once per trading day; result is cached for the session.
-    Returns None if NSE is unreachable — caller should skip the cycle and retry.
+    From the NSE expiry dates list, return the first expiry on or after today (IST).
+    This is the active expiry: on expiry day itself it returns that day's expiry;
+    the morning after expiry it naturally advances to the next one.
     """
-    global _cached_expiry, _cached_expiry_date
+    picked = pick_active_expiries(expiry_dates, now_ist)
+    return picked[0] if picked else None
+
 
+def get_active_expiries(now_ist: datetime, state: "SymbolState") -> list[str]:
+    """
+    Returns the expiry date strings (e.g. ["10-Mar-2026", "17-Mar-2026"]) to monitor for
+    the symbol today, nearest first, all picked from one expiry list (see pick_active_expiries).
+    Fetches from NSE API once per trading day; result is cached on the SymbolState.
+    Returns [] if nothing could be determined — caller should skip the cycle and retry.
+    """
+    symbol = state.symbol
     today = now_ist.date().isoformat()
 
-    if _cached_expiry and _cached_expiry_date == today:
-        return _cached_expiry
+    if state.cached_expiries and state.cached_expiry_date == today:
+        return state.cached_expiries
 
-    print(f"[{now_ist}] Determining active expiry from NSE API...")
-    expiry_dates = fetch_expiry_dates_from_nse(now_ist)
+    log.info("%s: determining active expiries from NSE API...", symbol, extra={"symbol": symbol})
+    expiry_dates = fetch_expiry_dates_from_nse(now_ist, symbol)
+    source = "NSE"
 
     if not expiry_dates:
         # NSE returned nothing (market closed or API issue) — use hardcoded list as fallback
-        fallback = get_current_weekly_expiry_from_list(now_ist)
-        if fallback:
-            print(f"[{now_ist}] NSE returned no expiry dates. Using hardcoded fallback: {fallback}")
-            _cached_expiry = fallback
-            _cached_expiry_date = today
-        return fallback
-
-    chosen = pick_next_expiry(expiry_dates, now_ist)
+        if symbol == "NIFTY":
+            expiry_dates = WEEKLY_EXPIRIES
+        else:
+            expiry_dates = get_monthly_expiries(now_ist, months=max(state.expiry_count, 1) + 1)
+        source = "hardcoded fallback"
+
+    chosen = pick_active_expiries(
+        expiry_dates, now_ist, state.expiry_count, state.skip_expiry_day, state.include_monthly
+    )
+    if not chosen and symbol == "NIFTY" and source != "NSE":
+        chosen = [get_current_weekly_expiry_from_list(now_ist)]
     if chosen:
-        _cached_expiry = chosen
-        _cached_expiry_date = today
-        print(f"[{now_ist}] Active expiry set to: {chosen} (cached for today)")
+        state.cached_expiries = chosen
+        state.cached_expiry_date = today
+        state.last_payload.clear()
+        state.last_evaluation.clear()
+        state.unchanged_skips = 0
+        state.velocity.clear()
+        state.levels.clear()
+        log.info(
+            "%s: active expiries set to %s from %s (cached for today)", symbol, ", ".join(chosen), source,
+            extra={"symbol": symbol, "expiries": chosen},
+        )
 
     return chosen
 
@@ -244,513 +618,2592 @@ def is_market_hours_ist(now_ist: datetime | None = None) -> bool:
 # DB FUNCTIONS (SQLite)
 # ===========================
 
+# Persist every cycle's full chain (OI, volume, LTP, IV per strike) to oi_ticks — about 6 MB per
+# symbol and expiry per day at 150 strikes. On GitHub Actions the DB only outlives the job as the
+# oi-history artifact the workflow uploads; oi_replay.py reads it from there or from local runs.
+STORE_TICK_HISTORY = os.getenv("STORE_TICK_HISTORY", "true").lower() in ("1", "true", "yes")
+# Days of oi_ticks history kept (today included); older days are deleted at the next day's first
+# write. 0 = keep everything
+TICK_HISTORY_DAYS = int(os.getenv("TICK_HISTORY_DAYS", "30"))
+# SQLite page cache per connection, in KiB (negative = KiB in the PRAGMA)
+DB_CACHE_KIB = int(os.getenv("DB_CACHE_KIB", "8192"))
+# One cycle_metrics row per poll cycle (stage timings, NSE request/error counts)
+STORE_CYCLE_METRICS = os.getenv("STORE_CYCLE_METRICS", "true").lower() in ("1", "true", "yes")
+# Prometheus text-format dump of the latency histograms, rewritten after every cycle
+# (e.g. into node_exporter's --collector.textfile.directory); empty = disabled
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "")
+
+
+class OIRepository:
+    """
+    Data-access layer over oi_history.db.
+
+    Owns one long-lived connection for the whole session (WAL journal, NORMAL sync,
+    in-memory temp store) instead of a connect/close per helper call. Every query is a
+    fixed SQL string so sqlite3's statement cache re-uses the prepared statement, and
+    multi-row writes go through executemany() inside a single transaction.
+    """
+
+    # Bumped when the layout changes; init_schema() migrates older files in place
+    SCHEMA_VERSION = 3
+
+    SQL_ANY_BASELINE = "SELECT 1 FROM baseline_oi WHERE trading_date = ? LIMIT 1"
+    SQL_BASELINE_EXISTS = (
+        "SELECT 1 FROM baseline_oi WHERE trading_date = ? AND symbol = ? AND expiry = ? LIMIT 1"
+    )
+    SQL_BASELINE_TIME = (
+        "SELECT baseline_time FROM baseline_oi WHERE trading_date = ? AND symbol = ? AND expiry = ? LIMIT 1"
+    )
+    SQL_DELETE_BASELINE = "DELETE FROM baseline_oi WHERE trading_date = ? AND symbol = ? AND expiry = ?"
+    SQL_INSERT_BASELINE = (
+        "INSERT INTO baseline_oi (trading_date, symbol, expiry, strike, option_type, base_oi, baseline_time) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)"
+    )
+    SQL_LOAD_BASELINE = (
+        "SELECT strike, option_type, base_oi FROM baseline_oi WHERE trading_date = ? AND symbol = ? AND expiry = ?"
+    )
+    SQL_INSERT_ALERT = (
+        "INSERT OR IGNORE INTO alert_log "
+        "(trading_date, symbol, expiry, fired_time, strike, option_type, ce_change_pct, pe_change_pct, "
+        "ratio, ratio_dominant, pcr) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    SQL_INSERT_TICK = (
+        "INSERT OR REPLACE INTO oi_ticks "
+        "(trading_date, symbol, expiry, ts, strike, ce_oi, pe_oi, ce_volume, pe_volume, ce_ltp, pe_ltp, "
+        "ce_iv, pe_iv) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    SQL_LOAD_TICKS = (
+        "SELECT ts, strike, ce_oi, pe_oi, ce_volume, pe_volume, ce_ltp, pe_ltp, ce_iv, pe_iv "
+        "FROM oi_ticks WHERE trading_date = ? AND symbol = ? AND expiry = ? ORDER BY ts, strike"
+    )
+    SQL_INSERT_TICK_META = (
+        "INSERT OR REPLACE INTO oi_tick_meta (trading_date, symbol, expiry, ts, spot, nse_timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    SQL_LOAD_TICK_OI = (
+        "SELECT ts, strike, ce_oi, pe_oi FROM oi_ticks "
+        "WHERE trading_date = ? AND symbol = ? AND expiry = ? ORDER BY ts, strike"
+    )
+    SQL_LOAD_TICK_META = (
+        "SELECT ts, spot, nse_timestamp FROM oi_tick_meta "
+        "WHERE trading_date = ? AND symbol = ? AND expiry = ? ORDER BY ts"
+    )
+    SQL_PRUNE_TICKS = "DELETE FROM oi_ticks WHERE trading_date < ?"
+    SQL_PRUNE_TICK_META = "DELETE FROM oi_tick_meta WHERE trading_date < ?"
+    SQL_TICK_EXPIRIES = "SELECT DISTINCT expiry FROM oi_tick_meta WHERE trading_date = ? AND symbol = ?"
+    SQL_TICK_DATES = (
+        "SELECT DISTINCT trading_date FROM oi_tick_meta "
+        "WHERE trading_date BETWEEN ? AND ? AND symbol = ? ORDER BY trading_date"
+    )
+    SQL_INSERT_CYCLE_METRICS = (
+        "INSERT OR REPLACE INTO cycle_metrics "
+        "(trading_date, ts, total_ms, expiry_ms, warmup_ms, nse_get_ms, decode_ms, fetch_ms, parse_ms, "
+        "db_ms, alerts_ms, chains, evaluated, unchanged, nse_requests, nse_errors) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    SQL_LOAD_CYCLE_TOTALS = "SELECT total_ms FROM cycle_metrics WHERE trading_date = ? ORDER BY total_ms"
+    SQL_LOAD_NSE_ERRORS = (
+        "SELECT COALESCE(SUM(nse_requests), 0), COALESCE(SUM(nse_errors), 0) "
+        "FROM cycle_metrics WHERE trading_date = ?"
+    )
+    SQL_LOAD_ALERTS = (
+        "SELECT symbol, expiry, fired_time, strike, option_type, ce_change_pct, pe_change_pct, ratio, "
+        "ratio_dominant, pcr "
+        "FROM alert_log WHERE trading_date = ? ORDER BY fired_time, symbol, expiry"
+    )
+
+    # table -> CREATE statement; the market-data tables are keyed by (trading_date, symbol, expiry, ...)
+    TABLES = {
+        "baseline_oi": """
+            CREATE TABLE IF NOT EXISTS baseline_oi (
+                trading_date TEXT,
+                symbol TEXT NOT NULL,
+                expiry TEXT,
+                strike INTEGER,
+                option_type TEXT,
+                base_oi INTEGER,
+                baseline_time TEXT,
+                PRIMARY KEY (trading_date, symbol, expiry, strike, option_type)
+            )
+            """,
+        "alert_log": """
+            CREATE TABLE IF NOT EXISTS alert_log (
+                trading_date TEXT,
+                symbol TEXT NOT NULL,
+                expiry TEXT NOT NULL DEFAULT '',
+                fired_time TEXT,  -- HH:MM:SS (HH:MM before sub-minute polling); part of the key
+                strike INTEGER,
+                option_type TEXT,
+                ce_change_pct REAL,
+                pe_change_pct REAL,
+                ratio REAL,
+                ratio_dominant TEXT,
+                pcr REAL,
+                PRIMARY KEY (trading_date, symbol, expiry, fired_time, strike, option_type)
+            )
+            """,
+        # Intraday history: one row per strike per cycle. WITHOUT ROWID keeps rows clustered
+        # on the (trading_date, symbol, expiry, ts, strike) key, so a day's replay is one range scan.
+        "oi_ticks": """
+            CREATE TABLE IF NOT EXISTS oi_ticks (
+                trading_date TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                expiry TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                strike INTEGER NOT NULL,
+                ce_oi INTEGER,
+                pe_oi INTEGER,
+                ce_volume INTEGER,
+                pe_volume INTEGER,
+                ce_ltp REAL,
+                pe_ltp REAL,
+                ce_iv REAL,
+                pe_iv REAL,
+                PRIMARY KEY (trading_date, symbol, expiry, ts, strike)
+            ) WITHOUT ROWID
+            """,
+        # Per-cycle fields of oi_ticks that are not per strike (spot drives ATM on replay)
+        "oi_tick_meta": """
+            CREATE TABLE IF NOT EXISTS oi_tick_meta (
+                trading_date TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                expiry TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                spot REAL,
+                nse_timestamp TEXT,
+                PRIMARY KEY (trading_date, symbol, expiry, ts)
+            ) WITHOUT ROWID
+            """,
+        # One row per poll cycle: wall time per stage (ms; concurrent fetch stages are summed
+        # over all chains) and the cycle's NSE option-chain request/error counts
+        "cycle_metrics": """
+            CREATE TABLE IF NOT EXISTS cycle_metrics (
+                trading_date TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                total_ms REAL,
+                expiry_ms REAL,
+                warmup_ms REAL,
+                nse_get_ms REAL,
+                decode_ms REAL,
+                fetch_ms REAL,
+                parse_ms REAL,
+                db_ms REAL,
+                alerts_ms REAL,
+                chains INTEGER,
+                evaluated INTEGER,
+                unchanged INTEGER,
+                nse_requests INTEGER,
+                nse_errors INTEGER,
+                PRIMARY KEY (trading_date, ts)
+            ) WITHOUT ROWID
+            """,
+    }
+
+    def __init__(self, path: str):
+        self.path = path
+        # check_same_thread=False: the connection is shared with the fetch/notification threads,
+        # all access is serialised through self._lock
+        self.conn = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
+        self._lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute(f"PRAGMA cache_size=-{DB_CACHE_KIB}")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+
+    def close(self):
+        with self._lock:
+            try:
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass
+            self.conn.close()
+
+    def init_schema(self):
+        with self._lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < self.SCHEMA_VERSION:
+                self._migrate()
+            with self.conn:
+                self.conn.execute("DROP TABLE IF EXISTS oi_data")
+                for create_sql in self.TABLES.values():
+                    self.conn.execute(create_sql)
+                self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _migrate(self):
+        """
+        Bring an older file up to SCHEMA_VERSION. SQLite cannot alter a primary key, so each
+        table missing a key column is rebuilt, all in one transaction:
+        - v2 added symbol to every table; older rows were written by a single-symbol monitor
+          and are tagged with SYMBOL.
+        - v3 added expiry to alert_log; older alerts are given their day's baseline expiry,
+          the only one a single-expiry monitor watched.
+        Caller must hold self._lock.
+        """
+        self.conn.execute("BEGIN")
+        try:
+            rebuilt = []
+            for table, create_sql in self.TABLES.items():
+                columns = [r[1] for r in self.conn.execute(f"PRAGMA table_info({table})")]
+                if not columns or "symbol" not in create_sql or ("symbol" in columns and "expiry" in columns):
+                    continue
+                rebuilt.append(table)
+                column_list = ", ".join(columns)
+                symbol_col, symbol_val = ("", ()) if "symbol" in columns else ("symbol, ", (SYMBOL,))
+                self.conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+                self.conn.execute(create_sql)
+                moved = self.conn.execute(
+                    f"INSERT INTO {table} ({symbol_col}{column_list}) "
+                    f"SELECT {'?, ' if symbol_val else ''}{column_list} FROM {table}_old",
+                    symbol_val,
+                ).rowcount
+                self.conn.execute(f"DROP TABLE {table}_old")
+                tagged = f", tagged {SYMBOL}" if symbol_val else ""
+                log.info("DB migration: rebuilt %s (%d rows%s).", table, moved, tagged)
+            if "alert_log" in rebuilt:
+                backfilled = self.conn.execute(
+                    "UPDATE alert_log SET expiry = (SELECT MIN(b.expiry) FROM baseline_oi b "
+                    "WHERE b.trading_date = alert_log.trading_date AND b.symbol = alert_log.symbol) "
+                    "WHERE expiry = '' AND EXISTS (SELECT 1 FROM baseline_oi b "
+                    "WHERE b.trading_date = alert_log.trading_date AND b.symbol = alert_log.symbol)"
+                ).rowcount
+                log.info("DB migration: %d alert(s) tagged with their baseline expiry.", backfilled)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def _fetchone(self, sql: str, params: tuple):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def any_baseline_today(self, trading_date: str) -> bool:
+        return self._fetchone(self.SQL_ANY_BASELINE, (trading_date,)) is not None
+
+    def baseline_exists(self, trading_date: str, symbol: str, expiry: str) -> bool:
+        return self._fetchone(self.SQL_BASELINE_EXISTS, (trading_date, symbol, expiry)) is not None
+
+    def get_baseline_time(self, trading_date: str, symbol: str, expiry: str) -> str | None:
+        row = self._fetchone(self.SQL_BASELINE_TIME, (trading_date, symbol, expiry))
+        return row[0] if row else None
+
+    def store_baseline(
+        self, trading_date: str, symbol: str, expiry: str, baseline_time_str: str, chain: "StrikeChain"
+    ) -> int:
+        """Replace the (trading_date, symbol, expiry) baseline in one transaction. Returns rows inserted."""
+        rows = [
+            (trading_date, symbol, expiry, strike, option_type, oi, baseline_time_str)
+            for strike, option_type, oi in chain.side_rows()
+        ]
+        with self._lock, self.conn:
+            self.conn.execute(self.SQL_DELETE_BASELINE, (trading_date, symbol, expiry))
+            self.conn.executemany(self.SQL_INSERT_BASELINE, rows)
+        return len(rows)
+
+    def load_baseline(self, trading_date: str, symbol: str, expiry: str) -> "StrikeChain":
+        with self._lock:
+            rows = self.conn.execute(self.SQL_LOAD_BASELINE, (trading_date, symbol, expiry)).fetchall()
+        return StrikeChain.from_side_rows(rows)
+
+    def log_alerts(self, rows: list[tuple]):
+        """Insert alert_log rows (column order of SQL_INSERT_ALERT) in one transaction."""
+        with self._lock, self.conn:
+            self.conn.executemany(self.SQL_INSERT_ALERT, rows)
+
+    def store_ticks(self, trading_date: str, symbol: str, expiry: str, ts: str, rows: list[tuple],
+                    spot=None, nse_timestamp: str | None = None):
+        """
+        Write one cycle of oi_ticks (plus its oi_tick_meta row) in a single transaction.
+        rows: (strike, ce_oi, pe_oi, ce_volume, pe_volume, ce_ltp, pe_ltp, ce_iv, pe_iv)
+        """
+        key = (trading_date, symbol, expiry, ts)
+        with self._lock, self.conn:
+            self.conn.executemany(self.SQL_INSERT_TICK, [key + r for r in rows])
+            self.conn.execute(self.SQL_INSERT_TICK_META, key + (spot, nse_timestamp))
+
+    def load_tick_oi(self, trading_date: str, symbol: str, expiry: str) -> list[tuple]:
+        """(ts, strike, ce_oi, pe_oi) for a whole day, ordered by (ts, strike) — the replay read path."""
+        with self._lock:
+            return self.conn.execute(self.SQL_LOAD_TICK_OI, (trading_date, symbol, expiry)).fetchall()
+
+    def load_tick_meta(self, trading_date: str, symbol: str, expiry: str) -> dict[str, tuple]:
+        """{ts: (spot, nse_timestamp)} for (trading_date, symbol, expiry)."""
+        with self._lock:
+            rows = self.conn.execute(self.SQL_LOAD_TICK_META, (trading_date, symbol, expiry)).fetchall()
+        return {ts: (spot, nse_ts) for ts, spot, nse_ts in rows}
+
+    def load_ticks(self, trading_date: str, symbol: str, expiry: str) -> list[tuple]:
+        """All oi_ticks rows for (trading_date, symbol, expiry) ordered by (ts, strike), without the key prefix."""
+        with self._lock:
+            return self.conn.execute(self.SQL_LOAD_TICKS, (trading_date, symbol, expiry)).fetchall()
+
+    def prune_ticks(self, keep_from: str) -> int:
+        """Delete oi_ticks and oi_tick_meta rows for trading dates before keep_from. Returns tick rows deleted."""
+        with self._lock, self.conn:
+            deleted = self.conn.execute(self.SQL_PRUNE_TICKS, (keep_from,)).rowcount
+            self.conn.execute(self.SQL_PRUNE_TICK_META, (keep_from,))
+        return deleted
+
+    def tick_expiries(self, trading_date: str, symbol: str) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self.conn.execute(self.SQL_TICK_EXPIRIES, (trading_date, symbol))]
+
+    def tick_dates(self, start_date: str, end_date: str, symbol: str) -> list[str]:
+        """Trading dates with recorded history for `symbol` between start_date and end_date inclusive."""
+        with self._lock:
+            return [r[0] for r in self.conn.execute(self.SQL_TICK_DATES, (start_date, end_date, symbol))]
+
+    def store_cycle_metrics(self, row: tuple):
+        """One cycle_metrics row (column order of SQL_INSERT_CYCLE_METRICS)."""
+        with self._lock, self.conn:
+            self.conn.execute(self.SQL_INSERT_CYCLE_METRICS, row)
+
+    def load_cycle_totals(self, trading_date: str) -> list[float]:
+        """Every cycle's total_ms for trading_date, ascending."""
+        with self._lock:
+            return [r[0] for r in self.conn.execute(self.SQL_LOAD_CYCLE_TOTALS, (trading_date,))]
+
+    def load_nse_error_counts(self, trading_date: str) -> tuple[int, int]:
+        """(option-chain requests, errors) summed over trading_date's cycles."""
+        return self._fetchone(self.SQL_LOAD_NSE_ERRORS, (trading_date,))
+
+    def load_alerts(self, trading_date: str) -> list[tuple]:
+        """Every symbol's alerts for trading_date (symbol and expiry first in each row)."""
+        with self._lock:
+            return self.conn.execute(self.SQL_LOAD_ALERTS, (trading_date,)).fetchall()
+
+
+_db: OIRepository | None = None
+
+
+def get_db() -> OIRepository:
+    """Process-wide repository on DB_FILE, opened on first use and checkpointed at exit."""
+    global _db
+    if _db is None:
+        _db = OIRepository(DB_FILE)
+        atexit.register(_db.close)
+    return _db
+
+
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DROP TABLE IF EXISTS oi_data")
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS baseline_oi (
-        trading_date TEXT,
-        expiry TEXT,
-        strike INTEGER,
-        option_type TEXT,
-        base_oi INTEGER,
-        baseline_time TEXT,
-        PRIMARY KEY (trading_date, expiry, strike, option_type)
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS alert_log (
-        trading_date TEXT,
-        fired_time TEXT,
-        strike INTEGER,
-        option_type TEXT,
-        ce_change_pct REAL,
-        pe_change_pct REAL,
-        ratio REAL,
-        ratio_dominant TEXT,
-        pcr REAL,
-        PRIMARY KEY (trading_date, fired_time, strike, option_type)
-    )
-    """)
-    conn.commit()
-    conn.close()
+    get_db().init_schema()
 
 
 def any_baseline_today(trading_date: str) -> bool:
     """Returns True if any baseline rows exist for today — used to suppress duplicate startup pings."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM baseline_oi WHERE trading_date = ? LIMIT 1", (trading_date,))
-    row = c.fetchone()
-    conn.close()
-    return row is not None
+    return get_db().any_baseline_today(trading_date)
 
 
 def log_alert_to_db(
-    trading_date: str, fired_time: str, strike: int, option_type: str,
+    trading_date: str, symbol: str, expiry: str, fired_time: str, strike: int, option_type: str,
     ce_change_pct, pe_change_pct, ratio: float, ratio_dominant: str, pcr,
 ):
     """Persist a fired alert to SQLite so the close message can summarise the full day across AM+PM sessions."""
     def _safe(v):
         return None if (v is None or v == inf) else float(v)
 
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "INSERT OR IGNORE INTO alert_log "
-        "(trading_date, fired_time, strike, option_type, ce_change_pct, pe_change_pct, ratio, ratio_dominant, pcr) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (trading_date, fired_time, strike, option_type,
+    get_db().log_alerts([
+        (trading_date, symbol, expiry, fired_time, strike, option_type,
          _safe(ce_change_pct), _safe(pe_change_pct), ratio, ratio_dominant, _safe(pcr)),
-    )
-    conn.commit()
-    conn.close()
+    ])
 
 
 def load_alerts_for_today(trading_date: str) -> list[dict]:
-    """Load all logged alerts for trading_date, ordered by time."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "SELECT fired_time, strike, option_type, ce_change_pct, pe_change_pct, ratio, ratio_dominant, pcr "
-        "FROM alert_log WHERE trading_date = ? ORDER BY fired_time",
-        (trading_date,),
-    )
-    rows = c.fetchall()
-    conn.close()
+    """Load all logged alerts for trading_date (every symbol), ordered by time."""
+    rows = get_db().load_alerts(trading_date)
     return [
         {
-            "fired_time": r[0], "strike": r[1], "option_type": r[2],
-            "ce_change_pct": r[3], "pe_change_pct": r[4],
-            "ratio": r[5], "ratio_dominant": r[6], "pcr": r[7],
+            "symbol": r[0], "expiry": r[1], "fired_time": r[2], "strike": r[3], "option_type": r[4],
+            "ce_change_pct": r[5], "pe_change_pct": r[6],
+            "ratio": r[7], "ratio_dominant": r[8], "pcr": r[9],
         }
         for r in rows
     ]
 
 
-def baseline_exists(trading_date: str, expiry: str) -> bool:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "SELECT 1 FROM baseline_oi WHERE trading_date = ? AND expiry = ? LIMIT 1",
-        (trading_date, expiry),
-    )
-    row = c.fetchone()
-    conn.close()
-    return row is not None
+def baseline_exists(trading_date: str, symbol: str, expiry: str) -> bool:
+    return get_db().baseline_exists(trading_date, symbol, expiry)
 
 
-def get_baseline_time(trading_date: str, expiry: str) -> str | None:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "SELECT baseline_time FROM baseline_oi WHERE trading_date = ? AND expiry = ? LIMIT 1",
-        (trading_date, expiry),
-    )
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else None
+def get_baseline_time(trading_date: str, symbol: str, expiry: str) -> str | None:
+    return get_db().get_baseline_time(trading_date, symbol, expiry)
 
 
-def store_baseline_snapshot(trading_date: str, expiry: str, baseline_time: datetime, strikes_dict: dict):
-    """Store baseline OI for all strikes for (trading_date, expiry)."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "DELETE FROM baseline_oi WHERE trading_date = ? AND expiry = ?",
-        (trading_date, expiry),
-    )
+def store_baseline_snapshot(
+    trading_date: str, symbol: str, expiry: str, baseline_time: datetime, chain: "StrikeChain"
+):
+    """Store baseline OI for all strikes for (trading_date, symbol, expiry) and prime the in-memory baseline cache."""
     baseline_time_str = baseline_time.strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{baseline_time}] CAPTURING BASELINE for {trading_date} expiry={expiry} at {baseline_time_str} IST...")
+    log.info(
+        "CAPTURING BASELINE for %s %s expiry=%s at %s IST...", trading_date, symbol, expiry, baseline_time_str,
+        extra={"symbol": symbol, "expiry": expiry},
+    )
 
-    inserted_rows = 0
-    for strike, sides in strikes_dict.items():
-        for option_type in ("CE", "PE"):
-            oi_value = sides.get(option_type)
-            if oi_value is None:
-                continue
-            c.execute(
-                "INSERT INTO baseline_oi (trading_date, expiry, strike, option_type, base_oi, baseline_time) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                (trading_date, expiry, strike, option_type, int(oi_value), baseline_time_str),
-            )
-            inserted_rows += 1
+    inserted_rows = get_db().store_baseline(trading_date, symbol, expiry, baseline_time_str, chain)
+    baseline_cache.put(trading_date, symbol, expiry, chain, baseline_time_str)
 
-    conn.commit()
-    conn.close()
-    print(
-        f"[{baseline_time}] BASELINE STORED: {len(strikes_dict)} unique strikes, {inserted_rows} rows. "
-        f"All comparisons today will use this baseline.\n"
+    log.info(
+        "BASELINE STORED: %s %s %d unique strikes, %d rows. All comparisons today will use this baseline.",
+        symbol, expiry, len(chain), inserted_rows, extra={"symbol": symbol, "expiry": expiry},
     )
 
 
-def load_baseline_snapshot(trading_date: str, expiry: str) -> dict:
-    """Load baseline into dict: {strike: {'CE': oi, 'PE': oi}}"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "SELECT strike, option_type, base_oi FROM baseline_oi WHERE trading_date = ? AND expiry = ?",
-        (trading_date, expiry),
-    )
-    rows = c.fetchall()
-    conn.close()
+def load_baseline_snapshot(trading_date: str, symbol: str, expiry: str) -> "StrikeChain":
+    """Load baseline OI for (trading_date, symbol, expiry) as a StrikeChain (empty if none captured)."""
+    return get_db().load_baseline(trading_date, symbol, expiry)
 
-    baseline: dict[int, dict[str, int]] = {}
-    for strike, option_type, base_oi in rows:
-        baseline.setdefault(strike, {})[option_type] = base_oi
-    return baseline
 
+def prune_tick_history(today: str, keep_days: int = TICK_HISTORY_DAYS) -> int:
+    """Delete oi_ticks history older than keep_days days (today included); keep_days <= 0 keeps everything."""
+    if keep_days <= 0:
+        return 0
+    keep_from = (datetime.fromisoformat(today) - timedelta(days=keep_days - 1)).date().isoformat()
+    deleted = get_db().prune_ticks(keep_from)
+    if deleted:
+        log.info("Tick history: removed %d oi_ticks rows from before %s.", deleted, keep_from)
+    return deleted
 
-# ===========================
-# CLOSE MESSAGE
-# ===========================
 
-def send_market_close_message(now_ist: datetime, trading_date: str):
-    """Send end-of-day summary after market close (called at 3:33 PM IST)."""
-    alerts = load_alerts_for_today(trading_date)
-    expiry = _last_expiry_str or "N/A"
-    spot   = f"{_last_spot_price:,.1f}" if _last_spot_price is not None else "N/A"
-    atm    = str(_last_atm_strike) if _last_atm_strike is not None else "N/A"
-    pcr    = _last_pcr_str or "N/A"
+# Trading date whose first tick write has already pruned older history
+_ticks_pruned_for: str | None = None
 
-    lines = [
-        f"*NIFTY OI Monitor — Session Complete*",
-        f"Date   : {trading_date}  |  Expiry: {expiry}",
-        f"Final Spot : {spot}  |  ATM : {atm}",
-        f"Final PCR (ATM ±{STRIKE_RANGE}) : {pcr}",
-        "",
-    ]
 
-    if not alerts:
-        lines.append(f"*Alerts Today : 0* — No thresholds breached today.")
-    else:
-        lines.append(f"*Alerts Today : {len(alerts)}*")
-        for a in alerts:
-            trigger_pct = a["ce_change_pct"] if a["option_type"] == "CE" else a["pe_change_pct"]
-            pct_str = f"{trigger_pct:+.2f}%" if trigger_pct is not None else "INF%"
-            ratio_str = f"{a['ratio']:.2f}x ({a['ratio_dominant']})" if a["ratio"] else "N/A"
-            pcr_a = f"{a['pcr']:.2f}" if a["pcr"] is not None else "N/A"
-            lines.append(
-                f"• {a['fired_time']} | Strike {a['strike']} {a['option_type']}"
-                f" | {a['option_type']} {pct_str} | Ratio {ratio_str} | PCR {pcr_a}"
-            )
+def store_tick_snapshot(trading_date: str, symbol: str, expiry: str, now_ist: datetime, chain: "StrikeChain"):
+    """Persist this cycle's full chain (OI, volume, LTP, IV for every strike) to oi_ticks."""
+    global _ticks_pruned_for
+    if _ticks_pruned_for != trading_date:
+        _ticks_pruned_for = trading_date
+        prune_tick_history(trading_date)
+    rows = chain.tick_rows()
+    if rows:
+        get_db().store_ticks(
+            trading_date, symbol, expiry, now_ist.strftime("%H:%M:%S"), rows, chain.spot, chain.timestamp
+        )
+
 
-    send_telegram("\n".join(lines))
-    print(f"[{now_ist}] Market close summary sent.")
+class BaselineCache:
+    """
+    In-memory copy of captured baselines keyed by (trading_date, symbol, expiry).
 
+    A baseline never changes once captured, so it is read from SQLite at most once
+    (or filled directly at capture time) and then served from memory. Entries for
+    other trading dates are dropped the first time a new date is requested, and
+    retain() drops a symbol's expiries that have rolled off — steady-state cycles do no
+    baseline I/O.
+    """
 
-# ===========================
-# ALERT SENDING
-# ===========================
+    def __init__(self):
+        # (trading_date, symbol, expiry) -> (baseline StrikeChain, baseline_time_str)
+        self._entries: dict[tuple[str, str, str], tuple["StrikeChain", str]] = {}
+        self.db_loads = 0
 
-def send_telegram(message: str):
-    """Send a message via Telegram bot."""
-    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
-        print(f"[{datetime.now(IST)}] Telegram not configured (missing TOKEN or CHAT_ID).")
-        return
-    try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message, "parse_mode": "Markdown"}
-        resp = requests.post(url, json=payload, timeout=5)
-        print(f"[{datetime.now(IST)}] Telegram send status: {resp.status_code}")
-    except Exception as e:
-        print(f"[{datetime.now(IST)}] Error sending Telegram message: {e}")
+    def get(self, trading_date: str, symbol: str, expiry: str) -> tuple["StrikeChain", str] | None:
+        """Returns (baseline_strikes, baseline_time_str), or None if no baseline is captured yet."""
+        key = (trading_date, symbol, expiry)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
 
+        stale = [k for k in self._entries if k[0] != trading_date]
+        for k in stale:
+            del self._entries[k]
 
-def send_llm_analysis(alert_text: str):
-    """
-    Ask Gemini for a brief trading interpretation of the alert.
-    Sends the analysis as a follow-up Telegram message.
-    Silently skips if GEMINI_API_KEY is not set or the API call fails.
-    """
-    if not genai or not GEMINI_API_KEY:
-        return
+        # Miss — only DB-backed lookups from here (before capture, or after a restart)
+        btime = get_db().get_baseline_time(trading_date, symbol, expiry)
+        if btime is None:
+            return None
+        strikes = get_db().load_baseline(trading_date, symbol, expiry)
+        self.db_loads += 1
+        if not strikes:
+            return None
+        self._entries[key] = (strikes, btime)
+        return self._entries[key]
 
-    system_prompt = (
-        "You are a NIFTY options trading analyst. Given an Open Interest alert, "
-        "provide a brief 3-4 line interpretation: what the OI movement likely signals "
-        "(bullish/bearish pressure, support/resistance), and any key risk to watch. "
-        "Be concise and actionable."
-    )
+    def put(self, trading_date: str, symbol: str, expiry: str, strikes: "StrikeChain", baseline_time_str: str):
+        self._entries[(trading_date, symbol, expiry)] = (strikes, baseline_time_str)
 
-    try:
-        response = genai.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=f"{system_prompt}\n\nAlert:\n{alert_text}",
-        )
-        send_telegram(f"*Gemini Analysis:*\n{response.text.strip()}")
-        print(f"[{datetime.now(IST)}] Gemini analysis sent to Telegram.")
-    except Exception as e:
-        print(f"[{datetime.now(IST)}] Gemini analysis failed (skipping): {e}")
+    def retain(self, trading_date: str, symbol: str, expiries: list[str]):
+        """Drop entries not for trading_date, and `symbol`'s entries for expiries other than `expiries`."""
+        for k in list(self._entries):
+            if k[0] != trading_date or (k[1] == symbol and k[2] not in expiries):
+                del self._entries[k]
 
+    def invalidate(self):
+        self._entries.clear()
 
-def notify_alert(alert_text: str):
-    print(alert_text)
-    send_telegram(alert_text)
-    send_llm_analysis(alert_text)
+
+baseline_cache = BaselineCache()
 
 
 # ===========================
-# NSE DATA FUNCTIONS
+# CYCLE METRICS
 # ===========================
 
-def fetch_option_chain(now_ist: datetime, expiry_str: str) -> dict | None:
+# Histogram bucket upper bounds (seconds), Prometheus-style
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile of an ascending list, or None if it is empty."""
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class CycleMetrics:
     """
-    Fetch option chain for the given weekly expiry.
-    Retries up to 3 times (5s between retries) on transient errors.
+    Span timing for every stage of a poll cycle.
+
+    span(stage) / observe(stage, seconds) feed a cumulative latency histogram per stage
+    (kept for the whole process) and, while a cycle is open, that cycle's per-stage
+    totals. Spans may come from the fetch threads — concurrent fetch stages add up, so
+    nse_get_ms can exceed fetch_ms, which is the fetch's wall time. Background work
+    (Telegram posts, Gemini calls) goes to the histograms only.
+
+    Cycle stages: expiry (expiry lookup), warmup (NSE cookie warmup), nse_get (API GET),
+    decode (JSON decode), fetch (wall time of all chain fetches), parse (StrikeChain +
+    change detection), db (tick history and baseline I/O), alerts (check_alerts).
+    end_cycle() writes a cycle_metrics row and the METRICS_TEXTFILE dump.
     """
-    print(f"[{now_ist}] Fetching option chain from NSE for {SYMBOL}, expiry {expiry_str}...")
-    url = f"{NSE_BASE_URL}?type=Indices&symbol={SYMBOL}&expiry={expiry_str}"
 
-    for attempt in range(3):
+    CYCLE_STAGES = ("expiry", "warmup", "nse_get", "decode", "fetch", "parse", "db", "alerts")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # stage -> [bucket counts..., +Inf count], sum, count
+        self._hist: dict[str, list] = {}
+        self._counters: dict[str, int] = {}
+        self._cycle: dict[str, float] | None = None
+        self._cycle_counts: dict[str, int] = {}
+        self._cycle_started = 0.0
+        # Today's cycle totals (seconds), for the close message if cycle_metrics is off
+        self.day: str | None = None
+        self.day_totals: list[float] = []
+        self.day_nse = [0, 0]
+
+    @contextmanager
+    def span(self, stage: str, in_cycle: bool = True):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, in_cycle)
+
+    def observe(self, stage: str, seconds: float, in_cycle: bool = True):
+        with self._lock:
+            hist = self._hist.get(stage)
+            if hist is None:
+                hist = self._hist[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = hist[0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            hist[1] += seconds
+            hist[2] += 1
+            if in_cycle and self._cycle is not None:
+                self._cycle[stage] = self._cycle.get(stage, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1):
+        """Bump a process-wide counter (and this cycle's, if one is open)."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+            if self._cycle is not None:
+                self._cycle_counts[name] = self._cycle_counts.get(name, 0) + n
+
+    def begin_cycle(self):
+        with self._lock:
+            self._cycle = {}
+            self._cycle_counts = {}
+            self._cycle_started = time.perf_counter()
+
+    def end_cycle(self, now_ist: datetime, chains: int, evaluated: int, unchanged: int) -> dict:
+        """Close the cycle: histogram its total, persist the row, rewrite the textfile. Returns the row as a dict."""
+        total = time.perf_counter() - self._cycle_started
+        self.observe("cycle", total, in_cycle=False)
+        with self._lock:
+            stages, counts = self._cycle or {}, self._cycle_counts
+            self._cycle = None
+        trading_date = now_ist.date().isoformat()
+        if self.day != trading_date:
+            self.day, self.day_totals, self.day_nse = trading_date, [], [0, 0]
+        nse_requests, nse_errors = counts.get("nse_requests", 0), counts.get("nse_errors", 0)
+        self.day_totals.append(total)
+        self.day_nse[0] += nse_requests
+        self.day_nse[1] += nse_errors
+
+        row = {"total": total, **{stage: stages.get(stage, 0.0) for stage in self.CYCLE_STAGES}}
+        if STORE_CYCLE_METRICS:
+            try:
+                get_db().store_cycle_metrics((
+                    trading_date, now_ist.strftime("%H:%M:%S"),
+                    *(round(row[k] * 1000, 3) for k in ("total",) + self.CYCLE_STAGES),
+                    chains, evaluated, unchanged, nse_requests, nse_errors,
+                ))
+            except sqlite3.Error as e:
+                log.warning("Could not store cycle metrics: %s", e)
+        if METRICS_TEXTFILE:
+            self.write_textfile(METRICS_TEXTFILE)
+        return row
+
+    def stage_stats(self) -> dict[str, tuple[int, float]]:
+        """stage -> (observations, total seconds) since start."""
+        with self._lock:
+            return {stage: (h[2], h[1]) for stage, h in self._hist.items()}
+
+    def prometheus_text(self) -> str:
+        """Histograms and counters in the Prometheus text exposition format."""
+        with self._lock:
+            hist = {k: (list(v[0]), v[1], v[2]) for k, v in self._hist.items()}
+            counters = dict(self._counters)
+        lines = [
+            "# HELP oi_monitor_stage_seconds Time spent per poll-cycle stage (stage=\"cycle\" is the whole cycle).",
+            "# TYPE oi_monitor_stage_seconds histogram",
+        ]
+        for stage in sorted(hist):
+            counts, total, n = hist[stage]
+            cumulative = 0
+            for bound, c in zip(self.buckets + (inf,), counts):
+                cumulative += c
+                le = "+Inf" if bound == inf else repr(bound)
+                lines.append(f'oi_monitor_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'oi_monitor_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'oi_monitor_stage_seconds_count{{stage="{stage}"}} {n}')
+        for name in sorted(counters):
+            lines += [f"# TYPE oi_monitor_{name}_total counter", f"oi_monitor_{name}_total {counters[name]}"]
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Atomic rewrite (temp file + rename) so a scraper never reads half a file."""
+        tmp = f"{path}.{os.getpid()}.tmp"
         try:
-            warmup = session.get("https://www.nseindia.com", timeout=5)
-            print(f"[{now_ist}] Warmup status: {warmup.status_code}")
+            with open(tmp, "w") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning("Could not write metrics textfile %s: %s", path, e)
 
-            resp = session.get(url, timeout=10)
-            print(f"[{now_ist}] NSE response: {resp.status_code} (attempt {attempt + 1})")
-            resp.raise_for_status()
+    def day_summary(self, trading_date: str) -> tuple[list[float], int, int]:
+        """(ascending cycle totals in ms, NSE requests, NSE errors) for trading_date — from
+        cycle_metrics when stored (covers every session of the day), else this process."""
+        if STORE_CYCLE_METRICS:
+            totals = get_db().load_cycle_totals(trading_date)
+            if totals:
+                return totals, *get_db().load_nse_error_counts(trading_date)
+        if self.day != trading_date:
+            return [], 0, 0
+        return sorted(t * 1000 for t in self.day_totals), self.day_nse[0], self.day_nse[1]
 
-            try:
-                data = resp.json()
-            except Exception:
-                print(f"[{now_ist}] JSON decode failed. Response (first 500 chars): {resp.text[:500]}")
-                return None
 
-            if not isinstance(data, dict) or not data:
-                print(f"[{now_ist}] NSE returned empty JSON for expiry {expiry_str}.")
-                return None
+metrics = CycleMetrics()
 
-            records = data.get("records", {})
-            if isinstance(records, dict):
-                print(f"[{now_ist}] records.data length: {len(records.get('data', []))}")
 
-            return data
+# ===========================
+# CLOSE MESSAGE
+# ===========================
 
-        except Exception as e:
-            print(f"[{now_ist}] Error fetching option chain (attempt {attempt + 1}/3): {e}")
-            if attempt < 2:
-                print(f"[{now_ist}] Retrying in 5s...")
-                time.sleep(5)
+def send_market_close_message(now_ist: datetime, trading_date: str):
+    """
+    Send end-of-day summary after market close (called at 3:33 PM IST), one section per
+    symbol with a PCR line per monitored expiry.
+    """
+    alerts = load_alerts_for_today(trading_date)
+    lines = [f"*{'/'.join(SYMBOLS)} OI Monitor — Session Complete*", f"Date : {trading_date}", ""]
+
+    for state in get_symbol_states():
+        expiries = state.cached_expiries or list(state.last_pcr_by_expiry)
+        spot   = f"{state.last_spot_price:,.1f}" if state.last_spot_price is not None else "N/A"
+        atm    = str(state.last_atm_strike) if state.last_atm_strike is not None else "N/A"
+        symbol_alerts = [a for a in alerts if a["symbol"] == state.symbol]
+        multi_expiry = len(expiries) > 1
+
+        lines += [
+            f"*{state.symbol}*  |  Expiry: {', '.join(expiries) or 'N/A'}",
+            f"Final Spot : {spot}  |  ATM : {atm}",
+        ]
+        for expiry in expiries or ["N/A"]:
+            pcr = state.last_pcr_by_expiry.get(expiry, "N/A")
+            label = f" {expiry}" if multi_expiry else ""
+            lines.append(f"Final PCR{label} (ATM ±{state.config.strike_range}) : {pcr}")
+            tracker = state.levels.get(expiry)
+            if tracker is not None and tracker.reported is not None:
+                lv = tracker.reported
+                lines.append(
+                    f"Max Pain{label} : {lv.max_pain or 'N/A'} | Support {lv.support or 'N/A'} | "
+                    f"Resistance {lv.resistance or 'N/A'}"
+                )
+        if not symbol_alerts:
+            lines.append("*Alerts Today : 0* — No thresholds breached today.")
+        else:
+            lines.append(f"*Alerts Today : {len(symbol_alerts)}*")
+            for a in symbol_alerts:
+                trigger_pct = a["ce_change_pct"] if a["option_type"].startswith("CE") else a["pe_change_pct"]
+                pct_str = f"{trigger_pct:+.2f}%" if trigger_pct is not None else "INF%"
+                ratio_str = f"{a['ratio']:.2f}x ({a['ratio_dominant']})" if a["ratio"] else "N/A"
+                pcr_a = f"{a['pcr']:.2f}" if a["pcr"] is not None else "N/A"
+                expiry_tag = f" | {a['expiry']}" if multi_expiry else ""
+                lines.append(
+                    f"• {a['fired_time']}{expiry_tag} | Strike {a['strike']} {a['option_type']}"
+                    f" | {a['option_type']} {pct_str} | Ratio {ratio_str} | PCR {pcr_a}"
+                )
+        lines.append("")
 
-    return None
+    totals, nse_requests, nse_errors = metrics.day_summary(trading_date)
+    if totals:
+        lines.append(
+            f"*Cycle latency* ({len(totals)} cycles) : p50 {percentile(totals, 50):,.0f}ms | "
+            f"p95 {percentile(totals, 95):,.0f}ms | max {totals[-1]:,.0f}ms"
+        )
+    if nse_requests:
+        lines.append(f"*NSE error rate* : {nse_errors / nse_requests:.1%} ({nse_errors}/{nse_requests} requests)")
 
+    send_telegram("\n".join(lines).rstrip())
+    log.info("Market close summary sent.")
 
-def build_strike_map(data: dict) -> dict:
-    """Returns {strike: {'CE': ce_oi, 'PE': pe_oi}}"""
-    strikes: dict[int, dict[str, int]] = {}
-    for item in data.get("records", {}).get("data", []):
-        strike = item.get("strikePrice")
-        if strike is None:
-            continue
-        ce = item.get("CE")
-        pe = item.get("PE")
-        ce_oi = ce.get("openInterest") if ce else None
-        pe_oi = pe.get("openInterest") if pe else None
-        if ce_oi is not None or pe_oi is not None:
-            strikes.setdefault(strike, {})
-            if ce_oi is not None:
-                strikes[strike]["CE"] = ce_oi
-            if pe_oi is not None:
-                strikes[strike]["PE"] = pe_oi
-    return strikes
-
-
-def get_spot_price_and_step(data: dict):
-    records = data.get("records", {})
-    underlying = records.get("underlyingValue")
-    strike_prices = sorted(set(
-        item["strikePrice"]
-        for item in records.get("data", [])
-        if "strikePrice" in item
-    ))
-    step = None
-    if len(strike_prices) >= 2:
-        diffs = [j - i for i, j in zip(strike_prices[:-1], strike_prices[1:])]
-        step = min(diffs) if diffs else None
-    return underlying, step
 
+# ===========================
+# ALERT SENDING
+# ===========================
 
-def find_atm_strike(spot_price, strike_prices):
-    return min(strike_prices, key=lambda x: abs(x - spot_price))
+def _post_telegram(message: str) -> requests.Response:
+    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
+    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message, "parse_mode": "Markdown"}
+    return requests.post(url, json=payload, timeout=5)
 
 
-def compute_change_vs_baseline(base_oi: int | None, curr_oi: int | None):
+class NotificationDispatcher:
     """
-    Returns (pct_change_abs, diff, direction).
-    pct_change_abs is math.inf when base_oi == 0 (avoid division by zero).
+    Sends Telegram messages from a background thread, so a slow POST never holds up alert
+    evaluation or the next poll.
+
+    Jobs go through a bounded FIFO drained by a single worker, so messages arrive in the order
+    they were queued. Sends are spaced per chat (TELEGRAM_MIN_INTERVAL_SECONDS apart, at most
+    TELEGRAM_MAX_PER_MINUTE), network errors, 429s and 5xx are retried with exponential backoff
+    (429 honours Telegram's retry_after), and whatever is still queued at exit is sent for up to
+    NOTIFY_DRAIN_SECONDS. The worker starts on the first submit.
     """
-    if base_oi is None or curr_oi is None:
-        return None, None, None
-    if base_oi == 0:
-        diff = curr_oi - base_oi
-        direction = "UP" if diff > 0 else ("DOWN" if diff < 0 else "FLAT")
-        return inf, diff, direction
-    diff = curr_oi - base_oi
-    direction = "UP" if diff > 0 else ("DOWN" if diff < 0 else "FLAT")
-    return (abs(diff) / base_oi) * 100.0, diff, direction
-
-
-def fmt_pct(v) -> str:
-    """Format percentage safely — returns 'INF' for math.inf, 'N/A' for None."""
-    if v is None:
-        return "N/A"
-    if v == inf:
-        return "INF"
-    return f"{v:.2f}%"
 
+    _STOP = object()
+
+    def __init__(self, maxsize: int = NOTIFY_QUEUE_SIZE):
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._recent_sends: deque = deque()  # monotonic times of sends in the last minute
+        self.stats = {"sent": 0, "failed": 0, "retries": 0, "dropped": 0}
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notify", daemon=True)
+                self._thread.start()
+                atexit.register(self.drain)
+
+    def submit(self, message: str) -> bool:
+        """Queue a message for sending. Never blocks."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            log.warning("Notification queue full (%d); dropping message.", self._queue.maxsize)
+            return False
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def drain(self, timeout: float = NOTIFY_DRAIN_SECONDS):
+        """Send what is queued (up to `timeout` seconds), then stop the worker."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            log.warning("Exiting with %d notification(s) unsent.", self.pending())
+
+    def stats_str(self) -> str:
+        s = self.stats
+        return (
+            f"{s['sent']} sent, {s['failed']} failed, {s['retries']} retries, "
+            f"{s['dropped']} dropped, {self.pending()} pending"
+        )
 
-# ===========================
-# MAIN ALERT LOGIC
-# ===========================
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if message is self._STOP:
+                return
+            try:
+                self._deliver(message)
+            except Exception as e:
+                log.exception("Notification worker error: %s", e)
+
+    def _wait_for_send_slot(self):
+        now = time.monotonic()
+        while self._recent_sends and now - self._recent_sends[0] >= 60:
+            self._recent_sends.popleft()
+        wait = 0.0
+        if self._recent_sends:
+            wait = self._recent_sends[-1] + TELEGRAM_MIN_INTERVAL_SECONDS - now
+        if len(self._recent_sends) >= TELEGRAM_MAX_PER_MINUTE:
+            wait = max(wait, self._recent_sends[0] + 60 - now)
+        if wait > 0:
+            time.sleep(wait)
+        self._recent_sends.append(time.monotonic())
+
+    def _deliver(self, message: str) -> bool:
+        for attempt in range(TELEGRAM_MAX_RETRIES + 1):
+            self._wait_for_send_slot()
+            retry_after = None
+            try:
+                with metrics.span("telegram", in_cycle=False):
+                    resp = _post_telegram(message)
+                log.info("Telegram send status: %s", resp.status_code, extra={"status": resp.status_code})
+                if resp.ok:
+                    self.stats["sent"] += 1
+                    return True
+                if resp.status_code == 429:
+                    try:
+                        retry_after = resp.json().get("parameters", {}).get("retry_after")
+                    except ValueError:
+                        pass
+                elif resp.status_code < 500:
+                    break  # bad request / auth: retrying will not help
+                error = f"HTTP {resp.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt == TELEGRAM_MAX_RETRIES:
+                break
+            delay = float(retry_after) if retry_after else TELEGRAM_RETRY_BASE_SECONDS * 2 ** attempt
+            self.stats["retries"] += 1
+            log.warning(
+                "Telegram send failed (%s); retry %d/%d in %.1fs", error, attempt + 1, TELEGRAM_MAX_RETRIES, delay
+            )
+            time.sleep(delay)
+        self.stats["failed"] += 1
+        log.error("Error sending Telegram message; giving up.")
+        return False
 
-def check_alerts(
-    spot_price,
-    current_strikes: dict,
-    baseline_strikes: dict,
-    atm_strike,
-    step,
-    now_ist: datetime,
-    trading_date: str,
-    expiry_str: str,
-):
-    global _alert_active, _alert_dedup_date, _last_pcr_str
 
-    # Reset dedup state on new trading day
-    if _alert_dedup_date != trading_date:
-        _alert_active = {}
-        _alert_dedup_date = trading_date
+notifier = NotificationDispatcher()
 
-    def oi_to_lakhs(oi):
-        lots = oi * LOT_SIZE
-        return lots, f"{lots / 100_000:.2f}L"
 
-    if step is None:
-        print(f"[{now_ist}] Cannot determine strike step; aborting this cycle.")
+def send_telegram(message: str):
+    """Queue a Telegram message for the background sender; returns immediately."""
+    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
+        log.warning("Telegram not configured (missing TOKEN or CHAT_ID).")
         return
+    notifier.submit(message)
 
-    monitored_strikes = [atm_strike + i * step for i in range(-STRIKE_RANGE, STRIKE_RANGE + 1)]
 
-    # PCR across ATM ± 6 monitored strikes only
-    total_ce_oi = sum(current_strikes.get(s, {}).get("CE", 0) for s in monitored_strikes)
-    total_pe_oi = sum(current_strikes.get(s, {}).get("PE", 0) for s in monitored_strikes)
-    pcr = total_pe_oi / total_ce_oi if total_ce_oi > 0 else None
-    pcr_str = f"{pcr:.2f}" if pcr is not None else "N/A"
-    _last_pcr_str = pcr_str  # expose for close message
+def gemini_analysis(alert_texts: list[str]) -> str | None:
+    """
+    Ask Gemini for one brief trading interpretation covering all of a cycle's alerts
+    (blocking, for at most the client's LLM_BUDGET_SECONDS request timeout). Returns None
+    if Gemini is not configured or the call fails or times out.
+    """
+    client = get_gemini_client()
+    if client is None:
+        return None
 
-    print(f"[{now_ist}] Monitored strikes: {monitored_strikes}")
-    print(
-        f"[{now_ist}] Thresholds: OI_CHANGE>={OI_CHANGE_THRESHOLD_PERCENT}%, "
-        f"CE/PE ratio>={OI_RATIO_THRESHOLD}x"
+    system_prompt = (
+        "You are an NSE index options trading analyst. Given one or more Open Interest alerts "
+        "(possibly across NIFTY, BANKNIFTY, FINNIFTY, MIDCPNIFTY) from the same minute, provide a brief 3-5 line combined interpretation: what the "
+        "OI movement likely signals (bullish/bearish pressure, support/resistance), and "
+        "any key risk to watch. Be concise and actionable."
     )
-    print(f"[{now_ist}] Comparing vs BASELINE for {trading_date}, expiry {expiry_str}.")
+    alerts = "\n\n---\n\n".join(alert_texts)
 
-    for strike in monitored_strikes:
-        curr = current_strikes.get(strike)
-        base = baseline_strikes.get(strike)
+    try:
+        response = client.models.generate_content(
+            model="gemini-2.0-flash",
+            contents=f"{system_prompt}\n\nAlerts:\n{alerts}",
+        )
+        return response.text.strip()
+    except Exception as e:
+        log.warning("Gemini analysis failed (skipping): %s", e)
+        return None
 
-        if curr is None or base is None:
-            print(f"[{now_ist}] Strike {strike}: missing current or baseline data, skipping.")
-            continue
 
-        ce_curr = curr.get("CE", 0)
-        pe_curr = curr.get("PE", 0)
-        ce_base = base.get("CE", 0)
-        pe_base = base.get("PE", 0)
+def alert_signature(
+    symbol: str, expiry: str, trigger_side: str, strike, atm_strike, step, change_pct, ratio_dominant: str
+) -> str:
+    """
+    Normalized shape of an alert for the analysis cache: symbol, expiry, side, distance from
+    ATM in strikes, which side dominates the ratio and the trigger change in 100% buckets.
+    """
+    offset = round((strike - atm_strike) / step) if step else 0
+    if change_pct is None or not isfinite(change_pct):
+        bucket = "new"
+    else:
+        bucket = f"{int(change_pct // 100) * 100}%"
+    return f"{symbol}/{expiry}:{trigger_side}@ATM{offset:+d}|{ratio_dominant}|{bucket}"
 
-        if ce_curr == 0 and pe_curr == 0:
-            continue
 
-        ce_change_pct, ce_diff, ce_dir = compute_change_vs_baseline(ce_base, ce_curr)
-        pe_change_pct, pe_diff, pe_dir = compute_change_vs_baseline(pe_base, pe_curr)
+class GeminiAnalyst:
+    """
+    One Gemini call per poll cycle covering all of that cycle's alerts.
+
+    Answers are cached by the sorted set of alert signatures (see alert_signature) for
+    LLM_CACHE_TTL_SECONDS, so the same breach pattern later in the day reuses the earlier
+    analysis. Calls run on a small pool off the poll loop; an answer that is not back
+    within LLM_BUDGET_SECONDS of submit(), or a batch that could not start in time, is
+    dropped rather than sent late. The client's request timeout is the same budget, so a
+    hung call cannot occupy a worker for longer than that.
+    """
 
-        ce_trigger = ce_change_pct is not None and ce_change_pct >= OI_CHANGE_THRESHOLD_PERCENT
-        pe_trigger = pe_change_pct is not None and pe_change_pct >= OI_CHANGE_THRESHOLD_PERCENT
+    def __init__(self):
+        self._cache: OrderedDict = OrderedDict()  # signature key -> (monotonic stored, text)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gemini")
+        self.stats = {"calls": 0, "cache_hits": 0, "over_budget": 0, "failed": 0}
 
-        ratio = None
-        ratio_ok = False
-        if ce_curr > 0 and pe_curr > 0:
-            ratio = max(ce_curr, pe_curr) / min(ce_curr, pe_curr)
-            ratio_ok = ratio >= OI_RATIO_THRESHOLD
+    def _cached(self, key: tuple) -> str | None:
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is None:
+                return None
+            stored, text = hit
+            if time.monotonic() - stored > LLM_CACHE_TTL_SECONDS:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return text
+
+    def _store(self, key: tuple, text: str):
+        with self._lock:
+            self._cache[key] = (time.monotonic(), text)
+            self._cache.move_to_end(key)
+            while len(self._cache) > LLM_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def submit(self, alerts: list[tuple[str, str]]):
+        """alerts: (signature, alert text) for everything that fired this cycle. Never blocks."""
+        if not alerts:
+            return
+        key = tuple(sorted({sig for sig, _ in alerts}))
+        cached = self._cached(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            log.info("Gemini analysis reused from cache for %d alert(s).", len(alerts))
+            send_telegram(f"*Gemini Analysis (cached):*\n{cached}")
+            return
+        deadline = time.monotonic() + LLM_BUDGET_SECONDS
+        self._executor.submit(self._analyse, key, [text for _, text in alerts], deadline)
+
+    def _analyse(self, key: tuple, texts: list[str], deadline: float):
+        if time.monotonic() >= deadline:
+            self.stats["over_budget"] += 1
+            log.warning("Gemini analysis for %d alert(s) not started within budget; dropped.", len(texts))
+            return
+        self.stats["calls"] += 1
+        started = time.monotonic()
+        with metrics.span("gemini", in_cycle=False):
+            text = gemini_analysis(texts)
+        if text is None:
+            self.stats["failed"] += 1
+            return
+        self._store(key, text)
+        if time.monotonic() > deadline:
+            self.stats["over_budget"] += 1
+            log.warning(
+                "Gemini analysis took %.1fs (budget %gs); dropped.", time.monotonic() - started, LLM_BUDGET_SECONDS
+            )
+            return
+        send_telegram(f"*Gemini Analysis:*\n{text}")
+        log.info("Gemini analysis for %d alert(s) queued for Telegram.", len(texts))
 
-        print(
-            f"[{now_ist}] Strike {strike}: "
-            f"CE {ce_base}->{ce_curr} ({fmt_pct(ce_change_pct)}, {ce_dir}) trigger={ce_trigger} | "
-            f"PE {pe_base}->{pe_curr} ({fmt_pct(pe_change_pct)}, {pe_dir}) trigger={pe_trigger} | "
-            f"ratio={f'{ratio:.2f}x' if ratio else 'N/A'} ok={ratio_ok}"
-        )
+    def prewarm(self):
+        """Build the Gemini client in the background so the first analysis doesn't pay for the import."""
+        if GEMINI_API_KEY:
+            self._executor.submit(get_gemini_client)
 
-        if (ce_trigger or pe_trigger) and ratio_ok:
-            print(f"[{now_ist}] ALERT CONDITIONS MET for strike {strike}!")
+    def stats_str(self) -> str:
+        s = self.stats
+        return f"{s['calls']} calls, {s['cache_hits']} cache hits, {s['over_budget']} over budget, {s['failed']} failed"
 
-            trigger_side = "CE" if ce_trigger else "PE"
-            dedup_key = (trading_date, strike, trigger_side)
 
-            if not _alert_active.get(dedup_key, False):
-                _alert_active[dedup_key] = True
+analyst = GeminiAnalyst()
 
-                _, ce_lakhs = oi_to_lakhs(ce_curr)
-                _, pe_lakhs = oi_to_lakhs(pe_curr)
-                _, ce_base_lakhs = oi_to_lakhs(ce_base)
-                _, pe_base_lakhs = oi_to_lakhs(pe_base)
 
-                ratio_dominant = "CE dominant" if ce_curr >= pe_curr else "PE dominant"
-                pcr_context = "more calls" if (pcr is not None and pcr < 1) else ("more puts" if pcr is not None else "N/A")
-                change_sign_ce = "+" if ce_diff >= 0 else ""
-                change_sign_pe = "+" if pe_diff >= 0 else ""
+def send_llm_analysis(alerts: list[tuple[str, str]]):
+    """
+    Queue one Gemini interpretation of this cycle's alerts ((signature, text) pairs), sent
+    as a follow-up Telegram message. Silently skips if GEMINI_API_KEY (or Telegram) is not set.
+    """
+    if not GEMINI_API_KEY or not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
+        return
+    analyst.submit(alerts)
 
-                # Direction labels with trading context
-                ce_direction = (
-                    "INCREASING (resistance building)" if ce_dir == "UP"
-                    else "DECREASING (resistance weakening)" if ce_dir == "DOWN"
-                    else "FLAT"
-                )
-                pe_direction = (
-                    "INCREASING (support building)" if pe_dir == "UP"
-                    else "DECREASING (support weakening)" if pe_dir == "DOWN"
-                    else "FLAT"
-                )
 
-                alert_lines = [
-                    "=" * 40,
-                    f"*OI ALERT — {trigger_side} — Strike {strike}*",
-                    f"{now_ist.strftime('%H:%M:%S')} IST | {trading_date} | Exp: {expiry_str}",
-                    f"Spot: {spot_price}  |  ATM: {atm_strike}",
-                    "",
-                    f"*CE OI:*  {ce_base:,} → {ce_curr:,}  ({ce_base_lakhs} → {ce_lakhs})",
-                    f"*Change:*  {change_sign_ce}{ce_diff:,} contracts  |  {fmt_pct(ce_change_pct)}  — {ce_direction}",
-                    "",
-                    f"*PE OI:*  {pe_base:,} → {pe_curr:,}  ({pe_base_lakhs} → {pe_lakhs})",
-                    f"*Change:*  {change_sign_pe}{pe_diff:,} contracts  |  {fmt_pct(pe_change_pct)}  — {pe_direction}",
-                    "",
-                    f"CE/PE Ratio : {ratio:.2f}x  ({ratio_dominant})",
-                    f"PCR (ATM±6) : {pcr_str}  ({pcr_context} overall)",
-                    "=" * 40,
-                ]
-
-                log_alert_to_db(
-                    trading_date=trading_date,
-                    fired_time=now_ist.strftime("%H:%M"),
-                    strike=strike,
-                    option_type=trigger_side,
-                    ce_change_pct=ce_change_pct,
-                    pe_change_pct=pe_change_pct,
-                    ratio=ratio,
-                    ratio_dominant=ratio_dominant,
-                    pcr=pcr,
+def notify_alert(alert_text: str, **fields):
+    """Log the alert and queue it for delivery (the Gemini follow-up is batched per cycle)."""
+    log.warning("%s", alert_text, extra=dict(fields, event="alert"))
+    send_telegram(alert_text)
+
+
+# ===========================
+# PAYLOAD ARCHIVE
+# ===========================
+
+# Raw NSE option-chain responses, gzip-compressed, one append-only file per trading day
+# (<dir>/<YYYY-MM-DD>.gz) plus a line-per-cycle index (<YYYY-MM-DD>.idx); empty = disabled
+PAYLOAD_ARCHIVE_DIR = os.getenv("PAYLOAD_ARCHIVE_DIR", "payload_archive")
+# Days of archive kept (today included); older day files are deleted at the next day's first write
+PAYLOAD_ARCHIVE_DAYS = int(os.getenv("PAYLOAD_ARCHIVE_DAYS", "7"))
+# Cap on the whole archive directory; the oldest days go first, and if today alone hits the cap
+# archiving stops until tomorrow
+PAYLOAD_ARCHIVE_MAX_MB = float(os.getenv("PAYLOAD_ARCHIVE_MAX_MB", "1024"))
+PAYLOAD_ARCHIVE_GZIP_LEVEL = int(os.getenv("PAYLOAD_ARCHIVE_GZIP_LEVEL", "6"))
+
+
+class ArchiveEntry(NamedTuple):
+    ts: str                    # cycle time "HH:MM:SS" (IST)
+    symbol: str
+    expiry: str
+    offset: int                # byte offset of the payload's gzip member in the day file
+    length: int                # compressed length of that member
+    nse_timestamp: str | None  # records.timestamp, None if the body did not decode
+
+
+class PayloadArchive:
+    """
+    Append-only per-day archive of raw option-chain payloads.
+
+    Each payload is its own gzip member appended to <dir>/<date>.gz, so the day file is a
+    valid .gz stream (`zcat` gives every body back to back) and any single payload is one
+    seek + read + gzip.decompress of `length` bytes. The index <dir>/<date>.idx has one
+    tab-separated line per cycle and expiry: ts, symbol, expiry, offset, length, NSE timestamp.
+    The member is written and flushed before its index line, so a crash can leave orphan
+    bytes at the end of the .gz but never an index entry pointing at a partial member. A
+    payload whose NSE timestamp matches the previous one for the same chain is not stored
+    again; its index line points at the earlier member.
+
+    Compression and file I/O run on one background thread (started on the first submit,
+    drained at exit); submit() only enqueues the bytes the fetch already has in hand.
+    Retention: PAYLOAD_ARCHIVE_DAYS days and PAYLOAD_ARCHIVE_MAX_MB in total.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        directory: str = PAYLOAD_ARCHIVE_DIR,
+        keep_days: int = PAYLOAD_ARCHIVE_DAYS,
+        max_mb: float = PAYLOAD_ARCHIVE_MAX_MB,
+        level: int = PAYLOAD_ARCHIVE_GZIP_LEVEL,
+    ):
+        self.directory = directory
+        self.keep_days = keep_days
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.level = level
+        self._queue: queue.Queue = queue.Queue(maxsize=256)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        # Writer-thread state for the day file currently open
+        self._day: str | None = None
+        self._data = None
+        self._index = None
+        self._offset = 0
+        self._total_bytes = 0   # whole directory, as of the last scan plus what was appended since
+        self._full = False      # cap reached with only today left
+        self._last: dict[tuple[str, str], tuple[str, int, int]] = {}  # (symbol, expiry) -> (nse ts, offset, length)
+        self._index_cache: dict[str, tuple[float, dict]] = {}  # date -> (index mtime, entries)
+        self.stats = {"stored": 0, "deduplicated": 0, "dropped": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="payload-archive", daemon=True)
+                self._thread.start()
+                atexit.register(self.drain)
+
+    def submit(self, now_ist: datetime, symbol: str, expiry: str, raw: bytes, nse_timestamp: str | None = None):
+        """Queue one raw response for archiving. Never blocks; drops the payload if the writer is behind."""
+        if not self.enabled:
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((now_ist.date().isoformat(), now_ist.strftime("%H:%M:%S"),
+                                    symbol, expiry, raw, nse_timestamp))
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def drain(self, timeout: float = 10.0):
+        """Write what is queued (up to `timeout` seconds), then stop the worker and close the day files."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is self._STOP:
+                self._close_day()
+                return
+            try:
+                self._append(*job)
+            except OSError as e:
+                self.stats["dropped"] += 1
+                log.warning("Payload archive write failed: %s", e)
+
+    def _paths(self, trading_date: str) -> tuple[str, str]:
+        base = os.path.join(self.directory, trading_date)
+        return base + ".gz", base + ".idx"
+
+    def _open_day(self, trading_date: str):
+        self._close_day()
+        os.makedirs(self.directory, exist_ok=True)
+        data_path, index_path = self._paths(trading_date)
+        self._data = open(data_path, "ab")
+        self._index = open(index_path, "a", encoding="utf-8")
+        self._offset = self._data.seek(0, os.SEEK_END)
+        self._day = trading_date
+        self._last = {}
+        self._full = False
+        self.prune(trading_date)
+
+    def _close_day(self):
+        for f in (self._data, self._index):
+            if f is not None:
+                f.close()
+        self._data = self._index = None
+        self._day = None
+
+    def _append(self, trading_date: str, ts: str, symbol: str, expiry: str, raw: bytes, nse_timestamp: str | None):
+        if trading_date != self._day:
+            self._open_day(trading_date)
+        last = self._last.get((symbol, expiry))
+        if nse_timestamp and last is not None and last[0] == nse_timestamp:
+            offset, length = last[1], last[2]
+            self.stats["deduplicated"] += 1
+        else:
+            if self._full:
+                self.stats["dropped"] += 1
+                return
+            member = gzip.compress(raw, compresslevel=self.level, mtime=0)
+            offset, length = self._offset, len(member)
+            self._data.write(member)
+            self._data.flush()
+            self._offset += length
+            self._total_bytes += length
+            self._last[(symbol, expiry)] = (nse_timestamp, offset, length)
+            self.stats["stored"] += 1
+            self.stats["raw_bytes"] += len(raw)
+            self.stats["stored_bytes"] += length
+        line = f"{ts}\t{symbol}\t{expiry}\t{offset}\t{length}\t{nse_timestamp or ''}\n"
+        self._index.write(line)
+        self._index.flush()
+        self._total_bytes += len(line)
+        if self._total_bytes > self.max_bytes and not self._full:
+            self.prune(trading_date)
+
+    def days(self) -> list[str]:
+        """Trading dates with an archive file, oldest first."""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith(".gz"))
+
+    def _day_bytes(self, trading_date: str) -> int:
+        return sum(os.path.getsize(p) for p in self._paths(trading_date) if os.path.exists(p))
+
+    def prune(self, today: str) -> list[str]:
+        """
+        Delete day files older than the retention window, then the oldest remaining days
+        until the directory is under the size cap. Today's files are never deleted; if they
+        alone exceed the cap, new payloads are dropped until the next day. Returns deleted dates.
+        """
+        removed = []
+        days = self.days()
+        keep_from = (datetime.fromisoformat(today) - timedelta(days=max(self.keep_days, 1) - 1)).date().isoformat()
+        sizes = {d: self._day_bytes(d) for d in days}
+        total = sum(sizes.values())
+        for d in days:
+            if d == today:
+                continue
+            if d < keep_from or total > self.max_bytes:
+                for path in self._paths(d):
+                    if os.path.exists(path):
+                        os.remove(path)
+                total -= sizes[d]
+                self._index_cache.pop(d, None)
+                removed.append(d)
+        self._total_bytes = total
+        if total > self.max_bytes and not self._full:
+            self._full = True
+            log.warning(
+                "Payload archive at its %.0f MB cap with only %s left; not archiving more today.",
+                self.max_bytes / 1024 / 1024, today,
+            )
+        if removed:
+            log.info("Payload archive: removed %s.", ", ".join(removed))
+        return removed
+
+    def index(self, trading_date: str) -> dict[tuple[str, str, str], ArchiveEntry]:
+        """{(symbol, expiry, ts): entry} for one day, re-read only when the index file has grown."""
+        _, index_path = self._paths(trading_date)
+        try:
+            mtime = os.stat(index_path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        cached = self._index_cache.get(trading_date)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        entries = {}
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 6 or not line.endswith("\n"):
+                    continue  # partial last line from a crash
+                ts, symbol, expiry, offset, length, nse_ts = fields
+                entries[(symbol, expiry, ts)] = ArchiveEntry(ts, symbol, expiry, int(offset), int(length), nse_ts or None)
+        self._index_cache[trading_date] = (mtime, entries)
+        return entries
+
+    def entries(self, trading_date: str, symbol: str | None = None, expiry: str | None = None) -> list[ArchiveEntry]:
+        """Index entries for a day, optionally for one symbol/expiry, in cycle order."""
+        return sorted(
+            (e for e in self.index(trading_date).values()
+             if (symbol is None or e.symbol == symbol) and (expiry is None or e.expiry == expiry)),
+            key=lambda e: (e.ts, e.symbol, e.expiry),
+        )
+
+    def read_entry(self, trading_date: str, entry: ArchiveEntry) -> bytes:
+        data_path, _ = self._paths(trading_date)
+        with open(data_path, "rb") as f:
+            f.seek(entry.offset)
+            return gzip.decompress(f.read(entry.length))
+
+    def read(self, trading_date: str, symbol: str, expiry: str, ts: str) -> bytes | None:
+        """The raw payload fetched for (symbol, expiry) in the cycle at `ts` ("HH:MM:SS"), or None."""
+        entry = self.index(trading_date).get((symbol, expiry, ts))
+        return self.read_entry(trading_date, entry) if entry is not None else None
+
+    def stats_str(self) -> str:
+        s = self.stats
+        ratio = s["stored_bytes"] / s["raw_bytes"] if s["raw_bytes"] else 0.0
+        return (
+            f"{s['stored']} stored ({s['raw_bytes'] / 1024 / 1024:.1f} MB -> "
+            f"{s['stored_bytes'] / 1024 / 1024:.1f} MB, {ratio:.0%}), {s['deduplicated']} unchanged, "
+            f"{s['dropped']} dropped"
+        )
+
+
+payload_archive = PayloadArchive()
+
+
+# ===========================
+# NSE DATA FUNCTIONS
+# ===========================
+
+# Fields kept by decode_option_chain(); everything else in the NSE payload is dropped while parsing
+OPTION_FIELDS = ("openInterest", "totalTradedVolume", "lastPrice", "impliedVolatility")
+ROW_FIELDS = ("strikePrice", "CE", "PE")
+RECORD_FIELDS = ("records", "data", "underlyingValue", "expiryDates", "timestamp")
+
+
+def _prune_pairs(pairs: list[tuple]) -> dict:
+    """
+    object_pairs_hook for decode_option_chain(). Runs once per JSON object as the C scanner
+    finishes it, so pruned objects are what gets retained — the full NSE object tree
+    (20-odd fields per CE/PE leg) is never built.
+    """
+    obj = dict(pairs)
+    if "openInterest" in obj:
+        wanted = OPTION_FIELDS
+    elif "strikePrice" in obj:
+        wanted = ROW_FIELDS
+    else:
+        wanted = RECORD_FIELDS
+    return {k: obj[k] for k in wanted if k in obj}
+
+
+_chain_decoder = json.JSONDecoder(object_pairs_hook=_prune_pairs)
+
+
+def decode_option_chain(raw: bytes | str) -> dict:
+    """
+    Single-pass decode of an option-chain-v3 payload keeping only the fields this monitor
+    uses: records.{data[].strikePrice, data[].CE/PE.{openInterest, totalTradedVolume,
+    lastPrice, impliedVolatility}, underlyingValue, expiryDates, timestamp}.
+    The result has the same shape as resp.json(), so build_strike_map() accepts either.
+    Raises ValueError on malformed JSON.
+    """
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8")
+    return _chain_decoder.decode(raw)
+
+
+# Blocking requests calls run on this pool so an abandoned (timed-out) request never
+# holds up the event loop or asyncio.run() shutdown — requests' own timeouts reap the thread.
+_fetch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="nse-fetch")
+
+
+async def _nse_get_async(url: str, timeout: float) -> requests.Response:
+    """nse_session.get() on the fetch pool, cancelled if it has not completed within `timeout` seconds."""
+    if timeout <= 0:
+        raise asyncio.TimeoutError("fetch deadline reached")
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_fetch_executor, lambda: nse_session.get(url, timeout=timeout))
+    return await asyncio.wait_for(future, timeout)
+
+
+async def fetch_option_chain_async(
+    now_ist: datetime, expiry_str: str, symbol: str, deadline_seconds: float | None = None
+) -> dict | None:
+    """
+    Fetch `symbol`'s option chain for the given expiry without blocking the event loop.
+    Retries up to 3 times (5s between retries) on transient errors, but never runs past
+    `deadline_seconds` (default FETCH_DEADLINE_SECONDS) in total — an in-flight request
+    is cancelled at the deadline and None is returned. Response bodies that came back 200
+    are queued for the payload archive.
+    """
+    if deadline_seconds is None:
+        deadline_seconds = FETCH_DEADLINE_SECONDS
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_seconds
+
+    tags = {"symbol": symbol, "expiry": expiry_str}
+    log.debug("Fetching option chain from NSE for %s, expiry %s...", symbol, expiry_str, extra=tags)
+    url = f"{NSE_BASE_URL}?type=Indices&symbol={symbol}&expiry={expiry_str}"
+
+    for attempt in range(3):
+        metrics.count("nse_requests")
+        try:
+            remaining = deadline - loop.time()
+            resp = await _nse_get_async(url, min(10.0, remaining))
+            log.debug(
+                "%s: NSE response %s (attempt %d)", symbol, resp.status_code, attempt + 1,
+                extra=dict(tags, status=resp.status_code),
+            )
+            resp.raise_for_status()
+
+            try:
+                with metrics.span("decode"):
+                    data = decode_option_chain(resp.content)
+            except Exception:
+                metrics.count("nse_errors")
+                payload_archive.submit(now_ist, symbol, expiry_str, resp.content)
+                log.error("JSON decode failed. Response (first 500 chars): %s", resp.text[:500], extra=tags)
+                return None
+
+            if not isinstance(data, dict) or not data:
+                metrics.count("nse_errors")
+                log.warning("NSE returned empty JSON for %s expiry %s.", symbol, expiry_str, extra=tags)
+                return None
+
+            records = data.get("records", {})
+            if isinstance(records, dict):
+                payload_archive.submit(now_ist, symbol, expiry_str, resp.content, records.get("timestamp"))
+                log.debug("%s: records.data length: %d", symbol, len(records.get("data", [])), extra=tags)
+
+            return data
+
+        except Exception as e:
+            metrics.count("nse_errors")
+            reason = e if str(e) else type(e).__name__
+            log.warning("Error fetching %s option chain (attempt %d/3): %s", symbol, attempt + 1, reason, extra=tags)
+            if attempt < 2:
+                # Only retry if a full 5s back-off still leaves time for another request
+                if deadline - loop.time() <= 5:
+                    break
+                log.info("Retrying in 5s...", extra=tags)
+                await asyncio.sleep(5)
+
+    log.error(
+        "Giving up on %s expiry %s (%.0fs fetch deadline).", symbol, expiry_str, deadline_seconds, extra=tags
+    )
+    return None
+
+
+async def fetch_option_chains_async(
+    now_ist: datetime, targets: list[tuple[str, str]], deadline_seconds: float | None = None
+) -> dict[tuple[str, str], dict | None]:
+    """
+    Fetch several (symbol, expiry) chains concurrently under one shared deadline, over the
+    shared NSE session (one cookie warmup for all of them). Returns {(symbol, expiry): data or None}.
+    """
+    results = await asyncio.gather(
+        *(fetch_option_chain_async(now_ist, expiry, symbol, deadline_seconds) for symbol, expiry in targets)
+    )
+    return dict(zip(targets, results))
+
+
+def fetch_option_chains(now_ist: datetime, targets: list[tuple[str, str]]) -> dict[tuple[str, str], dict | None]:
+    """Blocking wrapper around fetch_option_chains_async() for the synchronous main loop."""
+    return asyncio.run(fetch_option_chains_async(now_ist, targets))
+
+
+def fetch_option_chain(now_ist: datetime, expiry_str: str, symbol: str) -> dict | None:
+    """
+    Fetch option chain for the given expiry.
+    Blocking wrapper around fetch_option_chain_async() for the synchronous main loop.
+    """
+    return asyncio.run(fetch_option_chain_async(now_ist, expiry_str, symbol))
+
+
+class StrikeChain:
+    """
+    One expiry's option chain as a few contiguous buffers instead of a dict per strike.
+
+    strikes is sorted ascending; ce_oi/pe_oi, volumes, LTPs and IVs are parallel arrays.
+    A missing side reads as OI 0 (has_ce/has_pe record whether NSE sent it), volume -1
+    and LTP/IV NaN. `step` is the smallest gap between strike prices in the payload.
+    Strike lookups and the ATM search are bisections over `strikes`.
+    """
+
+    __slots__ = (
+        "strikes", "ce_oi", "pe_oi", "has_ce", "has_pe",
+        "ce_volume", "pe_volume", "ce_ltp", "pe_ltp", "ce_iv", "pe_iv",
+        "spot", "step", "timestamp",
+    )
+
+    def __init__(self, spot=None, step=None, timestamp: str | None = None):
+        self.strikes = array("q")
+        self.ce_oi = array("q")
+        self.pe_oi = array("q")
+        self.has_ce = bytearray()
+        self.has_pe = bytearray()
+        self.ce_volume = array("q")
+        self.pe_volume = array("q")
+        self.ce_ltp = array("d")
+        self.pe_ltp = array("d")
+        self.ce_iv = array("d")
+        self.pe_iv = array("d")
+        self.spot = spot
+        self.step = step
+        self.timestamp = timestamp
+
+    def _append(self, strike: int, ce: dict | None, pe: dict | None):
+        ce = ce or {}
+        pe = pe or {}
+        ce_oi = ce.get("openInterest")
+        pe_oi = pe.get("openInterest")
+        self.strikes.append(int(strike))
+        self.ce_oi.append(int(ce_oi) if ce_oi is not None else 0)
+        self.pe_oi.append(int(pe_oi) if pe_oi is not None else 0)
+        self.has_ce.append(ce_oi is not None)
+        self.has_pe.append(pe_oi is not None)
+        self.ce_volume.append(int(ce.get("totalTradedVolume") or 0) if "totalTradedVolume" in ce else -1)
+        self.pe_volume.append(int(pe.get("totalTradedVolume") or 0) if "totalTradedVolume" in pe else -1)
+        self.ce_ltp.append(_as_float(ce.get("lastPrice")))
+        self.pe_ltp.append(_as_float(pe.get("lastPrice")))
+        self.ce_iv.append(_as_float(ce.get("impliedVolatility")))
+        self.pe_iv.append(_as_float(pe.get("impliedVolatility")))
+
+    @classmethod
+    def from_payload(cls, data: dict) -> "StrikeChain":
+        """
+        Build from an option-chain payload in one pass over records.data. Strikes with no OI
+        on either side are skipped (but still count towards `step`). NSE sends a single
+        expiry's rows in strike order; unsorted or repeated strikes fall back to a merge.
+        """
+        records = data.get("records", {})
+        chain = cls(spot=records.get("underlyingValue"), timestamp=records.get("timestamp"))
+        rows = []
+        prev = None
+        ordered = True
+        min_gap = None
+        for item in records.get("data", []):
+            strike = item.get("strikePrice")
+            if strike is None:
+                continue
+            if prev is not None:
+                gap = strike - prev
+                if gap <= 0:
+                    ordered = False
+                elif min_gap is None or gap < min_gap:
+                    min_gap = gap
+            prev = strike
+            ce = item.get("CE")
+            pe = item.get("PE")
+            if (ce and ce.get("openInterest") is not None) or (pe and pe.get("openInterest") is not None):
+                rows.append((strike, ce, pe))
+
+        if not ordered:
+            all_strikes = sorted({item["strikePrice"] for item in records.get("data", []) if "strikePrice" in item})
+            gaps = [j - i for i, j in zip(all_strikes[:-1], all_strikes[1:])]
+            min_gap = min(gaps) if gaps else None
+            merged: dict = {}
+            for strike, ce, pe in rows:
+                old_ce, old_pe = merged.get(strike, (None, None))
+                merged[strike] = (
+                    ce if ce and ce.get("openInterest") is not None else old_ce,
+                    pe if pe and pe.get("openInterest") is not None else old_pe,
                 )
-                notify_alert("\n".join(alert_lines))
-            else:
-                print(f"[{now_ist}] DEDUP: {strike} {trigger_side} already active, suppressing.")
+            rows = [(strike, ce, pe) for strike, (ce, pe) in sorted(merged.items())]
+
+        chain.step = min_gap
+        for strike, ce, pe in rows:
+            chain._append(strike, ce, pe)
+        return chain
+
+    @classmethod
+    def from_side_rows(cls, rows) -> "StrikeChain":
+        """Build from (strike, option_type, oi) rows, e.g. baseline_oi. OI only."""
+        sides: dict[int, dict[str, dict]] = {}
+        for strike, option_type, oi in rows:
+            sides.setdefault(strike, {})[option_type] = {"openInterest": oi}
+        chain = cls()
+        for strike in sorted(sides):
+            chain._append(strike, sides[strike].get("CE"), sides[strike].get("PE"))
+        if len(chain.strikes) >= 2:
+            chain.step = min(j - i for i, j in zip(chain.strikes[:-1], chain.strikes[1:]))
+        return chain
+
+    @classmethod
+    def from_oi_columns(cls, strikes, ce_oi, pe_oi, has_ce=None, has_pe=None,
+                        spot=None, timestamp: str | None = None) -> "StrikeChain":
+        """
+        Build from sorted, de-duplicated OI columns (e.g. one oi_ticks cycle) without a
+        per-strike Python pass. Volume/LTP/IV are marked missing.
+        """
+        chain = cls(spot=spot, timestamp=timestamp)
+        n = len(strikes)
+        chain.strikes = array("q", strikes)
+        chain.ce_oi = array("q", ce_oi)
+        chain.pe_oi = array("q", pe_oi)
+        chain.has_ce = bytearray(has_ce) if has_ce is not None else bytearray(b"\x01") * n
+        chain.has_pe = bytearray(has_pe) if has_pe is not None else bytearray(b"\x01") * n
+        chain.ce_volume = array("q", [-1]) * n
+        chain.pe_volume = array("q", [-1]) * n
+        chain.ce_ltp = array("d", [float("nan")]) * n
+        chain.pe_ltp = array("d", [float("nan")]) * n
+        chain.ce_iv = array("d", [float("nan")]) * n
+        chain.pe_iv = array("d", [float("nan")]) * n
+        if n >= 2:
+            chain.step = min(j - i for i, j in zip(chain.strikes[:-1], chain.strikes[1:]))
+        return chain
+
+    def __len__(self) -> int:
+        return len(self.strikes)
+
+    def index_of(self, strike) -> int:
+        """Position of `strike` in the chain, or -1."""
+        i = bisect_left(self.strikes, strike)
+        if i < len(self.strikes) and self.strikes[i] == strike:
+            return i
+        return -1
+
+    def get(self, strike) -> dict | None:
+        """{'CE': oi, 'PE': oi} for the sides present at `strike`, or None (dict-of-dicts view)."""
+        i = self.index_of(strike)
+        if i < 0:
+            return None
+        sides = {}
+        if self.has_ce[i]:
+            sides["CE"] = self.ce_oi[i]
+        if self.has_pe[i]:
+            sides["PE"] = self.pe_oi[i]
+        return sides
+
+    def atm_strike(self, spot_price):
+        return find_atm_strike(spot_price, self.strikes)
+
+    def align(self, strikes: "np.ndarray"):
+        """
+        Look up every strike in `strikes` at once. Returns (present, ce_oi, pe_oi) arrays:
+        present is False where the chain has no such strike, and OI reads 0 there.
+        """
+        own = self.strike_array()
+        if not len(own):
+            return np.zeros(len(strikes), dtype=bool), np.zeros(len(strikes), np.int64), np.zeros(len(strikes), np.int64)
+        idx = np.minimum(np.searchsorted(own, strikes), len(own) - 1)
+        present = own[idx] == strikes
+        ce = np.where(present, self.ce_array()[idx], 0)
+        pe = np.where(present, self.pe_array()[idx], 0)
+        return present, ce, pe
+
+    def content_digest(self) -> bytes:
+        """Hash of everything the monitor uses from the payload (spot and every strike's buffers)."""
+        h = hashlib.blake2b(repr(self.spot).encode(), digest_size=16)
+        for buf in (
+            self.strikes, self.ce_oi, self.pe_oi, self.has_ce, self.has_pe,
+            self.ce_volume, self.pe_volume, self.ce_ltp, self.pe_ltp, self.ce_iv, self.pe_iv,
+        ):
+            h.update(buf)
+        return h.digest()
+
+    def strike_array(self) -> "np.ndarray":
+        return np.frombuffer(self.strikes, dtype=np.int64)
+
+    def ce_array(self) -> "np.ndarray":
+        return np.frombuffer(self.ce_oi, dtype=np.int64)
+
+    def pe_array(self) -> "np.ndarray":
+        return np.frombuffer(self.pe_oi, dtype=np.int64)
+
+    def side_rows(self):
+        """(strike, option_type, oi) for every side NSE actually sent — baseline_oi rows."""
+        for i, strike in enumerate(self.strikes):
+            if self.has_ce[i]:
+                yield strike, "CE", self.ce_oi[i]
+            if self.has_pe[i]:
+                yield strike, "PE", self.pe_oi[i]
+
+    def tick_rows(self) -> list[tuple]:
+        """
+        oi_ticks rows: (strike, ce_oi, pe_oi, ce_volume, pe_volume, ce_ltp, pe_ltp, ce_iv, pe_iv).
+        Missing values are None.
+        """
+        def _v(x):
+            return None if x < 0 else x
+
+        def _f(x):
+            return None if x != x else x
+
+        return [
+            (
+                self.strikes[i],
+                self.ce_oi[i] if self.has_ce[i] else None,
+                self.pe_oi[i] if self.has_pe[i] else None,
+                _v(self.ce_volume[i]), _v(self.pe_volume[i]),
+                _f(self.ce_ltp[i]), _f(self.pe_ltp[i]),
+                _f(self.ce_iv[i]), _f(self.pe_iv[i]),
+            )
+            for i in range(len(self.strikes))
+        ]
+
+
+def _as_float(v) -> float:
+    return float(v) if v is not None else float("nan")
+
+
+def build_strike_map(data: dict) -> StrikeChain:
+    """Single pass over the payload into a StrikeChain (spot, step and per-strike CE/PE OI)."""
+    return StrikeChain.from_payload(data)
+
 
+def find_atm_strike(spot_price, strike_prices):
+    """Nearest strike to spot (lower strike on a tie). strike_prices must be sorted ascending."""
+    i = bisect_left(strike_prices, spot_price)
+    if i == 0:
+        return strike_prices[0]
+    if i == len(strike_prices):
+        return strike_prices[-1]
+    below, above = strike_prices[i - 1], strike_prices[i]
+    return below if spot_price - below <= above - spot_price else above
+
+
+def compute_change_vs_baseline(base_oi: int | None, curr_oi: int | None):
+    """
+    Returns (pct_change_abs, diff, direction).
+    pct_change_abs is math.inf when base_oi == 0 (avoid division by zero).
+    """
+    if base_oi is None or curr_oi is None:
+        return None, None, None
+    if base_oi == 0:
+        diff = curr_oi - base_oi
+        direction = "UP" if diff > 0 else ("DOWN" if diff < 0 else "FLAT")
+        return inf, diff, direction
+    diff = curr_oi - base_oi
+    direction = "UP" if diff > 0 else ("DOWN" if diff < 0 else "FLAT")
+    return (abs(diff) / base_oi) * 100.0, diff, direction
+
+
+def fmt_pct(v) -> str:
+    """Format percentage safely — returns 'INF' for math.inf, 'N/A' for None."""
+    if v is None:
+        return "N/A"
+    if v == inf:
+        return "INF"
+    return f"{v:.2f}%"
+
+
+# ===========================
+# MAIN ALERT LOGIC
+# ===========================
+
+def evaluate_oi_arrays(
+    strikes: "np.ndarray",
+    cur_present: "np.ndarray", ce_curr: "np.ndarray", pe_curr: "np.ndarray",
+    base_present: "np.ndarray", ce_base: "np.ndarray", pe_base: "np.ndarray",
+    change_threshold: float,
+    ratio_threshold: float,
+) -> dict:
+    """
+    Vectorised alert conditions for every strike in `strikes` at once.
+
+    Same rules as the per-strike loop it replaces:
+    - a strike is evaluated only if it has current AND baseline data and non-zero current OI
+    - % change is |curr - base| / base * 100, INF when base == 0 (compute_change_vs_baseline)
+    - CE/PE ratio is max/min, only when both sides are > 0
+    - alert when (CE or PE change >= change_threshold) AND ratio >= ratio_threshold
+    Returns a dict of equally-sized arrays.
+    """
+    evaluated = cur_present & base_present & ((ce_curr != 0) | (pe_curr != 0))
+    ce_diff = ce_curr - ce_base
+    pe_diff = pe_curr - pe_base
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ce_pct = np.where(ce_base == 0, inf, np.abs(ce_diff) / ce_base * 100.0)
+        pe_pct = np.where(pe_base == 0, inf, np.abs(pe_diff) / pe_base * 100.0)
+        both = (ce_curr > 0) & (pe_curr > 0)
+        ratio = np.where(both, np.maximum(ce_curr, pe_curr) / np.minimum(ce_curr, pe_curr), np.nan)
+    ratio_ok = both & (ratio >= ratio_threshold)
+    ce_trigger = ce_pct >= change_threshold
+    pe_trigger = pe_pct >= change_threshold
+    return {
+        "strikes": strikes,
+        "evaluated": evaluated,
+        "ce_curr": ce_curr, "pe_curr": pe_curr,
+        "ce_base": ce_base, "pe_base": pe_base,
+        "ce_diff": ce_diff, "pe_diff": pe_diff,
+        "ce_pct": ce_pct, "pe_pct": pe_pct,
+        "ce_trigger": ce_trigger, "pe_trigger": pe_trigger,
+        "ratio": ratio, "ratio_ok": ratio_ok,
+        "met": evaluated & (ce_trigger | pe_trigger) & ratio_ok,
+    }
+
+
+def _direction(diff: int) -> str:
+    return "UP" if diff > 0 else ("DOWN" if diff < 0 else "FLAT")
+
+
+def format_alert_message(
+    trigger_side: str, strike: int, now_ist: datetime, trading_date: str, expiry_str: str,
+    spot_price, atm_strike, ce_base: int, ce_curr: int, pe_base: int, pe_curr: int,
+    ce_change_pct: float, pe_change_pct: float, ratio: float, pcr, pcr_str: str,
+    symbol: str, lot_size: int, strike_range: int, levels: "ChainLevels | None" = None,
+) -> tuple[str, str]:
+    """Build the Telegram alert text (with max pain and walls when `levels` is given). Returns (message, ratio_dominant)."""
+    def oi_to_lakhs(oi):
+        lots = oi * lot_size
+        return lots, f"{lots / 100_000:.2f}L"
+
+    ce_diff = ce_curr - ce_base
+    pe_diff = pe_curr - pe_base
+    ce_dir = _direction(ce_diff)
+    pe_dir = _direction(pe_diff)
+
+    _, ce_lakhs = oi_to_lakhs(ce_curr)
+    _, pe_lakhs = oi_to_lakhs(pe_curr)
+    _, ce_base_lakhs = oi_to_lakhs(ce_base)
+    _, pe_base_lakhs = oi_to_lakhs(pe_base)
+
+    ratio_dominant = "CE dominant" if ce_curr >= pe_curr else "PE dominant"
+    pcr_context = "more calls" if (pcr is not None and pcr < 1) else ("more puts" if pcr is not None else "N/A")
+    change_sign_ce = "+" if ce_diff >= 0 else ""
+    change_sign_pe = "+" if pe_diff >= 0 else ""
+
+    # Direction labels with trading context
+    ce_direction = (
+        "INCREASING (resistance building)" if ce_dir == "UP"
+        else "DECREASING (resistance weakening)" if ce_dir == "DOWN"
+        else "FLAT"
+    )
+    pe_direction = (
+        "INCREASING (support building)" if pe_dir == "UP"
+        else "DECREASING (support weakening)" if pe_dir == "DOWN"
+        else "FLAT"
+    )
+
+    alert_lines = [
+        "=" * 40,
+        f"*{symbol} OI ALERT — {trigger_side} — Strike {strike}*",
+        f"{now_ist.strftime('%H:%M:%S')} IST | {trading_date} | Exp: {expiry_str}",
+        f"Spot: {spot_price}  |  ATM: {atm_strike}",
+        "",
+        f"*CE OI:*  {ce_base:,} → {ce_curr:,}  ({ce_base_lakhs} → {ce_lakhs})",
+        f"*Change:*  {change_sign_ce}{ce_diff:,} contracts  |  {fmt_pct(ce_change_pct)}  — {ce_direction}",
+        "",
+        f"*PE OI:*  {pe_base:,} → {pe_curr:,}  ({pe_base_lakhs} → {pe_lakhs})",
+        f"*Change:*  {change_sign_pe}{pe_diff:,} contracts  |  {fmt_pct(pe_change_pct)}  — {pe_direction}",
+        "",
+        f"CE/PE Ratio : {ratio:.2f}x  ({ratio_dominant})",
+        f"PCR (ATM±{strike_range}) : {pcr_str}  ({pcr_context} overall)",
+    ]
+    if levels is not None:
+        alert_lines += [""] + format_levels(levels, lot_size)
+    alert_lines.append("=" * 40)
+    return "\n".join(alert_lines), ratio_dominant
+
+
+def parse_velocity_windows(text: str) -> tuple[tuple[int, float], ...]:
+    """"5:25,15:40" -> ((5, 25.0), (15, 40.0)), shortest window first; empty when VELOCITY_ALERTS is off."""
+    if not VELOCITY_ALERTS:
+        return ()
+    pairs = []
+    for item in text.split(","):
+        if item.strip():
+            try:
+                minutes, pct = item.split(":")
+                pairs.append((int(minutes), float(pct)))
+            except ValueError:
+                raise ValueError(f"bad velocity window {item.strip()!r} in {text!r} (want minutes:percent)") from None
+    return tuple(sorted(pairs))
+
+
+class AlertConfig(NamedTuple):
+    """
+    Thresholds for one alert evaluation. The live monitor's per-symbol configs come from
+    SymbolState.from_env(), which also parses VELOCITY_WINDOWS; the default has none.
+    """
+    change_threshold: float = OI_CHANGE_THRESHOLD_PERCENT
+    ratio_threshold: float = OI_RATIO_THRESHOLD
+    strike_range: int = STRIKE_RANGE
+    full_chain: bool = MONITOR_FULL_CHAIN
+    velocity_windows: tuple = ()  # ((minutes, percent), ...)
+    velocity_min_contracts: int = VELOCITY_MIN_CONTRACTS
+
+
+class CycleResult(NamedTuple):
+    """Outcome of evaluate_cycle(). fired/suppressed hold (row index, trigger side); cleared holds (strike, side)."""
+    strikes: list
+    ev: dict
+    pcr: float | None
+    fired: list
+    suppressed: list
+    cleared: list
+
+
+def evaluate_cycle(
+    current: StrikeChain,
+    baseline: StrikeChain,
+    atm_strike,
+    step,
+    trading_date: str,
+    active: dict,
+    config: AlertConfig = AlertConfig(),
+) -> CycleResult:
+    """
+    Side-effect-free core of check_alerts(): evaluate the monitored strikes against the
+    baseline and apply the dedup rules to `active` (one expiry's SymbolState.alert_active).
+    A breach fires only if its (trading_date, strike, side) key is not already active;
+    a strike that is evaluated but no longer breaching clears both of its keys.
+    Used by the live loop and by offline replay.
+    """
+    if config.full_chain:
+        strikes = current.strike_array()
+    else:
+        strikes = atm_strike + step * np.arange(-config.strike_range, config.strike_range + 1, dtype=np.int64)
+
+    cur_present, ce_curr, pe_curr = current.align(strikes)
+    base_present, ce_base, pe_base = baseline.align(strikes)
+    ev = evaluate_oi_arrays(
+        strikes, cur_present, ce_curr, pe_curr, base_present, ce_base, pe_base,
+        config.change_threshold, config.ratio_threshold,
+    )
+    ev["missing"] = ~(cur_present & base_present)
+
+    # PCR across the monitored strikes only
+    total_ce_oi = int(ce_curr.sum())
+    total_pe_oi = int(pe_curr.sum())
+    pcr = total_pe_oi / total_ce_oi if total_ce_oi > 0 else None
+
+    monitored = strikes.tolist()
+    met = ev["met"]
+    fired, suppressed, cleared = [], [], []
+    for i in np.flatnonzero(met).tolist():
+        side = "CE" if ev["ce_trigger"][i] else "PE"
+        key = (trading_date, monitored[i], side)
+        if not active.get(key, False):
+            active[key] = True
+            fired.append((i, side))
         else:
-            # Conditions cleared — reset so next breach fires again
+            suppressed.append((i, side))
+
+    # Conditions cleared — reset so next breach fires again
+    if any(active.values()):
+        for i in np.flatnonzero(ev["evaluated"] & ~met).tolist():
             for side in ("CE", "PE"):
-                key = (trading_date, strike, side)
-                if _alert_active.get(key, False):
-                    _alert_active[key] = False
-                    print(f"[{now_ist}] DEDUP: Conditions cleared for {strike} {side} — will re-alert on next breach.")
+                key = (trading_date, monitored[i], side)
+                if active.get(key, False):
+                    active[key] = False
+                    cleared.append((monitored[i], side))
+
+    return CycleResult(monitored, ev, pcr, fired, suppressed, cleared)
+
+
+def alert_proximity(ev: dict, config: AlertConfig) -> "np.ndarray":
+    """
+    How close each evaluated strike is to alerting, as a fraction of its triggers: the
+    smaller of (bigger side's % change / change threshold) and (CE/PE ratio / ratio
+    threshold). 1.0 is exactly on threshold; >= 1 means the alert condition is met.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.maximum(ev["ce_pct"], ev["pe_pct"]) / config.change_threshold
+        ratio = np.nan_to_num(ev["ratio"], nan=0.0) / config.ratio_threshold
+    return np.minimum(change, ratio)[ev["evaluated"]]
+
+
+def alert_values(ev: dict, i: int) -> dict:
+    """Python scalars for row i of an evaluation (what format_alert_message/alert_log need)."""
+    ce_c, pe_c = int(ev["ce_curr"][i]), int(ev["pe_curr"][i])
+    return {
+        "ce_base": int(ev["ce_base"][i]), "ce_curr": ce_c,
+        "pe_base": int(ev["pe_base"][i]), "pe_curr": pe_c,
+        "ce_change_pct": float(ev["ce_pct"][i]), "pe_change_pct": float(ev["pe_pct"][i]),
+        "ce_trigger": bool(ev["ce_trigger"][i]), "pe_trigger": bool(ev["pe_trigger"][i]),
+        "ratio": float(ev["ratio"][i]) if (ce_c > 0 and pe_c > 0) else None,
+        "ratio_ok": bool(ev["ratio_ok"][i]),
+    }
+
+
+# ===========================
+# OI VELOCITY
+# ===========================
+
+class OIVelocityTracker:
+    """
+    Recent OI for every strike of one chain (symbol + expiry), for rate-of-change alerts.
+
+    Samples live in fixed-size ring buffers: `times` (one slot per poll) and `ce`/`pe`
+    (slot x strike). A strike absent from a sample reads -1; a missing side reads 0, as in
+    the baseline comparison. Each window keeps a cursor on its reference sample — the
+    newest one at least `window` seconds old — which only ever moves forward, so an update
+    costs one row write plus amortised O(1) cursor steps per window, and a window delta is
+    one subtraction against the reference row. A window has no reference until the buffer
+    holds that much history. Capacity must cover the longest window at the fastest poll.
+    """
+
+    def __init__(self, windows: tuple[int, ...], capacity: int):
+        self.windows = windows  # seconds
+        self.capacity = capacity
+        self.times = np.full(capacity, np.nan)
+        self.strikes = np.empty(0, dtype=np.int64)
+        self.ce = np.empty((capacity, 0), dtype=np.int64)
+        self.pe = np.empty((capacity, 0), dtype=np.int64)
+        self.count = 0                   # samples ever written; sample n lives in row n % capacity
+        self._cursor = [0] * len(windows)
+
+    def _add_strikes(self, strikes: "np.ndarray"):
+        """Widen the buffers to the union of known and new strikes (new columns read -1)."""
+        union = np.union1d(self.strikes, strikes)
+        cols = np.searchsorted(union, self.strikes)
+        for name in ("ce", "pe"):
+            wide = np.full((self.capacity, len(union)), -1, dtype=np.int64)
+            wide[:, cols] = getattr(self, name)
+            setattr(self, name, wide)
+        self.strikes = union
+
+    def update(self, t: float, chain: "StrikeChain"):
+        """Record one poll of `chain` taken at `t` (epoch seconds, increasing)."""
+        strikes = chain.strike_array()
+        row = self.count % self.capacity
+        if np.array_equal(strikes, self.strikes):
+            self.ce[row] = chain.ce_array()
+            self.pe[row] = chain.pe_array()
+        else:
+            if not np.isin(strikes, self.strikes).all():
+                self._add_strikes(strikes)
+            cols = np.searchsorted(self.strikes, strikes)
+            self.ce[row] = -1
+            self.pe[row] = -1
+            self.ce[row, cols] = chain.ce_array()
+            self.pe[row, cols] = chain.pe_array()
+        self.times[row] = t
+        self.count += 1
+
+        oldest = max(0, self.count - self.capacity)
+        for k, window in enumerate(self.windows):
+            n = max(self._cursor[k], oldest)
+            while n + 1 < self.count and self.times[(n + 1) % self.capacity] <= t - window:
+                n += 1
+            self._cursor[k] = n
+
+    def reference_row(self, k: int) -> int | None:
+        """Ring row of window k's reference sample, or None while there is not enough history."""
+        if not self.count:
+            return None
+        row = self._cursor[k] % self.capacity
+        latest = self.times[(self.count - 1) % self.capacity]
+        return row if self.times[row] <= latest - self.windows[k] else None
+
+    def deltas(self, strikes: "np.ndarray") -> list[dict | None]:
+        """
+        Per window (None where it has no reference yet): arrays over `strikes` of the OI at
+        the reference (ce_ref, pe_ref) and now (ce_now, pe_now), and `valid` where the strike
+        is in both samples.
+        """
+        latest = (self.count - 1) % self.capacity
+        idx = np.minimum(np.searchsorted(self.strikes, strikes), max(len(self.strikes) - 1, 0))
+        known = (self.strikes[idx] == strikes) if len(self.strikes) else np.zeros(len(strikes), dtype=bool)
+        ce_now, pe_now = self.ce[latest, idx], self.pe[latest, idx]
+        out = []
+        for k in range(len(self.windows)):
+            row = self.reference_row(k)
+            if row is None or not len(self.strikes):
+                out.append(None)
+                continue
+            ce_ref, pe_ref = self.ce[row, idx], self.pe[row, idx]
+            out.append({
+                "valid": known & (ce_now >= 0) & (ce_ref >= 0),
+                "ce_ref": ce_ref, "pe_ref": pe_ref, "ce_now": ce_now, "pe_now": pe_now,
+            })
+        return out
+
+
+def velocity_capacity(windows: tuple[int, ...]) -> int:
+    """Ring slots needed to hold the longest window at the fastest poll interval, with headroom."""
+    fastest = min(POLL_FLOOR_SECONDS, POLL_INTERVAL_SECONDS) if ADAPTIVE_POLLING else POLL_INTERVAL_SECONDS
+    return int(max(windows, default=0) / max(fastest, 1)) * 2 + 4
+
+
+class VelocityResult(NamedTuple):
+    """evaluate_velocity() outcome. fired/suppressed hold (row index, side, window index); cleared holds (strike, side)."""
+    fired: list
+    suppressed: list
+    cleared: list
+    windows: list  # per window: dict of arrays (ce_pct, pe_pct, ce_diff, pe_diff, ...) or None
+
+
+def evaluate_velocity(
+    tracker: OIVelocityTracker,
+    strikes: "np.ndarray",
+    trading_date: str,
+    active: dict,
+    config: "AlertConfig",
+) -> VelocityResult:
+    """
+    Velocity alert conditions for `strikes` with the same dedup rules as evaluate_cycle():
+    a side fires when its OI moved by at least a window's percent (and VELOCITY_MIN_CONTRACTS)
+    within that window, keyed (trading_date, strike, "CE-VEL"/"PE-VEL") in `active` so one
+    surge alerts once across all windows; the key clears when no window is breached.
+    The shortest breached window is reported.
+    """
+    per_window = tracker.deltas(strikes)
+    n = len(strikes)
+    evaluated = np.zeros(n, dtype=bool)
+    first = {"CE": np.full(n, -1), "PE": np.full(n, -1)}
+    for k, d in enumerate(per_window):
+        if d is None:
+            continue
+        threshold = config.velocity_windows[k][1]
+        evaluated |= d["valid"]
+        for side, ref, now in (("CE", d["ce_ref"], d["ce_now"]), ("PE", d["pe_ref"], d["pe_now"])):
+            diff = now - ref
+            with np.errstate(divide="ignore", invalid="ignore"):
+                pct = np.where(ref == 0, inf, np.abs(diff) / ref * 100.0)
+            d[f"{side.lower()}_diff"] = diff
+            d[f"{side.lower()}_pct"] = pct
+            hit = d["valid"] & (pct >= threshold) & (np.abs(diff) >= config.velocity_min_contracts)
+            first[side] = np.where((first[side] < 0) & hit, k, first[side])
+
+    monitored = strikes.tolist()
+    fired, suppressed, cleared = [], [], []
+    for side in ("CE", "PE"):
+        for i in np.flatnonzero(first[side] >= 0).tolist():
+            key = (trading_date, monitored[i], f"{side}-VEL")
+            k = int(first[side][i])
+            if not active.get(key, False):
+                active[key] = True
+                fired.append((i, side, k))
+            else:
+                suppressed.append((i, side, k))
+    # Conditions cleared — reset so the next surge fires again
+    if any(active.values()):
+        for side in ("CE", "PE"):
+            for i in np.flatnonzero(evaluated & (first[side] < 0)).tolist():
+                key = (trading_date, monitored[i], f"{side}-VEL")
+                if active.get(key, False):
+                    active[key] = False
+                    cleared.append((monitored[i], side))
+    return VelocityResult(fired, suppressed, cleared, per_window)
+
+
+def format_velocity_message(
+    side: str, strike: int, now_ist: datetime, trading_date: str, expiry_str: str,
+    spot_price, atm_strike, result: VelocityResult, i: int, k: int,
+    windows: tuple, symbol: str, lot_size: int, levels: "ChainLevels | None" = None,
+) -> str:
+    """Telegram text for a velocity alert: the breached window first, then every window with history."""
+    minutes = windows[k][0]
+    lines = [
+        "=" * 40,
+        f"*{symbol} OI VELOCITY — {side} — Strike {strike}*",
+        f"{now_ist.strftime('%H:%M:%S')} IST | {trading_date} | Exp: {expiry_str}",
+        f"Spot: {spot_price}  |  ATM: {atm_strike}",
+        f"{side} OI moved {fmt_pct(float(result.windows[k][f'{side.lower()}_pct'][i]))} in {minutes}m "
+        f"(threshold {windows[k][1]:g}%)",
+        "",
+    ]
+    for j, d in enumerate(result.windows):
+        if d is None or not d["valid"][i]:
+            continue
+        parts = []
+        for s in ("CE", "PE"):
+            ref, now, diff = int(d[f"{s.lower()}_ref"][i]), int(d[f"{s.lower()}_now"][i]), int(d[f"{s.lower()}_diff"][i])
+            parts.append(f"{s} {ref:,} → {now:,} ({diff:+,}, {fmt_pct(float(d[f'{s.lower()}_pct'][i]))})")
+        lines.append(f"*{windows[j][0]}m:*  " + "  |  ".join(parts))
+    if levels is not None:
+        lines += [""] + format_levels(levels, lot_size)
+    lines.append("=" * 40)
+    return "\n".join(lines)
+
+
+# ===========================
+# MAX PAIN & OI WALLS
+# ===========================
+
+class ChainLevels(NamedTuple):
+    """Max pain and OI walls of one chain. Walls are (strike, OI) pairs, biggest first."""
+    max_pain: int | None
+    ce_walls: list
+    pe_walls: list
+    resistance: int | None   # biggest CE wall at or above spot
+    support: int | None      # biggest PE wall at or below spot
+
+
+def max_pain_strike(strikes: "np.ndarray", ce: "np.ndarray", pe: "np.ndarray") -> int | None:
+    """
+    Strike at which option writers pay out least at expiry, in O(n) over sorted strikes.
+
+    Payout at settlement K_j is sum_k CE_k * max(0, K_j - K_k) + sum_k PE_k * max(0, K_k - K_j).
+    With prefix sums C_j = sum_{k<j} CE_k and CK_j = sum_{k<j} CE_k * K_k, the call side is
+    K_j * C_j - CK_j; the put side is the mirror image with suffix sums. Ties go to the lower strike.
+    """
+    if not len(strikes):
+        return None
+    k = strikes.astype(np.float64)
+    ce_f = ce.astype(np.float64)
+    pe_f = pe.astype(np.float64)
+    c_below = np.concatenate(([0.0], np.cumsum(ce_f)[:-1]))
+    ck_below = np.concatenate(([0.0], np.cumsum(ce_f * k)[:-1]))
+    p_above = np.concatenate((np.cumsum(pe_f[::-1])[::-1][1:], [0.0]))
+    pk_above = np.concatenate((np.cumsum((pe_f * k)[::-1])[::-1][1:], [0.0]))
+    payout = (k * c_below - ck_below) + (pk_above - k * p_above)
+    return int(strikes[int(np.argmin(payout))])
+
+
+def _walls(strikes: "np.ndarray", oi: "np.ndarray", n: int) -> list[tuple[int, int]]:
+    """
+    The n biggest (strike, OI) pairs with OI > 0, biggest first, equal OI by lower strike —
+    argpartition, O(len). Every strike tied at the cut-off is sorted in, since argpartition
+    picks among them arbitrarily.
+    """
+    n = min(n, len(oi))
+    if n <= 0:
+        return []
+    cutoff = max(int(oi[np.argpartition(oi, -n)[-n:]].min()), 1)
+    top = np.flatnonzero(oi >= cutoff)
+    top = top[np.lexsort((strikes[top], -oi[top]))][:n]
+    return [(int(strikes[i]), int(oi[i])) for i in top]
+
+
+def chain_levels(chain: "StrikeChain", spot, n_walls: int = LEVEL_WALLS) -> ChainLevels:
+    """Max pain, the n_walls biggest CE/PE walls, and support/resistance around `spot`, for the full chain."""
+    strikes, ce, pe = chain.strike_array(), chain.ce_array(), chain.pe_array()
+    resistance = support = None
+    if spot is not None and len(strikes):
+        above = strikes >= spot
+        if (ce[above] > 0).any():
+            resistance = int(strikes[above][int(np.argmax(ce[above]))])
+        below = strikes <= spot
+        if (pe[below] > 0).any():
+            support = int(strikes[below][int(np.argmax(pe[below]))])
+    return ChainLevels(
+        max_pain_strike(strikes, ce, pe),
+        _walls(strikes, ce, n_walls),
+        _walls(strikes, pe, n_walls),
+        resistance,
+        support,
+    )
+
+
+def format_levels(levels: "ChainLevels", lot_size: int) -> list[str]:
+    """Message lines for max pain, support/resistance and the walls."""
+    def _wall_list(walls):
+        return ", ".join(f"{s} ({oi * lot_size / 100_000:.2f}L)" for s, oi in walls) or "N/A"
+
+    return [
+        f"Max Pain : {levels.max_pain if levels.max_pain is not None else 'N/A'}  |  "
+        f"Support : {levels.support or 'N/A'}  |  Resistance : {levels.resistance or 'N/A'}",
+        f"CE walls : {_wall_list(levels.ce_walls)}",
+        f"PE walls : {_wall_list(levels.pe_walls)}",
+    ]
+
+
+_LEVEL_LABELS = {"max_pain": "Max Pain", "support": "Support", "resistance": "Resistance"}
+
+
+def format_level_shift_message(
+    symbol: str, expiry_str: str, now_ist: datetime, spot_price, shifts: list, levels: ChainLevels,
+    lot_size: int,
+) -> str:
+    """Telegram text for confirmed max pain / support / resistance moves."""
+    lines = [
+        f"*{symbol} Levels Shifted* — {now_ist.strftime('%H:%M:%S')} IST | Exp: {expiry_str}",
+        f"Spot: {spot_price}",
+    ]
+    for field, old, new in shifts:
+        lines.append(f"{_LEVEL_LABELS[field]} : {old or 'N/A'} → {new or 'N/A'}")
+    return "\n".join(lines + [""] + format_levels(levels, lot_size))
+
+
+class LevelTracker:
+    """
+    Reports when max pain, support or resistance moves between cycles for one chain.
+
+    A new value must hold for `confirm_cycles` consecutive cycles before it replaces the
+    reported one, so a level flickering between two neighbouring strikes is not reported
+    every poll. The first observation is taken as-is (nothing to report).
+    """
+
+    FIELDS = ("max_pain", "support", "resistance")
+
+    def __init__(self, confirm_cycles: int = LEVEL_SHIFT_CONFIRM_CYCLES):
+        self.confirm_cycles = max(confirm_cycles, 1)
+        self.reported: ChainLevels | None = None
+        self._pending: dict[str, tuple[int | None, int]] = {}  # field -> (candidate, cycles seen)
+
+    def observe(self, levels: ChainLevels) -> list[tuple[str, int | None, int | None]]:
+        """Feed one cycle's levels; returns the confirmed shifts as (field, old, new)."""
+        if self.reported is None:
+            self.reported = levels
+            return []
+        shifts = []
+        updates = {"ce_walls": levels.ce_walls, "pe_walls": levels.pe_walls}
+        for field in self.FIELDS:
+            old, new = getattr(self.reported, field), getattr(levels, field)
+            if new == old:
+                self._pending.pop(field, None)
+                continue
+            candidate, seen = self._pending.get(field, (new, 0))
+            seen = seen + 1 if candidate == new else 1
+            if seen >= self.confirm_cycles:
+                self._pending.pop(field, None)
+                updates[field] = new
+                shifts.append((field, old, new))
+            else:
+                self._pending[field] = (new, seen)
+        self.reported = self.reported._replace(**updates)
+        return shifts
+
+
+# ===========================
+# PER-SYMBOL STATE
+# ===========================
+
+def _symbol_env(name: str, symbol: str, default: str) -> str:
+    """<name>_<symbol> if set, else <name>, else default."""
+    return os.getenv(f"{name}_{symbol}", os.getenv(name, default))
+
+
+class SymbolState:
+    """
+    One monitored index: its lot size, alert thresholds and which expiries to follow, plus
+    the per-day state that used to be module globals (cached expiries, alert dedup keys per
+    expiry, last values for the close message). Baselines live in the shared BaselineCache
+    keyed by (symbol, expiry).
+    """
+
+    def __init__(self, symbol: str, lot_size: int, config: AlertConfig, expiry_count: int = 1,
+                 skip_expiry_day: bool = False, include_monthly: bool = False):
+        self.symbol = symbol
+        self.lot_size = lot_size
+        self.config = config
+        self.expiry_count = expiry_count
+        self.skip_expiry_day = skip_expiry_day
+        self.include_monthly = include_monthly
+        # Expiries are determined once per trading day per process
+        self.cached_expiries: list[str] = []
+        self.cached_expiry_date: str | None = None
+        # Alert deduplication — in-memory, resets each trading day
+        # Key: expiry -> (trading_date, strike, option_type)  e.g. ("2026-03-08", 23400, "CE")
+        # Value: True = conditions currently breached (alert already fired)
+        self.alert_active: dict[str, dict[tuple[str, int, str], bool]] = {}
+        self.alert_dedup_date: str | None = None
+        # Latest values for the close message
+        self.last_spot_price = None
+        self.last_atm_strike = None
+        self.last_pcr_by_expiry: dict[str, str] = {}
+        # Change detection: expiry -> (records.timestamp, content digest, parsed chain) of the
+        # last chain that went through alert evaluation; an identical payload skips the
+        # baseline and OI checks and only re-runs the velocity windows
+        self.last_payload: dict[str, tuple[str | None, bytes, StrikeChain]] = {}
+        self.unchanged_skips = 0
+        # expiry -> (trading_date, CycleResult, ChainLevels) of that evaluation
+        self.last_evaluation: dict[str, tuple[str, CycleResult, ChainLevels]] = {}
+        # expiry -> chains evaluated, for sampling per-strike DEBUG logs
+        self.strike_log_counts: dict[str, int] = {}
+        # expiry -> recent per-strike OI for velocity alerts (today only)
+        self.velocity: dict[str, OIVelocityTracker] = {}
+        # expiry -> last reported max pain / support / resistance (today only)
+        self.levels: dict[str, LevelTracker] = {}
+
+    def level_tracker(self, expiry: str) -> "LevelTracker":
+        tracker = self.levels.get(expiry)
+        if tracker is None:
+            tracker = self.levels[expiry] = LevelTracker()
+        return tracker
+
+    def velocity_tracker(self, expiry: str) -> "OIVelocityTracker":
+        tracker = self.velocity.get(expiry)
+        if tracker is None:
+            windows = tuple(minutes * 60 for minutes, _ in self.config.velocity_windows)
+            tracker = self.velocity[expiry] = OIVelocityTracker(windows, velocity_capacity(windows))
+        return tracker
+
+    @classmethod
+    def from_env(cls, symbol: str) -> "SymbolState":
+        """Settings for `symbol` from its <NAME>_<SYMBOL> overrides and the global env. Raises ValueError on a bad value."""
+        lot_default = str(LOT_SIZE if symbol == SYMBOL else DEFAULT_LOT_SIZES.get(symbol, LOT_SIZE))
+        return cls(
+            symbol,
+            lot_size=int(os.getenv(f"LOT_SIZE_{symbol}", lot_default)),
+            config=AlertConfig(
+                change_threshold=float(_symbol_env("OI_CHANGE_THRESHOLD_PERCENT", symbol, "400.0")),
+                ratio_threshold=float(_symbol_env("OI_RATIO_THRESHOLD", symbol, "2.0")),
+                strike_range=int(_symbol_env("STRIKE_RANGE", symbol, "6")),
+                full_chain=MONITOR_FULL_CHAIN,
+                velocity_windows=parse_velocity_windows(_symbol_env("VELOCITY_WINDOWS", symbol, VELOCITY_WINDOWS)),
+                velocity_min_contracts=int(_symbol_env("VELOCITY_MIN_CONTRACTS", symbol, str(VELOCITY_MIN_CONTRACTS))),
+            ),
+            expiry_count=int(_symbol_env("EXPIRY_COUNT", symbol, "1")),
+            skip_expiry_day=_symbol_env("SKIP_EXPIRY_DAY", symbol, "false").lower() in ("1", "true", "yes"),
+            include_monthly=_symbol_env("INCLUDE_MONTHLY_EXPIRY", symbol, "false").lower() in ("1", "true", "yes"),
+        )
+
+
+_symbol_states: list[SymbolState] | None = None
+
+
+def get_symbol_states() -> list[SymbolState]:
+    """
+    One SymbolState per SYMBOLS entry, built from the environment on first use — by
+    main_loop() at startup — so a malformed override stops the monitor, not every import
+    of this module (oi_replay.py, the bench scripts).
+    """
+    global _symbol_states
+    if _symbol_states is None:
+        states = []
+        for symbol in SYMBOLS:
+            try:
+                states.append(SymbolState.from_env(symbol))
+            except ValueError as e:
+                raise ValueError(f"{symbol} settings: {e}") from e
+        _symbol_states = states
+    return _symbol_states
+
+
+def check_alerts(
+    state: SymbolState,
+    spot_price,
+    current_strikes: StrikeChain,
+    baseline_strikes: StrikeChain,
+    atm_strike,
+    step,
+    now_ist: datetime,
+    trading_date: str,
+    expiry_str: str,
+) -> list[tuple[str, str]]:
+    """
+    Evaluate one (symbol, expiry) chain's monitored strikes, log and send what fired, and
+    report confirmed max pain / support / resistance shifts for the chain.
+    Returns (signature, alert text) for each fired alert, for the cycle's Gemini analysis.
+    """
+    symbol, config = state.symbol, state.config
+
+    # Reset dedup state on new trading day
+    if state.alert_dedup_date != trading_date:
+        state.alert_active = {}
+        state.alert_dedup_date = trading_date
+
+    if step is None:
+        log.warning("%s: cannot determine strike step; aborting this cycle.", symbol, extra={"symbol": symbol})
+        return []
+
+    result = evaluate_cycle(
+        current_strikes, baseline_strikes, atm_strike, step, trading_date,
+        state.alert_active.setdefault(expiry_str, {}), config,
+    )
+    monitored_strikes, ev, pcr = result.strikes, result.ev, result.pcr
+    pcr_str = f"{pcr:.2f}" if pcr is not None else "N/A"
+    state.last_pcr_by_expiry[expiry_str] = pcr_str  # expose for close message
+    poll_pacer.observe(symbol, expiry_str, alert_proximity(ev, config))
+    levels = chain_levels(current_strikes, spot_price)
+    state.last_evaluation[expiry_str] = (trading_date, result, levels)
+
+    tags = {"symbol": symbol, "expiry": expiry_str}
+    # Per-strike detail is DEBUG, and only every LOG_STRIKE_SAMPLE_EVERY-th evaluation of a
+    # chain; when it is off the loop below formats nothing.
+    n = state.strike_log_counts[expiry_str] = state.strike_log_counts.get(expiry_str, 0) + 1
+    detail = log.isEnabledFor(logging.DEBUG) and (n - 1) % max(LOG_STRIKE_SAMPLE_EVERY, 1) == 0
+    if detail:
+        log.debug(
+            "%s thresholds: OI_CHANGE>=%s%%, CE/PE ratio>=%sx; comparing vs BASELINE for %s, expiry %s, strikes %s",
+            symbol, config.change_threshold, config.ratio_threshold, trading_date, expiry_str,
+            monitored_strikes, extra=tags,
+        )
+        for i in np.flatnonzero(ev["missing"]).tolist():
+            log.debug(
+                "%s strike %s: missing current or baseline data, skipping.", symbol, monitored_strikes[i],
+                extra=dict(tags, strike=monitored_strikes[i]),
+            )
+
+    fired = dict(result.fired)
+    suppressed = dict(result.suppressed)
+    fired_alerts = []  # (signature, text) for the cycle's single Gemini analysis
+    for i in np.flatnonzero(ev["evaluated"]).tolist():
+        strike = monitored_strikes[i]
+        v = alert_values(ev, i)
+        ratio = v["ratio"]
+        if detail:
+            log.debug(
+                "%s strike %s: CE %s->%s (%s, %s) trigger=%s | PE %s->%s (%s, %s) trigger=%s | ratio=%s ok=%s",
+                symbol, strike,
+                v["ce_base"], v["ce_curr"], fmt_pct(v["ce_change_pct"]), _direction(v["ce_curr"] - v["ce_base"]),
+                v["ce_trigger"],
+                v["pe_base"], v["pe_curr"], fmt_pct(v["pe_change_pct"]), _direction(v["pe_curr"] - v["pe_base"]),
+                v["pe_trigger"],
+                f"{ratio:.2f}x" if ratio else "N/A", v["ratio_ok"],
+                extra=dict(tags, strike=strike),
+            )
+
+        if i in fired:
+            log.info("ALERT CONDITIONS MET for %s strike %s!", symbol, strike, extra=dict(tags, strike=strike))
+            trigger_side = fired[i]
+            alert_text, ratio_dominant = format_alert_message(
+                trigger_side, strike, now_ist, trading_date, expiry_str, spot_price, atm_strike,
+                v["ce_base"], v["ce_curr"], v["pe_base"], v["pe_curr"],
+                v["ce_change_pct"], v["pe_change_pct"], ratio, pcr, pcr_str,
+                symbol, state.lot_size, config.strike_range, levels,
+            )
+            log_alert_to_db(
+                trading_date=trading_date,
+                symbol=symbol,
+                expiry=expiry_str,
+                fired_time=now_ist.strftime("%H:%M:%S"),
+                strike=strike,
+                option_type=trigger_side,
+                ce_change_pct=v["ce_change_pct"],
+                pe_change_pct=v["pe_change_pct"],
+                ratio=ratio,
+                ratio_dominant=ratio_dominant,
+                pcr=pcr,
+            )
+            notify_alert(alert_text, symbol=symbol, expiry=expiry_str, strike=strike, side=trigger_side)
+            fired_alerts.append((
+                alert_signature(
+                    symbol, expiry_str, trigger_side, strike, atm_strike, step,
+                    v["ce_change_pct"] if trigger_side == "CE" else v["pe_change_pct"], ratio_dominant,
+                ),
+                alert_text,
+            ))
+        elif i in suppressed:
+            log.info(
+                "DEDUP: %s %s %s conditions met but already active, suppressing.", symbol, strike, suppressed[i],
+                extra=dict(tags, strike=strike, side=suppressed[i]),
+            )
+
+    for strike, side in result.cleared:
+        log.info(
+            "DEDUP: Conditions cleared for %s %s %s — will re-alert on next breach.", symbol, strike, side,
+            extra=dict(tags, strike=strike, side=side),
+        )
+
+    tracker = state.velocity.get(expiry_str)
+    if tracker is not None and config.velocity_windows:
+        fired_alerts += check_velocity_alerts(
+            state, tracker, result, spot_price, atm_strike, step, now_ist, trading_date, expiry_str, pcr, levels
+        )
+
+    shifts = state.level_tracker(expiry_str).observe(levels)
+    if shifts:
+        log.info(
+            "%s %s levels shifted: %s", symbol, expiry_str,
+            ", ".join(f"{field} {old} -> {new}" for field, old, new in shifts),
+            extra=dict(tags, max_pain=levels.max_pain, support=levels.support, resistance=levels.resistance),
+        )
+        if LEVEL_SHIFT_ALERTS:
+            send_telegram(format_level_shift_message(
+                symbol, expiry_str, now_ist, spot_price, shifts, levels, state.lot_size
+            ))
+
+    return fired_alerts
+
+
+def check_velocity_alerts(
+    state: SymbolState,
+    tracker: OIVelocityTracker,
+    result: CycleResult,
+    spot_price,
+    atm_strike,
+    step,
+    now_ist: datetime,
+    trading_date: str,
+    expiry_str: str,
+    pcr,
+    levels: ChainLevels | None = None,
+) -> list[tuple[str, str]]:
+    """Velocity alerts for the strikes check_alerts() just evaluated; same dedup dict, own keys."""
+    symbol, config = state.symbol, state.config
+    tags = {"symbol": symbol, "expiry": expiry_str}
+    vres = evaluate_velocity(
+        tracker, result.ev["strikes"], trading_date, state.alert_active[expiry_str], config
+    )
+    fired_alerts = []
+    for i, side, k in vres.fired:
+        strike = result.strikes[i]
+        minutes = config.velocity_windows[k][0]
+        d = vres.windows[k]
+        ce_now, pe_now = int(d["ce_now"][i]), int(d["pe_now"][i])
+        ratio = max(ce_now, pe_now) / min(ce_now, pe_now) if ce_now > 0 and pe_now > 0 else None
+        ratio_dominant = "CE dominant" if ce_now >= pe_now else "PE dominant"
+        change_pct = float(d[f"{side.lower()}_pct"][i])
+        log.info(
+            "VELOCITY CONDITIONS MET for %s strike %s %s (%s in %dm)!", symbol, strike, side,
+            fmt_pct(change_pct), minutes, extra=dict(tags, strike=strike, side=side, window_minutes=minutes),
+        )
+        alert_text = format_velocity_message(
+            side, strike, now_ist, trading_date, expiry_str, spot_price, atm_strike,
+            vres, i, k, config.velocity_windows, symbol, state.lot_size, levels,
+        )
+        option_type = f"{side}-VEL{minutes}"
+        log_alert_to_db(
+            trading_date=trading_date,
+            symbol=symbol,
+            expiry=expiry_str,
+            fired_time=now_ist.strftime("%H:%M:%S"),
+            strike=strike,
+            option_type=option_type,
+            ce_change_pct=float(d["ce_pct"][i]),
+            pe_change_pct=float(d["pe_pct"][i]),
+            ratio=ratio,
+            ratio_dominant=ratio_dominant,
+            pcr=pcr,
+        )
+        notify_alert(alert_text, symbol=symbol, expiry=expiry_str, strike=strike, side=option_type)
+        fired_alerts.append((
+            alert_signature(symbol, expiry_str, option_type, strike, atm_strike, step, change_pct, ratio_dominant),
+            alert_text,
+        ))
+    for i, side, k in vres.suppressed:
+        log.info(
+            "DEDUP: %s %s %s velocity already active, suppressing.", symbol, result.strikes[i], side,
+            extra=dict(tags, strike=result.strikes[i], side=f"{side}-VEL"),
+        )
+    for strike, side in vres.cleared:
+        log.info(
+            "DEDUP: Velocity cleared for %s %s %s — will re-alert on next surge.", symbol, strike, side,
+            extra=dict(tags, strike=strike, side=f"{side}-VEL"),
+        )
+    return fired_alerts
 
 
 # ===========================
@@ -758,15 +3211,16 @@ def check_alerts(
 # ===========================
 
 def ensure_baseline_for_today(
+    state: SymbolState,
     now_ist: datetime,
     expiry_str: str,
-    strikes_dict: dict,
+    chain: StrikeChain,
     spot_price,
     atm_strike,
     step,
 ) -> tuple[bool, str]:
     """
-    Ensure a baseline snapshot exists for (today, expiry_str).
+    Ensure a baseline snapshot exists for (today, state.symbol, expiry_str).
 
     Timing rules:
     - Before 09:15 IST: script is outside market hours (never reaches here)
@@ -777,93 +3231,487 @@ def ensure_baseline_for_today(
     Returns (baseline_ready, trading_date).
     """
     trading_date = now_ist.date().isoformat()
-
-    if baseline_exists(trading_date, expiry_str):
-        btime = get_baseline_time(trading_date, expiry_str)
-        print(
-            f"[{now_ist}] Baseline exists for {trading_date}, expiry {expiry_str}"
-            + (f" (captured at {btime} IST)" if btime else "")
+    symbol, config, lot_size = state.symbol, state.config, state.lot_size
+
+    cached = baseline_cache.get(trading_date, symbol, expiry_str)
+    if cached is not None:
+        _, btime = cached
+        log.debug(
+            "Baseline exists for %s, %s expiry %s (captured at %s IST)", trading_date, symbol, expiry_str, btime,
+            extra={"symbol": symbol, "expiry": expiry_str},
         )
         return True, trading_date
 
     t = now_ist.time()
-    if t < dtime(9, 18):
-        print(f"[{now_ist}] Waiting for 09:18 IST to capture baseline (OI settling period)...")
+    if t < BASELINE_CAPTURE_TIME:
+        log.info("Waiting for 09:18 IST to capture baseline (OI settling period)...", extra={"symbol": symbol})
         return False, trading_date
 
     late = t > dtime(9, 23)
     if late:
-        print(f"[{now_ist}] Capturing baseline LATE (after 09:23 IST). Still valid as today's reference.")
+        log.warning(
+            "Capturing %s baseline LATE (after 09:23 IST). Still valid as today's reference.", symbol,
+            extra={"symbol": symbol, "expiry": expiry_str},
+        )
 
-    store_baseline_snapshot(trading_date, expiry_str, now_ist, strikes_dict)
+    store_baseline_snapshot(trading_date, symbol, expiry_str, now_ist, chain)
 
     # --- Build rich baseline Telegram message ---
     capture_time_str = now_ist.strftime("%H:%M:%S")
     late_note = " *(LATE CAPTURE)*" if late else ""
 
-    # Top 3 strikes by CE OI and PE OI across entire chain
-    def _top3(side):
-        ranked = sorted(
-            [(s, d.get(side, 0)) for s, d in strikes_dict.items() if d.get(side, 0) > 0],
-            key=lambda x: x[1], reverse=True,
-        )[:3]
-        lines = []
-        for s, oi in ranked:
-            lakhs = oi * LOT_SIZE / 100_000
-            lines.append(f"  {s} : {oi:,} contracts ({lakhs:.2f}L)")
-        return lines
-
-    # PCR for ATM ± STRIKE_RANGE
-    atm6 = [atm_strike + i * step for i in range(-STRIKE_RANGE, STRIKE_RANGE + 1)]
-    ce6  = sum(strikes_dict.get(s, {}).get("CE", 0) for s in atm6)
-    pe6  = sum(strikes_dict.get(s, {}).get("PE", 0) for s in atm6)
+    # Max pain, support/resistance and the biggest CE/PE OI walls across the entire chain
+    levels = chain_levels(chain, spot_price)
+
+    def _wall_lines(walls):
+        return [f"  {s} : {oi:,} contracts ({oi * lot_size / 100_000:.2f}L)" for s, oi in walls]
+
+    # PCR for ATM ± strike_range
+    atm6 = atm_strike + step * np.arange(-config.strike_range, config.strike_range + 1, dtype=np.int64)
+    _, ce_atm6, pe_atm6 = chain.align(atm6)
+    ce6  = int(ce_atm6.sum())
+    pe6  = int(pe_atm6.sum())
     pcr6 = pe6 / ce6 if ce6 > 0 else None
     pcr6_str = f"{pcr6:.2f}" if pcr6 is not None else "N/A"
     pcr6_ctx = "more calls" if (pcr6 is not None and pcr6 < 1) else ("more puts" if pcr6 is not None else "N/A")
 
     # PCR across entire chain
-    total_ce = sum(d.get("CE", 0) for d in strikes_dict.values())
-    total_pe = sum(d.get("PE", 0) for d in strikes_dict.values())
+    total_ce = int(chain.ce_array().sum())
+    total_pe = int(chain.pe_array().sum())
     pcr_all  = total_pe / total_ce if total_ce > 0 else None
     pcr_all_str = f"{pcr_all:.2f}" if pcr_all is not None else "N/A"
     pcr_all_ctx = "more calls" if (pcr_all is not None and pcr_all < 1) else ("more puts" if pcr_all is not None else "N/A")
 
-    ce_top_lines = _top3("CE")
-    pe_top_lines = _top3("PE")
+    ce_top_lines = _wall_lines(levels.ce_walls)
+    pe_top_lines = _wall_lines(levels.pe_walls)
 
     msg_lines = [
-        f"*Baseline Captured{late_note} — Monitoring Live*",
+        f"*{symbol} Baseline Captured{late_note} — Monitoring Live*",
         f"Date     : {trading_date}  |  Expiry : {expiry_str}",
         f"Captured : {capture_time_str} IST",
         f"Spot     : {spot_price}  |  ATM : {atm_strike}",
         "",
-        f"*Top CE OI Strikes (full chain):*",
+        f"*Max Pain* : {levels.max_pain if levels.max_pain is not None else 'N/A'}",
+        f"*Support* (PE wall ≤ spot) : {levels.support or 'N/A'}  |  "
+        f"*Resistance* (CE wall ≥ spot) : {levels.resistance or 'N/A'}",
+        "",
+        "*Top CE OI Strikes (full chain):*",
     ] + ce_top_lines + [
         "",
-        f"*Top PE OI Strikes (full chain):*",
+        "*Top PE OI Strikes (full chain):*",
     ] + pe_top_lines + [
         "",
-        f"*PCR (ATM ±{STRIKE_RANGE})* : {pcr6_str}  ({pcr6_ctx})",
+        f"*PCR (ATM ±{config.strike_range})* : {pcr6_str}  ({pcr6_ctx})",
         f"*PCR (full chain)*  : {pcr_all_str}  ({pcr_all_ctx})",
         "",
-        f"Monitoring ATM ±{STRIKE_RANGE} strikes.",
-        f"Alert when: OI change ≥{OI_CHANGE_THRESHOLD_PERCENT:.0f}% AND ratio ≥{OI_RATIO_THRESHOLD}x",
+        f"Monitoring ATM ±{config.strike_range} strikes.",
+        f"Alert when: OI change ≥{config.change_threshold:.0f}% AND ratio ≥{config.ratio_threshold}x",
     ]
     send_telegram("\n".join(msg_lines))
 
     return True, trading_date
 
 
+# ===========================
+# POLL SCHEDULER
+# ===========================
+
+class PollScheduler:
+    """
+    Drift-free poll clock. Ticks sit on a fixed wall-clock grid of `interval_seconds`
+    anchored at BASELINE_CAPTURE_TIME (09:18:00 IST), so with a 60s interval cycles
+    fire at hh:mm:00 and the baseline cycle lands exactly on 09:18:00.
+
+    Time spent fetching/alerting is absorbed by sleeping only until the next tick.
+    A tick that is already more than TICK_GRACE_SECONDS in the past when the previous
+    cycle finishes is skipped (counted in `skipped_ticks`) instead of firing late, so
+    overruns never cause cycles to bunch up.
+
+    `interval` may be changed between ticks (AdaptivePollPacer); the next tick is then on
+    the new interval's grid, which still contains 09:18:00. Missed ticks are counted on
+    the grid of the interval that was in effect when the previous tick fired.
+    """
+
+    def __init__(self, interval_seconds: float, anchor: dtime = BASELINE_CAPTURE_TIME,
+                 grace_seconds: float = TICK_GRACE_SECONDS):
+        self.interval = float(interval_seconds)
+        self.anchor = anchor
+        self.grace = grace_seconds
+        self.last_tick: datetime | None = None
+        self.last_interval = self.interval  # interval in effect when last_tick fired
+        self.last_lateness = 0.0
+        self.fired_ticks = 0
+        self.skipped_ticks = 0
+        # Seconds between each tick and the moment its cycle actually started (recent window)
+        self.lateness: deque[float] = deque(maxlen=1000)
+
+    def next_tick_at_or_after(self, t: datetime) -> datetime:
+        """First grid tick >= t (grid anchored at `anchor` on t's date)."""
+        anchor_dt = datetime.combine(t.date(), self.anchor, tzinfo=t.tzinfo)
+        k = ceil((t - anchor_dt).total_seconds() / self.interval)
+        return anchor_dt + timedelta(seconds=k * self.interval)
+
+    def wait_for_next_tick(self) -> datetime:
+        """Sleep until the next tick that is not already missed; returns the cycle start time (IST)."""
+        now = datetime.now(IST)
+        earliest = now - timedelta(seconds=self.grace)
+        if self.last_tick is not None:
+            # Ticks of the previous cycle's grid that are already past the grace period
+            gap = (earliest - self.last_tick).total_seconds()
+            skipped = max(ceil(gap / self.last_interval) - 1, 0)
+            if skipped > 0:
+                self.skipped_ticks += skipped
+                overrun = (now - self.last_tick).total_seconds() - self.last_interval
+                log.warning(
+                    "Scheduler: previous cycle overran by %.1fs, skipping %d missed tick(s).", overrun, skipped
+                )
+            earliest = max(earliest, self.last_tick + timedelta(microseconds=1))
+        tick = self.next_tick_at_or_after(earliest)
+
+        delay = (tick - now).total_seconds()
+        if delay > 0:
+            time.sleep(delay)
+
+        # Never report a start time before the tick (guards against early wake-ups / clock slew)
+        started = max(datetime.now(IST), tick)
+        self.last_tick = tick
+        self.last_interval = self.interval
+        self.last_lateness = (started - tick).total_seconds()
+        self.lateness.append(self.last_lateness)
+        self.fired_ticks += 1
+        return started
+
+    def lateness_summary(self) -> str:
+        if not self.lateness:
+            return "no ticks fired"
+        ordered = sorted(self.lateness)
+        p50 = ordered[len(ordered) // 2]
+        return (
+            f"{self.fired_ticks} ticks, {self.skipped_ticks} skipped, "
+            f"lateness p50={p50 * 1000:.0f}ms max={ordered[-1] * 1000:.0f}ms"
+        )
+
+
+class AdaptivePollPacer:
+    """
+    Chooses the next poll interval from how close the market is to an alert.
+
+    check_alerts() reports each chain's alert_proximity() and run_symbol_cycle() reports
+    spot crossing strikes (ATM change). After every cycle next_interval() picks from a
+    ladder of intervals (floor, doublings of it, the base interval, ceiling):
+    - near: a strike within `near_margin` of its triggers (either side of them), or an
+      ATM change this cycle → floor
+    - far: every strike below `far_fraction` of its triggers → one rung slower, up to
+      the ceiling
+    - otherwise → the base POLL_INTERVAL_SECONDS
+    The result is then raised, if needed, to respect the NSE request budget: the last
+    cycle's request count (API calls, retries, warmups) must fit budget-per-minute at
+    that interval, and the rolling minute at the next poll must have room for another
+    cycle, else it defers to a slower rung. A chain whose
+    payload was unchanged keeps its last proximity.
+    """
+
+    def __init__(self, base: float = POLL_INTERVAL_SECONDS, floor: float = POLL_FLOOR_SECONDS,
+                 ceiling: float = POLL_CEILING_SECONDS, budget_per_minute: int = NSE_REQUEST_BUDGET_PER_MINUTE,
+                 near_margin: float = POLL_NEAR_MARGIN, far_fraction: float = POLL_FAR_FRACTION):
+        floor = min(floor, base)
+        ceiling = max(ceiling, base)
+        ladder = {float(base), float(ceiling)}
+        rung = float(floor)
+        while rung < ceiling:
+            ladder.add(rung)
+            rung *= 2
+        self.ladder = sorted(ladder)
+        self.base = float(base)
+        self.budget = budget_per_minute
+        self.near_margin = near_margin
+        self.far_fraction = far_fraction
+        self.interval = float(base)
+        self.reason = "start"
+        # (symbol, expiry) -> (near, far, closest level below the near band) from the last evaluation
+        self._proximity: dict[tuple[str, str], tuple[bool, bool, float]] = {}
+        self._atm_moves: list[str] = []
+        self._requests_seen = 0
+        self.cycles_at: dict[float, int] = {}
+        self.budget_deferrals = 0
+
+    def observe(self, symbol: str, expiry: str, levels: "np.ndarray"):
+        """Record one chain's alert_proximity() levels."""
+        near_band = np.abs(levels - 1.0) <= self.near_margin
+        below = levels[levels < 1.0 - self.near_margin]
+        self._proximity[(symbol, expiry)] = (
+            bool(near_band.any()),
+            bool((levels < self.far_fraction).all()),
+            float(below.max()) if len(below) else 0.0,
+        )
+
+    def note_atm_move(self, symbol: str, old_atm, new_atm):
+        self._atm_moves.append(f"{symbol} ATM {old_atm}->{new_atm}")
+
+    def retain(self, symbol: str, expiries: list[str]):
+        """Forget `symbol`'s expiries that are no longer monitored."""
+        for key in [k for k in self._proximity if k[0] == symbol and k[1] not in expiries]:
+            del self._proximity[key]
+
+    def _rung_at_least(self, seconds: float) -> float:
+        for rung in self.ladder:
+            if rung >= seconds:
+                return rung
+        return self.ladder[-1]
+
+    def next_interval(self) -> float:
+        """Interval until the next poll, from this cycle's observations; resets the ATM notes."""
+        near = [f"{sym} {exp}" for (sym, exp), (is_near, _, _) in self._proximity.items() if is_near]
+        all_far = bool(self._proximity) and all(far for _, far, _ in self._proximity.values())
+        if near or self._atm_moves:
+            wanted = self.ladder[0]
+            self.reason = "near threshold: " + ", ".join(near + self._atm_moves)
+        elif all_far:
+            wanted = self._rung_at_least(self.interval + 1) if self.interval >= self.base else self.base
+            self.reason = "all strikes far from thresholds"
+        else:
+            wanted = self.base
+            self.reason = "normal"
+        self._atm_moves = []
+
+        # Request budget: last cycle's request count must fit the per-minute budget at this interval
+        used = nse_session.requests_total - self._requests_seen
+        self._requests_seen = nse_session.requests_total
+        if self.budget > 0 and used > 0:
+            budget_min = 60.0 * used / self.budget
+            if budget_min > wanted:
+                wanted = self._rung_at_least(budget_min)
+                self.reason += f" (budget: {used} req/cycle)"
+            # Requests still inside the rolling minute when the next poll fires, plus that poll's own
+            deferred = False
+            while wanted < self.ladder[-1] and nse_session.requests_in_last(60 - wanted) + used > self.budget:
+                wanted = self._rung_at_least(wanted + 1)
+                deferred = True
+            if deferred:
+                self.budget_deferrals += 1
+                self.reason += " (budget: rolling minute full)"
+
+        self.interval = wanted
+        self.cycles_at[wanted] = self.cycles_at.get(wanted, 0) + 1
+        return wanted
+
+    def closest_level(self) -> float:
+        """Highest proximity level below the near band across all chains (for logging)."""
+        return max((level for _, _, level in self._proximity.values()), default=0.0)
+
+    def stats_str(self) -> str:
+        spread = ", ".join(f"{rung:.0f}s x{n}" for rung, n in sorted(self.cycles_at.items()))
+        return f"intervals {spread or 'none'}; {self.budget_deferrals} budget deferrals"
+
+
+poll_pacer = AdaptivePollPacer()
+
+
 # ===========================
 # MAIN LOOP
 # ===========================
 
-def main_loop():
-    global _close_message_sent_date, _last_spot_price, _last_atm_strike, _last_expiry_str
+def run_symbol_cycle(state: SymbolState, now_ist: datetime, expiry_str: str, data: dict) -> list | None:
+    """
+    One (symbol, expiry) chain's share of a cycle, after it is fetched: parse → tick
+    history → velocity → baseline → alerts. Returns the fired (signature, text) pairs, or
+    None if the chain stopped early (logged).
+
+    NSE often serves the same snapshot on consecutive polls. A payload whose
+    records.timestamp matches the last evaluated one reuses its parsed chain; one whose
+    timestamp or content matches is still stored as a tick and fed to the velocity
+    windows (which slide with time, so can fire or clear on unchanged OI), but the
+    baseline and OI-change checks are skipped and counted in state.unchanged_skips.
+    """
+    symbol = state.symbol
+    trading_date = now_ist.date().isoformat()
+    tags = {"symbol": symbol, "expiry": expiry_str}
 
-    print(f"Starting {SYMBOL} OI monitor | ATM +/- {STRIKE_RANGE} strikes | Poll: {POLL_INTERVAL_SECONDS}s")
-    print(f"Thresholds: OI change >={OI_CHANGE_THRESHOLD_PERCENT}% AND CE/PE ratio >={OI_RATIO_THRESHOLD}x")
-    init_db()
+    nse_timestamp = (data.get("records") or {}).get("timestamp")
+    last = state.last_payload.get(expiry_str)
+    if last is not None and nse_timestamp and last[0] == nse_timestamp:
+        _, digest, current_strikes = last
+    else:
+        with metrics.span("parse"):
+            current_strikes = build_strike_map(data)
+            digest = current_strikes.content_digest()
+    unchanged = last is not None and last[1] == digest and expiry_str in state.last_evaluation
+
+    spot_price, step = current_strikes.spot, current_strikes.step
+    if spot_price is None or step is None:
+        log.warning("%s %s: could not determine spot price or strike step. Skipping.", symbol, expiry_str, extra=tags)
+        return None
+
+    if not len(current_strikes):
+        log.warning("%s %s: no strikes in option chain data. Skipping.", symbol, expiry_str, extra=tags)
+        return None
+
+    atm_strike = current_strikes.atm_strike(spot_price)
+    log.info(
+        "%s Spot: %s | ATM: %s | Step: %s | Expiry: %s", symbol, spot_price, atm_strike, step, expiry_str,
+        extra=dict(tags, spot=spot_price, atm=atm_strike),
+    )
+
+    if STORE_TICK_HISTORY:
+        with metrics.span("db"):
+            store_tick_snapshot(trading_date, symbol, expiry_str, now_ist, current_strikes)
+
+    if state.config.velocity_windows:
+        state.velocity_tracker(expiry_str).update(now_ist.timestamp(), current_strikes)
+
+    if unchanged:
+        state.unchanged_skips += 1
+        state.last_payload[expiry_str] = (nse_timestamp, digest, current_strikes)
+        log.info(
+            "%s %s: unchanged (NSE timestamp %s), skipping baseline and OI checks.",
+            symbol, expiry_str, nse_timestamp, extra=tags,
+        )
+        tracker = state.velocity.get(expiry_str)
+        if tracker is None or not state.config.velocity_windows:
+            return []
+        eval_date, result, levels = state.last_evaluation[expiry_str]
+        with metrics.span("alerts"):
+            return check_velocity_alerts(
+                state, tracker, result, spot_price, atm_strike, step, now_ist, eval_date, expiry_str,
+                result.pcr, levels,
+            )
+
+    if state.last_atm_strike is not None and atm_strike != state.last_atm_strike:
+        poll_pacer.note_atm_move(symbol, state.last_atm_strike, atm_strike)
+
+    # Track latest values for close message
+    state.last_spot_price = spot_price
+    state.last_atm_strike = atm_strike
+
+    with metrics.span("db"):
+        baseline_ready, trading_date = ensure_baseline_for_today(
+            state, now_ist, expiry_str, current_strikes, spot_price, atm_strike, step
+        )
+        cached = baseline_cache.get(trading_date, symbol, expiry_str) if baseline_ready else None
+    if not baseline_ready:
+        log.info("%s %s: baseline not ready.", symbol, expiry_str, extra=tags)
+        return None
+    if cached is None:
+        log.warning("%s: baseline empty for %s/%s. Skipping this cycle.", symbol, trading_date, expiry_str, extra=tags)
+        return None
+    baseline_strikes, btime = cached
+
+    with metrics.span("alerts"):
+        fired = check_alerts(
+            state,
+            spot_price=spot_price,
+            current_strikes=current_strikes,
+            baseline_strikes=baseline_strikes,
+            atm_strike=atm_strike,
+            step=step,
+            now_ist=now_ist,
+            trading_date=trading_date,
+            expiry_str=expiry_str,
+        )
+    state.last_payload[expiry_str] = (nse_timestamp, digest, current_strikes)
+    return fired
+
+
+def run_cycle(now_ist: datetime) -> bool:
+    """
+    One poll cycle for every monitored (symbol, expiry): expiries → one concurrent fetch of
+    all chains over the shared NSE session → per-chain parse/history/baseline/alerts → a
+    single Gemini batch for everything that fired.
+    Returns True if alerts were evaluated for at least one chain (an unchanged payload
+    counts: its previous evaluation still stands). Stage timings go to `metrics`.
+    """
+    metrics.begin_cycle()
+    trading_date = now_ist.date().isoformat()
+    states = get_symbol_states()
+
+    # Determine each symbol's active expiries (from NSE API, cached per day)
+    # To switch to the hardcoded fallback: replace the get_active_expiries() call with
+    # [get_current_weekly_expiry_from_list(now_ist)]
+    targets: list[tuple[SymbolState, str]] = []
+    with metrics.span("expiry"):
+        for state in states:
+            expiries = get_active_expiries(now_ist, state)
+            if not expiries:
+                log.warning(
+                    "%s: could not determine expiry. Skipping this cycle.", state.symbol, extra={"symbol": state.symbol}
+                )
+                continue
+            baseline_cache.retain(trading_date, state.symbol, expiries)
+            poll_pacer.retain(state.symbol, expiries)
+            targets += [(state, expiry_str) for expiry_str in expiries]
+    if not targets:
+        metrics.end_cycle(now_ist, chains=0, evaluated=0, unchanged=0)
+        log.warning("No expiry for any symbol. Waiting for next tick...")
+        return False
+
+    with metrics.span("fetch"):
+        chains = fetch_option_chains(now_ist, [(state.symbol, expiry_str) for state, expiry_str in targets])
+
+    evaluated = 0
+    skipped_before = sum(state.unchanged_skips for state in states)
+    fired_alerts = []
+    for state, expiry_str in targets:
+        data = chains.get((state.symbol, expiry_str))
+        if data is None:
+            log.warning(
+                "%s %s: no data from NSE. Skipping this cycle.", state.symbol, expiry_str,
+                extra={"symbol": state.symbol, "expiry": expiry_str},
+            )
+            continue
+        fired = run_symbol_cycle(state, now_ist, expiry_str, data)
+        if fired is not None:
+            evaluated += 1
+            fired_alerts += fired
+
+    send_llm_analysis(fired_alerts)
+    skipped_total = sum(state.unchanged_skips for state in states)
+    timing = metrics.end_cycle(
+        now_ist, chains=len(targets), evaluated=evaluated, unchanged=skipped_total - skipped_before
+    )
+    log.info(
+        "Cycle complete in %.2fs (%d/%d chains evaluated, %d unchanged; %d unchanged skips today). "
+        "Waiting for next tick...",
+        timing["total"], evaluated, len(targets), skipped_total - skipped_before, skipped_total,
+        extra={"stages_ms": {stage: round(timing[stage] * 1000, 1) for stage in CycleMetrics.CYCLE_STAGES}},
+    )
+    return evaluated > 0
+
+
+def _exit_on_sigterm(signum, frame):
+    """
+    SIGTERM (the workflow's `timeout` ending the session) becomes SystemExit, so the
+    atexit hooks still drain the log, Telegram and payload-archive queues.
+    """
+    log.warning("SIGTERM received; flushing queued logs, messages and payloads before exit.")
+    raise SystemExit(128 + signum)
+
+
+def main_loop():
+    global _close_message_sent_date
+
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    states = get_symbol_states()  # parses the per-symbol settings; a bad value stops the monitor here
+    log.info("=== Starting %s OI Monitor (Baseline vs 09:18 Snapshot) ===", "/".join(SYMBOLS))
+    log.info("Monitoring %s | Poll: %ss", ", ".join(SYMBOLS), POLL_INTERVAL_SECONDS)
+    if ADAPTIVE_POLLING:
+        log.info(
+            "Adaptive polling: %s-%ss (ladder %ss), NSE budget %s requests/min",
+            POLL_FLOOR_SECONDS, POLL_CEILING_SECONDS, ", ".join(f"{r:.0f}" for r in poll_pacer.ladder),
+            NSE_REQUEST_BUDGET_PER_MINUTE,
+        )
+    for state in states:
+        c = state.config
+        log.info(
+            "%s: lot %s | ATM +/- %s strikes | OI change >=%s%% AND CE/PE ratio >=%sx | %d expir%s%s%s",
+            state.symbol, state.lot_size, c.strike_range, c.change_threshold, c.ratio_threshold,
+            state.expiry_count, "y" if state.expiry_count == 1 else "ies",
+            " + monthly" if state.include_monthly else "",
+            ", skipping expiry-day expiry" if state.skip_expiry_day else "",
+        )
+    log.info(
+        "Module loaded in %.0fms (numpy and the Gemini client load on first use); logging %s at %s",
+        _startup_ms(), LOG_FORMAT, LOG_LEVEL,
+    )
 
     now_ist = datetime.now(IST)
     today_str = now_ist.date().isoformat()
@@ -872,34 +3720,43 @@ def main_loop():
     holiday_name = get_holiday_name(today_str)
     if holiday_name:
         send_telegram(
-            f"*NIFTY OI Monitor — Market Holiday*\n"
+            f"*{'/'.join(SYMBOLS)} OI Monitor — Market Holiday*\n"
             f"Date    : {today_str}\n"
             f"Holiday : {holiday_name}\n"
             f"NSE is closed today. No monitoring."
         )
-        print(f"[{now_ist}] Market holiday: {holiday_name}. Exiting.")
+        log.info("Market holiday: %s. Exiting.", holiday_name)
         return
 
+    init_db()
+    analyst.prewarm()
+
     # Suppress startup ping if baseline already exists (mid-day restart / PM session handoff)
     if not any_baseline_today(today_str):
-        startup_expiry = get_current_expiry(now_ist)
-        expiry_line = f"Expiry   : {startup_expiry}" if startup_expiry else "Expiry   : will be detected at market open"
+        symbol_lines = []
+        for state in states:
+            startup_expiries = ", ".join(get_active_expiries(now_ist, state)) or "detected at market open"
+            symbol_lines.append(
+                f"{state.symbol:<10}: expiry {startup_expiries} | lot {state.lot_size} | "
+                f"ATM ±{state.config.strike_range}"
+            )
         send_telegram(
-            f"*NIFTY OI Monitor — Session Starting*\n"
+            f"*{'/'.join(SYMBOLS)} OI Monitor — Session Starting*\n"
             f"Date     : {today_str}\n"
-            f"Time     : {now_ist.strftime('%H:%M:%S')} IST\n"
-            f"Symbol   : {SYMBOL} | Lot size: {LOT_SIZE} | Poll: {POLL_INTERVAL_SECONDS}s\n"
-            f"{expiry_line}\n"
-            f"Baseline will be captured at 09:17 IST and used as today's reference values.\n"
-            f"Monitoring ATM ±{STRIKE_RANGE} strikes."
+            f"Time     : {now_ist.strftime('%H:%M:%S')} IST | Poll: {POLL_INTERVAL_SECONDS}s\n"
+            + "\n".join(symbol_lines) + "\n"
+            "Baseline will be captured at 09:17 IST and used as today's reference values."
         )
     else:
-        print(f"[{now_ist}] Baseline already exists for {today_str} — skipping startup ping (PM session or restart).")
+        log.info("Baseline already exists for %s — skipping startup ping (PM session or restart).", today_str)
+
+    scheduler = PollScheduler(POLL_INTERVAL_SECONDS)
 
     while True:
-        now_ist = datetime.now(IST)
+        now_ist = scheduler.wait_for_next_tick()
 
         if not is_market_hours_ist(now_ist):
+            scheduler.interval = POLL_INTERVAL_SECONDS
             # Send market close summary once at 3:33 PM on days when we were actively monitoring
             today_str = now_ist.date().isoformat()
             if (
@@ -909,81 +3766,90 @@ def main_loop():
             ):
                 send_market_close_message(now_ist, today_str)
                 _close_message_sent_date = today_str
+                log.info("Poll scheduler: %s", scheduler.lateness_summary())
+                if ADAPTIVE_POLLING:
+                    log.info("Adaptive polling: %s", poll_pacer.stats_str())
+                log.info("NSE session: %s", nse_session.stats_str())
+                log.info(
+                    "Unchanged payloads skipped: %s",
+                    ", ".join(f"{state.symbol} {state.unchanged_skips}" for state in states),
+                )
+                log.info("Notifications: %s", notifier.stats_str())
+                log.info("Gemini: %s", analyst.stats_str())
+                if payload_archive.enabled:
+                    log.info("Payload archive: %s", payload_archive.stats_str())
 
-            print(f"[{now_ist}] Outside market hours, sleeping {POLL_INTERVAL_SECONDS}s...")
-            time.sleep(POLL_INTERVAL_SECONDS)
+            log.debug("Outside market hours, waiting for next tick...")
             continue
 
-        print(f"\n[{now_ist}] --- New cycle ---")
-
-        # Determine active expiry (from NSE API, cached per day)
-        # To switch to hardcoded fallback: uncomment WEEKLY_EXPIRIES above and replace next line with:
-        #   expiry_str = get_current_weekly_expiry_from_list(now_ist)
-        expiry_str = get_current_expiry(now_ist)
-        if expiry_str is None:
-            print(f"[{now_ist}] Could not determine expiry. Sleeping and retrying...")
-            time.sleep(POLL_INTERVAL_SECONDS)
-            continue
+        log.info(
+            "--- New cycle --- (tick %s, %.0fms late)",
+            scheduler.last_tick.strftime("%H:%M:%S"), scheduler.last_lateness * 1000,
+        )
 
-        data = fetch_option_chain(now_ist, expiry_str)
-        if data is None:
-            print(f"[{now_ist}] No data from NSE. Sleeping...")
-            time.sleep(POLL_INTERVAL_SECONDS)
-            continue
+        run_cycle(now_ist)
 
-        spot_price, step = get_spot_price_and_step(data)
-        if spot_price is None or step is None:
-            print(f"[{now_ist}] Could not determine spot price or strike step. Sleeping...")
-            time.sleep(POLL_INTERVAL_SECONDS)
-            continue
+        if ADAPTIVE_POLLING:
+            scheduler.interval = poll_pacer.next_interval()
+            log.info(
+                "Next poll in %.0fs (%s; closest strike at %.0f%% of its triggers)",
+                scheduler.interval, poll_pacer.reason, poll_pacer.closest_level() * 100,
+            )
 
-        current_strikes = build_strike_map(data)
-        all_strikes = sorted(current_strikes.keys())
-        if not all_strikes:
-            print(f"[{now_ist}] No strikes in option chain data. Sleeping...")
-            time.sleep(POLL_INTERVAL_SECONDS)
-            continue
 
-        atm_strike = find_atm_strike(spot_price, all_strikes)
-        print(f"[{now_ist}] Spot: {spot_price} | ATM: {atm_strike} | Step: {step} | Expiry: {expiry_str}")
+# ===========================
+# STARTUP REPORT
+# ===========================
 
-        # Track latest values for close message
-        _last_spot_price = spot_price
-        _last_atm_strike = atm_strike
-        _last_expiry_str = expiry_str
+def _startup_ms() -> float:
+    return (time.perf_counter() - _MODULE_LOAD_STARTED) * 1000
 
-        baseline_ready, trading_date = ensure_baseline_for_today(
-            now_ist, expiry_str, current_strikes, spot_price, atm_strike, step
-        )
-        if not baseline_ready:
-            print(f"[{now_ist}] Baseline not ready. Sleeping {POLL_INTERVAL_SECONDS}s...")
-            time.sleep(POLL_INTERVAL_SECONDS)
-            continue
 
-        baseline_strikes = load_baseline_snapshot(trading_date, expiry_str)
-        if not baseline_strikes:
-            print(f"[{now_ist}] Baseline empty for {trading_date}/{expiry_str}. Sleeping...")
-            time.sleep(POLL_INTERVAL_SECONDS)
+def startup_report(top: int = 15):
+    """
+    Where cold-start time goes: `python -X importtime` of this module in a fresh interpreter
+    (direct imports, by cumulative time), then the pieces deferred to first use.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import nifty_oi_monitor"],
+        capture_output=True, text=True, cwd=here,
+    )
+    rows = []
+    total_us = None
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
             continue
-
-        btime = get_baseline_time(trading_date, expiry_str)
-        if btime:
-            print(f"[{now_ist}] Using baseline captured at {btime} IST")
-
-        check_alerts(
-            spot_price=spot_price,
-            current_strikes=current_strikes,
-            baseline_strikes=baseline_strikes,
-            atm_strike=atm_strike,
-            step=step,
-            now_ist=now_ist,
-            trading_date=trading_date,
-            expiry_str=expiry_str,
-        )
-
-        print(f"[{now_ist}] Cycle complete. Sleeping {POLL_INTERVAL_SECONDS}s...")
-        time.sleep(POLL_INTERVAL_SECONDS)
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 0:
+            if name == "nifty_oi_monitor":
+                total_us = int(cumulative_us)
+                break
+            rows = []  # interpreter startup (site, encodings), not ours
+        elif depth == 1:
+            rows.append((int(cumulative_us), int(self_us), name))
+
+    print(f"Import of nifty_oi_monitor: {total_us / 1000:.1f}ms" if total_us else proc.stderr[-2000:])
+    print(f"  {'module':<32}{'cumulative ms':>15}{'self ms':>10}")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {name:<32}{cumulative_us / 1000:>15.1f}{self_us / 1000:>10.1f}")
+
+    print("Deferred to first use:")
+    t0 = time.perf_counter()
+    np.ndarray  # first attribute access runs the real numpy import
+    print(f"  {'numpy':<32}{(time.perf_counter() - t0) * 1000:>15.1f}")
+    if GEMINI_API_KEY:
+        t0 = time.perf_counter()
+        ok = get_gemini_client() is not None
+        print(f"  {'google.genai client':<32}{(time.perf_counter() - t0) * 1000:>15.1f}{'' if ok else '  (unavailable)'}")
+    else:
+        print(f"  {'google.genai client':<32}{'GEMINI_API_KEY not set':>15}")
 
 
 if __name__ == "__main__":
-    main_loop()
+    if "--startup-report" in sys.argv[1:]:
+        startup_report()
+    else:
+        main_loop()
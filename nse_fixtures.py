@@ -0,0 +1,108 @@
+"""
+Synthetic NSE option-chain-v3 payloads for offline benchmarks and local testing.
+
+The shape mirrors what https://www.nseindia.com/api/option-chain-v3 returns, including
+the fields nifty_oi_monitor.py ignores, so parse/memory numbers are representative.
+"""
+import random
+from datetime import datetime, timedelta
+
+
+def synthetic_expiries(count: int = 4, start: datetime | None = None) -> list[str]:
+    """`count` consecutive weekly (Tuesday) expiry strings like "10-Mar-2026"."""
+    start = start or datetime(2026, 3, 10)
+    while start.weekday() != 1:
+        start += timedelta(days=1)
+    return [(start + timedelta(weeks=i)).strftime("%d-%b-%Y") for i in range(count)]
+
+
+def _leg(strike: int, expiry: str, symbol: str, spot: float, side: str, rng: random.Random) -> dict:
+    oi = rng.randint(0, 250_000)
+    change = rng.randint(-oi // 4, oi // 2) if oi else 0
+    ltp = round(max(0.05, (spot - strike if side == "CE" else strike - spot) + rng.uniform(5, 150)), 2)
+    return {
+        "strikePrice": strike,
+        "expiryDate": expiry,
+        "underlying": symbol,
+        "identifier": f"OPTIDX{symbol}{expiry}{side}{strike:.2f}",
+        "openInterest": oi,
+        "changeinOpenInterest": change,
+        "pchangeinOpenInterest": round(change / oi * 100, 4) if oi else 0,
+        "totalTradedVolume": rng.randint(0, 5_000_000),
+        "impliedVolatility": round(rng.uniform(8, 40), 2),
+        "lastPrice": ltp,
+        "change": round(rng.uniform(-50, 50), 2),
+        "pChange": round(rng.uniform(-40, 40), 4),
+        "totalBuyQuantity": rng.randint(0, 2_000_000),
+        "totalSellQuantity": rng.randint(0, 2_000_000),
+        "buyPrice1": round(ltp - 0.05, 2),
+        "buyQuantity1": rng.randint(0, 20_000),
+        "sellPrice1": round(ltp + 0.05, 2),
+        "sellQuantity1": rng.randint(0, 20_000),
+        "underlyingValue": spot,
+    }
+
+
+def synthetic_option_chain(
+    n_strikes: int = 200,
+    expiries: list[str] | None = None,
+    symbol: str = "NIFTY",
+    spot: float = 24012.35,
+    step: int = 50,
+    seed: int = 0,
+    timestamp: str = "10-Mar-2026 10:15:00",
+) -> dict:
+    """
+    An option-chain-v3 style payload with `n_strikes` strikes centred on `spot` for each
+    expiry in `expiries` (default: one). Deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+    expiries = expiries or synthetic_expiries(1)
+    atm = round(spot / step) * step
+    first = atm - (n_strikes // 2) * step
+    strikes = [first + i * step for i in range(n_strikes)]
+    data = []
+    for expiry in expiries:
+        for strike in strikes:
+            row = {"strikePrice": strike, "expiryDates": expiry}
+            if rng.random() > 0.02:
+                row["CE"] = _leg(strike, expiry, symbol, spot, "CE", rng)
+            if rng.random() > 0.02:
+                row["PE"] = _leg(strike, expiry, symbol, spot, "PE", rng)
+            data.append(row)
+    return {
+        "records": {
+            "timestamp": timestamp,
+            "underlyingValue": spot,
+            "expiryDates": synthetic_expiries(
+                max(len(expiries), 4), start=datetime.strptime(expiries[0], "%d-%b-%Y")
+            ),
+            "strikePrices": strikes,
+            "data": data,
+        },
+        "filtered": {
+            "data": data[: min(len(data), 30)],
+            "CE": {"totOI": sum(r.get("CE", {}).get("openInterest", 0) for r in data), "totVol": 0},
+            "PE": {"totOI": sum(r.get("PE", {}).get("openInterest", 0) for r in data), "totVol": 0},
+        },
+    }
+
+
+def evolve_chain(payload: dict, seed: int, drift: float = 0.05, timestamp: str | None = None) -> dict:
+    """Copy of `payload` with every leg's OI randomly moved by up to +/-drift (next poll)."""
+    rng = random.Random(seed)
+    records = payload["records"]
+    data = []
+    for row in records["data"]:
+        new_row = dict(row)
+        for side in ("CE", "PE"):
+            leg = row.get(side)
+            if leg is not None:
+                leg = dict(leg)
+                leg["openInterest"] = max(0, int(leg["openInterest"] * (1 + rng.uniform(-drift, drift * 2))))
+                new_row[side] = leg
+        data.append(new_row)
+    new_records = dict(records, data=data)
+    if timestamp is not None:
+        new_records["timestamp"] = timestamp
+    return dict(payload, records=new_records)
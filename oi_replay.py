@@ -0,0 +1,473 @@
+"""
+Offline replay of recorded option-chain snapshots through the baseline + alert pipeline.
+
+Snapshots come from the oi_ticks history in oi_history.db (or DB_FILE; a GitHub Actions
+session's copy is its oi-history-<run id> artifact), from the raw payload archive
+(PAYLOAD_ARCHIVE_DIR), or from raw NSE option-chain JSON files. Each snapshot goes through
+the same evaluate_cycle() the live monitor uses — baseline captured on the first snapshot
+at/after 09:18 IST, same dedup rules — with no sleeps, no SQLite writes (beyond a one-time
+schema upgrade of an older file) and no Telegram, and the alerts it would have fired are
+printed. History is per symbol; --symbol picks which (default SYMBOL), and thresholds,
+strike range and velocity windows default to the live monitor's settings for that symbol
+(including its <NAME>_<SYMBOL> overrides).
+
+`payload` lists a day's archived payloads, or writes out the one fetched in a given cycle.
+
+`sweep` replays a date range once per threshold combination, fanned out over a process
+pool, and tabulates alert counts per combination.
+
+Usage:
+    python oi_replay.py replay 2026-03-10
+    python oi_replay.py replay 2026-03-10 --expiry 10-Mar-2026 --change 300 --ratio 1.5 --range 8
+    python oi_replay.py replay 2026-03-10 --symbol BANKNIFTY
+    python oi_replay.py replay --json saved/*.json
+    python oi_replay.py replay 2026-03-10 --archive payload_archive
+    python oi_replay.py payload 2026-03-10
+    python oi_replay.py payload 2026-03-10 10:15:00 --expiry 10-Mar-2026 -o cycle.json
+    python oi_replay.py sweep 2026-03-02 2026-03-13 --change 200,300,400 --ratio 1.5,2,2.5 --range 4,6,8
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as dtime
+from itertools import groupby, product
+from typing import NamedTuple
+
+from nifty_oi_monitor import (
+    BASELINE_CAPTURE_TIME,
+    SYMBOL,
+    AlertConfig,
+    OIRepository,
+    OIVelocityTracker,
+    PayloadArchive,
+    StrikeChain,
+    SymbolState,
+    alert_values,
+    build_strike_map,
+    decode_option_chain,
+    evaluate_cycle,
+    evaluate_velocity,
+    fmt_pct,
+    velocity_capacity,
+)
+import nifty_oi_monitor
+
+MARKET_OPEN = dtime(9, 15)
+MARKET_CLOSE = dtime(15, 30)
+
+
+class Snapshot(NamedTuple):
+    ts: dtime          # IST time of the cycle
+    chain: StrikeChain
+
+
+class ReplayAlert(NamedTuple):
+    ts: dtime
+    strike: int
+    side: str
+    ce_change_pct: float
+    pe_change_pct: float
+    ratio: float | None
+    pcr: float | None
+    spot: float
+    atm: int
+
+
+# ===========================
+# SNAPSHOT SOURCES
+# ===========================
+
+def load_snapshots_from_db(
+    repo: OIRepository, trading_date: str, expiry: str, symbol: str
+) -> list[Snapshot]:
+    """Every recorded cycle for (trading_date, symbol, expiry) from oi_ticks, oldest first."""
+    meta = repo.load_tick_meta(trading_date, symbol, expiry)
+    snapshots = []
+    for ts, rows in groupby(repo.load_tick_oi(trading_date, symbol, expiry), key=lambda r: r[0]):
+        if ts not in meta:
+            continue  # no spot recorded for this cycle — ATM unknown
+        _, strikes, ce, pe = zip(*rows)
+        chain = StrikeChain.from_oi_columns(
+            strikes,
+            [v or 0 for v in ce], [v or 0 for v in pe],
+            [v is not None for v in ce], [v is not None for v in pe],
+            spot=meta[ts][0], timestamp=meta[ts][1],
+        )
+        snapshots.append(Snapshot(dtime.fromisoformat(ts), chain))
+    return snapshots
+
+
+def load_snapshots_from_json(paths: list[str]) -> tuple[str | None, list[Snapshot]]:
+    """
+    Raw option-chain payloads (one JSON document per file). Cycle time comes from NSE's
+    records.timestamp ("10-Mar-2026 10:15:00"). Returns (trading_date, snapshots sorted by time).
+    """
+    dated = []
+    for path in paths:
+        with open(path, "rb") as f:
+            chain = build_strike_map(decode_option_chain(f.read()))
+        if not chain.timestamp:
+            print(f"{path}: no records.timestamp, skipping.")
+            continue
+        dated.append((datetime.strptime(chain.timestamp, "%d-%b-%Y %H:%M:%S"), chain))
+    dated.sort(key=lambda x: x[0])
+    trading_date = dated[0][0].date().isoformat() if dated else None
+    return trading_date, [Snapshot(dt.time(), chain) for dt, chain in dated]
+
+
+def load_snapshots_from_archive(
+    archive: PayloadArchive, trading_date: str, expiry: str, symbol: str
+) -> list[Snapshot]:
+    """
+    Every archived cycle for (trading_date, symbol, expiry), oldest first. Cycles that
+    re-used an unchanged payload share one archived member, which is decoded once.
+    """
+    by_offset: dict[int, StrikeChain | None] = {}
+    snapshots = []
+    for entry in archive.entries(trading_date, symbol, expiry):
+        if entry.offset not in by_offset:
+            try:
+                by_offset[entry.offset] = build_strike_map(
+                    decode_option_chain(archive.read_entry(trading_date, entry))
+                )
+            except ValueError:
+                by_offset[entry.offset] = None  # archived because it failed to decode live too
+        chain = by_offset[entry.offset]
+        if chain is not None:
+            snapshots.append(Snapshot(dtime.fromisoformat(entry.ts), chain))
+    return snapshots
+
+
+# ===========================
+# REPLAY
+# ===========================
+
+def replay_day(
+    snapshots: list[Snapshot],
+    trading_date: str,
+    config: AlertConfig = AlertConfig(),
+    baseline: StrikeChain | None = None,
+) -> list[ReplayAlert]:
+    """
+    Run snapshots through baseline capture + evaluate_cycle() and return the alerts that
+    would have fired. Pass `baseline` to compare against a fixed baseline instead of
+    capturing one from the first snapshot at/after BASELINE_CAPTURE_TIME. Velocity alerts
+    (side "CE-VEL5" etc.) are included when config.velocity_windows is non-empty.
+    """
+    active: dict = {}
+    alerts = []
+    windows = tuple(minutes * 60 for minutes, _ in config.velocity_windows)
+    tracker = OIVelocityTracker(windows, velocity_capacity(windows)) if windows else None
+    day = datetime.fromisoformat(trading_date)
+    for snap in snapshots:
+        if not (MARKET_OPEN <= snap.ts <= MARKET_CLOSE):
+            continue
+        chain = snap.chain
+        if chain.spot is None or chain.step is None or not len(chain):
+            continue
+        if tracker is not None:
+            tracker.update(datetime.combine(day, snap.ts).timestamp(), chain)
+        if baseline is None:
+            if snap.ts < BASELINE_CAPTURE_TIME:
+                continue
+            baseline = chain
+        atm = chain.atm_strike(chain.spot)
+        result = evaluate_cycle(chain, baseline, atm, chain.step, trading_date, active, config)
+        for i, side in result.fired:
+            v = alert_values(result.ev, i)
+            alerts.append(ReplayAlert(
+                snap.ts, result.strikes[i], side, v["ce_change_pct"], v["pe_change_pct"],
+                v["ratio"], result.pcr, chain.spot, atm,
+            ))
+        if tracker is not None:
+            vres = evaluate_velocity(tracker, result.ev["strikes"], trading_date, active, config)
+            for i, side, k in vres.fired:
+                d = vres.windows[k]
+                ce_now, pe_now = int(d["ce_now"][i]), int(d["pe_now"][i])
+                alerts.append(ReplayAlert(
+                    snap.ts, result.strikes[i], f"{side}-VEL{config.velocity_windows[k][0]}",
+                    float(d["ce_pct"][i]), float(d["pe_pct"][i]),
+                    max(ce_now, pe_now) / min(ce_now, pe_now) if ce_now > 0 and pe_now > 0 else None,
+                    result.pcr, chain.spot, atm,
+                ))
+    return alerts
+
+
+def print_alerts(alerts: list[ReplayAlert]):
+    print(f"{'time':<10}{'strike':>8} {'side':<8}{'CE chg':>12}{'PE chg':>12}{'ratio':>8}{'PCR':>7}{'spot':>11}")
+    for a in alerts:
+        ratio = f"{a.ratio:.2f}x" if a.ratio else "N/A"
+        pcr = f"{a.pcr:.2f}" if a.pcr is not None else "N/A"
+        print(
+            f"{a.ts.strftime('%H:%M:%S'):<10}{a.strike:>8} {a.side:<8}"
+            f"{fmt_pct(a.ce_change_pct):>12}{fmt_pct(a.pe_change_pct):>12}{ratio:>8}{pcr:>7}{a.spot:>11,.1f}"
+        )
+
+
+# ===========================
+# THRESHOLD SWEEP
+# ===========================
+
+class SweepDay(NamedTuple):
+    trading_date: str
+    expiry: str
+    snapshots: list[Snapshot]
+
+
+class SweepResult(NamedTuple):
+    config: AlertConfig
+    alerts: int
+    ce_alerts: int
+    pe_alerts: int
+    days_with_alerts: int
+    elapsed_ms: float
+
+
+# Loaded once in the parent and handed to each worker at start-up: inherited copy-on-write
+# under fork, pickled once per worker (not per task) under spawn. Workers never touch SQLite.
+_sweep_days: list[SweepDay] = []
+
+
+def _init_sweep_worker(days: list[SweepDay]):
+    global _sweep_days
+    _sweep_days = days
+
+
+def _run_combination(config: AlertConfig) -> SweepResult:
+    t0 = time.perf_counter()
+    total = ce = days_hit = 0
+    for day in _sweep_days:
+        alerts = replay_day(day.snapshots, day.trading_date, config)
+        total += len(alerts)
+        ce += sum(1 for a in alerts if a.side == "CE")
+        days_hit += bool(alerts)
+    return SweepResult(config, total, ce, total - ce, days_hit, (time.perf_counter() - t0) * 1000)
+
+
+def load_sweep_days(repo: OIRepository, start_date: str, end_date: str, symbol: str) -> list[SweepDay]:
+    return [
+        SweepDay(d, e, load_snapshots_from_db(repo, d, e, symbol))
+        for d in repo.tick_dates(start_date, end_date, symbol)
+        for e in repo.tick_expiries(d, symbol)
+    ]
+
+
+def sweep(days: list[SweepDay], grid: list[AlertConfig], workers: int | None = None) -> list[SweepResult]:
+    """Replay `days` once per config in `grid` across a process pool; results in grid order."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_sweep_worker(days)
+        return [_run_combination(c) for c in grid]
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_sweep_worker, initargs=(days,)) as pool:
+        chunk = max(1, len(grid) // (workers * 4))
+        return list(pool.map(_run_combination, grid, chunksize=chunk))
+
+
+def print_sweep(results: list[SweepResult], n_days: int):
+    print(f"{'change%':>8}{'ratio':>7}{'range':>7}{'alerts':>8}{'CE':>6}{'PE':>6}{'per day':>9}{'days hit':>10}{'ms':>8}")
+    for r in results:
+        c = r.config
+        print(
+            f"{c.change_threshold:>8g}{c.ratio_threshold:>7g}{c.strike_range:>7}{r.alerts:>8}"
+            f"{r.ce_alerts:>6}{r.pe_alerts:>6}{r.alerts / max(n_days, 1):>9.1f}"
+            f"{r.days_with_alerts:>6}/{n_days:<3}{r.elapsed_ms:>8.0f}"
+        )
+
+
+# ===========================
+# CLI
+# ===========================
+
+def _live_config(symbol: str) -> AlertConfig:
+    """The config the live monitor runs `symbol` with, <NAME>_<SYMBOL> overrides included."""
+    return SymbolState.from_env(symbol).config
+
+
+def _config_from_args(args) -> AlertConfig:
+    """The live config for --symbol, with --change/--ratio/--range/--full-chain applied on top."""
+    config = _live_config(args.symbol)
+    overrides = {"change_threshold": args.change, "ratio_threshold": args.ratio, "strike_range": args.range}
+    config = config._replace(**{k: v for k, v in overrides.items() if v is not None})
+    return config._replace(full_chain=True) if args.full_chain else config
+
+
+def cmd_replay(args):
+    t0 = time.perf_counter()
+    if args.json:
+        trading_date, snapshots = load_snapshots_from_json(args.json)
+        if trading_date is None:
+            print("No usable payloads.")
+            return 1
+        label = args.expiry or "(json)"
+    elif args.archive:
+        archive = PayloadArchive(args.archive)
+        entries = archive.entries(args.date, args.symbol, args.expiry)
+        if not entries:
+            print(f"No archived {args.symbol} payloads for {args.date} in {args.archive}.")
+            return 1
+        trading_date, label = args.date, args.expiry or entries[0].expiry
+        snapshots = load_snapshots_from_archive(archive, trading_date, label, args.symbol)
+    else:
+        repo = OIRepository(args.db)
+        repo.init_schema()
+        expiries = [args.expiry] if args.expiry else repo.tick_expiries(args.date, args.symbol)
+        if not expiries:
+            print(f"No oi_ticks history for {args.symbol} on {args.date} in {args.db}.")
+            return 1
+        trading_date, label = args.date, expiries[0]
+        snapshots = load_snapshots_from_db(repo, trading_date, label, args.symbol)
+    t_load = time.perf_counter() - t0
+
+    config = _config_from_args(args)
+    t1 = time.perf_counter()
+    alerts = replay_day(snapshots, trading_date, config)
+    t_replay = time.perf_counter() - t1
+
+    print(
+        f"Replay {trading_date} {args.symbol} expiry {label}: change>={config.change_threshold}% "
+        f"ratio>={config.ratio_threshold}x range=±{config.strike_range}"
+        + (" full-chain" if config.full_chain else "")
+    )
+    print_alerts(alerts)
+    print(
+        f"\n{len(snapshots)} snapshots, {len(alerts)} alerts | "
+        f"load {t_load * 1000:.0f} ms, replay {t_replay * 1000:.0f} ms"
+    )
+    return 0
+
+
+def cmd_payload(args):
+    archive = PayloadArchive(args.archive)
+    if args.time is None:
+        entries = archive.entries(args.date, args.symbol, args.expiry)
+        if not entries:
+            print(f"No archived payloads for {args.date} in {args.archive}.")
+            return 1
+        print(f"{'time':<10}{'symbol':<12}{'expiry':<13}{'KiB':>8}  NSE timestamp")
+        for e in entries:
+            print(f"{e.ts:<10}{e.symbol:<12}{e.expiry:<13}{e.length / 1024:>8.1f}  {e.nse_timestamp or '-'}")
+        return 0
+    expiries = [args.expiry] if args.expiry else sorted(
+        {e.expiry for e in archive.entries(args.date, args.symbol)}
+    )
+    raw = next((r for r in (archive.read(args.date, args.symbol, exp, args.time) for exp in expiries) if r), None)
+    if raw is None:
+        print(f"No archived {args.symbol} payload for {args.date} {args.time} in {args.archive}.", file=sys.stderr)
+        return 1
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(raw)
+    else:
+        sys.stdout.buffer.write(raw)
+    return 0
+
+
+def _floats(text: str) -> list[float]:
+    return [float(x) for x in text.split(",") if x.strip()]
+
+
+def _ints(text: str) -> list[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def cmd_sweep(args):
+    t0 = time.perf_counter()
+    repo = OIRepository(args.db)
+    repo.init_schema()
+    days = load_sweep_days(repo, args.start, args.end or args.start, args.symbol)
+    t_load = time.perf_counter() - t0
+    if not days:
+        print(f"No {args.symbol} oi_ticks history between {args.start} and {args.end or args.start} in {args.db}.")
+        return 1
+
+    live = _live_config(args.symbol)
+    grid = [
+        # Baseline thresholds only: velocity alerts would swamp the per-combination counts
+        AlertConfig(change, ratio, rng, args.full_chain or live.full_chain, velocity_windows=())
+        for change, ratio, rng in product(
+            args.change or [live.change_threshold],
+            args.ratio or [live.ratio_threshold],
+            args.range or [live.strike_range],
+        )
+    ]
+    workers = min(args.workers or os.cpu_count() or 1, len(grid))
+    t1 = time.perf_counter()
+    results = sweep(days, grid, workers)
+    t_sweep = time.perf_counter() - t1
+
+    n_snaps = sum(len(d.snapshots) for d in days)
+    print(f"Sweep over {len(days)} day(s) / {n_snaps} snapshots, {len(grid)} combinations, {workers} worker(s)")
+    print_sweep(results, len(days))
+    print(f"\nload {t_load * 1000:.0f} ms, sweep {t_sweep * 1000:.0f} ms wall")
+    return 0
+
+
+def add_threshold_args(p: argparse.ArgumentParser):
+    p.add_argument("--change", type=float,
+                   help="OI change %% threshold (default: the symbol's OI_CHANGE_THRESHOLD_PERCENT)")
+    p.add_argument("--ratio", type=float, help="CE/PE ratio threshold (default: the symbol's OI_RATIO_THRESHOLD)")
+    p.add_argument("--range", type=int, help="ATM +/- N strikes (default: the symbol's STRIKE_RANGE)")
+    p.add_argument("--full-chain", action="store_true", help="evaluate every strike in the chain")
+
+
+def add_source_args(p: argparse.ArgumentParser):
+    p.add_argument("--db", default=nifty_oi_monitor.DB_FILE, help="SQLite file (default: DB_FILE)")
+    p.add_argument("--symbol", default=SYMBOL, type=str.upper, help="index to replay (default: SYMBOL)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Replay recorded option-chain snapshots through the alert pipeline.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("replay", help="replay one trading day")
+    p.add_argument("date", nargs="?", help="trading date YYYY-MM-DD (oi_ticks source)")
+    p.add_argument("--expiry", help="expiry to replay (default: first recorded for the date)")
+    add_source_args(p)
+    p.add_argument("--json", nargs="+", metavar="FILE", help="replay raw NSE payload files instead of oi_ticks")
+    p.add_argument("--archive", metavar="DIR", nargs="?", const=nifty_oi_monitor.PAYLOAD_ARCHIVE_DIR,
+                   help="replay the raw payload archive instead of oi_ticks (default DIR: PAYLOAD_ARCHIVE_DIR)")
+    add_threshold_args(p)
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser("payload", help="list a day's archived payloads, or write out one cycle's payload")
+    p.add_argument("date", help="trading date YYYY-MM-DD")
+    p.add_argument("time", nargs="?", help="cycle time HH:MM:SS (omit to list)")
+    p.add_argument("--expiry", help="expiry (default: any archived for the cycle)")
+    p.add_argument("--symbol", default=SYMBOL, type=str.upper, help="index (default: SYMBOL)")
+    p.add_argument("--archive", metavar="DIR", default=nifty_oi_monitor.PAYLOAD_ARCHIVE_DIR,
+                   help="archive directory (default: PAYLOAD_ARCHIVE_DIR)")
+    p.add_argument("-o", "--output", metavar="FILE", help="write the payload here instead of stdout")
+    p.set_defaults(func=cmd_payload)
+
+    p = sub.add_parser("sweep", help="replay a date range for every threshold combination in a grid")
+    p.add_argument("start", help="first trading date YYYY-MM-DD")
+    p.add_argument("end", nargs="?", help="last trading date YYYY-MM-DD (default: start)")
+    p.add_argument("--change", type=_floats,
+                   help="comma-separated OI change %% thresholds (default: the symbol's live setting)")
+    p.add_argument("--ratio", type=_floats,
+                   help="comma-separated CE/PE ratio thresholds (default: the symbol's live setting)")
+    p.add_argument("--range", type=_ints,
+                   help="comma-separated ATM +/- N strike ranges (default: the symbol's live setting)")
+    p.add_argument("--full-chain", action="store_true", help="evaluate every strike in the chain")
+    p.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    add_source_args(p)
+    p.set_defaults(func=cmd_sweep)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "replay" and not args.json and not args.date:
+        print("replay: give a trading date or --json files.")
+        return 2
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import os
 from datetime import datetime
 import requests
 
@@ -51,11 +52,13 @@ HEADERS = {
 session = requests.Session()
 session.headers.update(HEADERS)
 
-NSE_URL = "https://www.nseindia.com/api/option-chain-v3?type=Indices&symbol=NIFTY"
+# Set NSE_HOME_URL=http://127.0.0.1:8765 to run against fake_nse_server.py offline
+NSE_HOME_URL = os.getenv("NSE_HOME_URL", "https://www.nseindia.com")
+NSE_URL = f"{NSE_HOME_URL}/api/option-chain-v3?type=Indices&symbol=NIFTY"
 
 
 def fetch_raw_nse_data():
-    warm = session.get("https://www.nseindia.com", timeout=5)
+    warm = session.get(NSE_HOME_URL, timeout=5)
     print("Warmup status:", warm.status_code)
 
     resp = session.get(NSE_URL, timeout=10)
@@ -0,0 +1,176 @@
+"""
+Test oracles: the original dict-of-dicts code paths of the single-expiry monitor (before
+StrikeChain and the vectorised evaluate_cycle), copied with printing, message formatting
+and the DB/Telegram side effects stripped out. Plus a seeded generator of awkward
+option-chain payloads to feed both implementations.
+"""
+from math import inf
+
+
+def build_strike_map(data: dict) -> dict:
+    """Returns {strike: {'CE': ce_oi, 'PE': pe_oi}}"""
+    strikes: dict[int, dict[str, int]] = {}
+    for item in data.get("records", {}).get("data", []):
+        strike = item.get("strikePrice")
+        if strike is None:
+            continue
+        ce = item.get("CE")
+        pe = item.get("PE")
+        ce_oi = ce.get("openInterest") if ce else None
+        pe_oi = pe.get("openInterest") if pe else None
+        if ce_oi is not None or pe_oi is not None:
+            strikes.setdefault(strike, {})
+            if ce_oi is not None:
+                strikes[strike]["CE"] = ce_oi
+            if pe_oi is not None:
+                strikes[strike]["PE"] = pe_oi
+    return strikes
+
+
+def get_spot_price_and_step(data: dict):
+    records = data.get("records", {})
+    underlying = records.get("underlyingValue")
+    strike_prices = sorted(set(
+        item["strikePrice"]
+        for item in records.get("data", [])
+        if "strikePrice" in item
+    ))
+    step = None
+    if len(strike_prices) >= 2:
+        diffs = [j - i for i, j in zip(strike_prices[:-1], strike_prices[1:])]
+        step = min(diffs) if diffs else None
+    return underlying, step
+
+
+def find_atm_strike(spot_price, strike_prices):
+    return min(strike_prices, key=lambda x: abs(x - spot_price))
+
+
+def compute_change_vs_baseline(base_oi, curr_oi):
+    if base_oi is None or curr_oi is None:
+        return None, None, None
+    if base_oi == 0:
+        diff = curr_oi - base_oi
+        direction = "UP" if diff > 0 else ("DOWN" if diff < 0 else "FLAT")
+        return inf, diff, direction
+    diff = curr_oi - base_oi
+    direction = "UP" if diff > 0 else ("DOWN" if diff < 0 else "FLAT")
+    return (abs(diff) / base_oi) * 100.0, diff, direction
+
+
+def check_alerts(
+    current_strikes: dict,
+    baseline_strikes: dict,
+    atm_strike,
+    step,
+    trading_date: str,
+    active: dict,
+    change_threshold: float,
+    ratio_threshold: float,
+    strike_range: int,
+):
+    """
+    The original per-strike check_alerts() loop. Returns (pcr, fired, suppressed, cleared):
+    fired holds (strike, side, values) with the numbers the alert was built from,
+    suppressed (strike, side), cleared (strike, side) in the order they were reset.
+    """
+    monitored_strikes = [atm_strike + i * step for i in range(-strike_range, strike_range + 1)]
+
+    total_ce_oi = sum(current_strikes.get(s, {}).get("CE", 0) for s in monitored_strikes)
+    total_pe_oi = sum(current_strikes.get(s, {}).get("PE", 0) for s in monitored_strikes)
+    pcr = total_pe_oi / total_ce_oi if total_ce_oi > 0 else None
+
+    fired, suppressed, cleared = [], [], []
+    for strike in monitored_strikes:
+        curr = current_strikes.get(strike)
+        base = baseline_strikes.get(strike)
+        if curr is None or base is None:
+            continue
+
+        ce_curr = curr.get("CE", 0)
+        pe_curr = curr.get("PE", 0)
+        ce_base = base.get("CE", 0)
+        pe_base = base.get("PE", 0)
+
+        if ce_curr == 0 and pe_curr == 0:
+            continue
+
+        ce_change_pct, _, _ = compute_change_vs_baseline(ce_base, ce_curr)
+        pe_change_pct, _, _ = compute_change_vs_baseline(pe_base, pe_curr)
+
+        ce_trigger = ce_change_pct is not None and ce_change_pct >= change_threshold
+        pe_trigger = pe_change_pct is not None and pe_change_pct >= change_threshold
+
+        ratio = None
+        ratio_ok = False
+        if ce_curr > 0 and pe_curr > 0:
+            ratio = max(ce_curr, pe_curr) / min(ce_curr, pe_curr)
+            ratio_ok = ratio >= ratio_threshold
+
+        if (ce_trigger or pe_trigger) and ratio_ok:
+            trigger_side = "CE" if ce_trigger else "PE"
+            dedup_key = (trading_date, strike, trigger_side)
+            if not active.get(dedup_key, False):
+                active[dedup_key] = True
+                fired.append((strike, trigger_side, {
+                    "ce_base": ce_base, "ce_curr": ce_curr, "pe_base": pe_base, "pe_curr": pe_curr,
+                    "ce_change_pct": ce_change_pct, "pe_change_pct": pe_change_pct, "ratio": ratio,
+                }))
+            else:
+                suppressed.append((strike, trigger_side))
+        else:
+            for side in ("CE", "PE"):
+                key = (trading_date, strike, side)
+                if active.get(key, False):
+                    active[key] = False
+                    cleared.append((strike, side))
+    return pcr, fired, suppressed, cleared
+
+
+# ===========================
+# PAYLOAD GENERATOR
+# ===========================
+
+def _leg(oi, rng) -> dict | None:
+    """One CE/PE leg with `oi`; oi None gives one of the shapes NSE uses for a missing side."""
+    if oi is None:
+        return rng.choice([None, {}, {"lastPrice": 0.05}])
+    return {
+        "openInterest": oi,
+        "totalTradedVolume": rng.randint(0, 100_000),
+        "lastPrice": round(rng.uniform(0.05, 500), 2),
+        "impliedVolatility": round(rng.uniform(5, 40), 2),
+    }
+
+
+def payload(rows, spot, rng, timestamp: str | None = "10-Mar-2026 10:15:00", shuffle: bool = False) -> dict:
+    """
+    Option-chain payload from (strike, ce_oi, pe_oi) rows; None drops that side (the leg is
+    left out, empty, or present without openInterest). `spot` None leaves out underlyingValue.
+    """
+    data = []
+    for strike, ce, pe in rows:
+        row = {"strikePrice": strike}
+        for side, oi in (("CE", ce), ("PE", pe)):
+            leg = _leg(oi, rng)
+            if leg is not None or rng.random() < 0.5:
+                row[side] = leg
+        data.append(row)
+    if shuffle:
+        rng.shuffle(data)
+    records = {"data": data}
+    if spot is not None:
+        records["underlyingValue"] = spot
+    if timestamp is not None:
+        records["timestamp"] = timestamp
+    return {"records": records}
+
+
+def random_oi(rng, missing: float = 0.08, zero: float = 0.08, high: int = 200_000):
+    """An OI value: None (side missing), 0, or positive."""
+    r = rng.random()
+    if r < missing:
+        return None
+    if r < missing + zero:
+        return 0
+    return rng.randint(1, high)
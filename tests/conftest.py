@@ -0,0 +1,15 @@
+"""
+Shared setup: import the monitor from the repo root, with its log output discarded and
+DB_FILE pointed at a scratch file so no test can touch oi_history.db.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["DB_FILE"] = os.path.join(tempfile.mkdtemp(prefix="oi-tests-"), "oi_history.db")
+
+import nifty_oi_monitor  # noqa: E402
+
+nifty_oi_monitor.configure_logging(stream=open(os.devnull, "w"))
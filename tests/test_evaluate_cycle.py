@@ -0,0 +1,188 @@
+"""
+evaluate_cycle() must fire, suppress and clear exactly what the original per-strike
+check_alerts() loop did, on the same payloads and the same dedup state.
+"""
+import random
+
+import pytest
+
+import baseline_reference as ref
+from nifty_oi_monitor import AlertConfig, StrikeChain, alert_values, evaluate_cycle
+
+TRADING_DATE = "2026-03-10"
+STEP = 50
+STRIKES = [22000 + STEP * i for i in range(-20, 21)]
+
+CONFIGS = [
+    AlertConfig(change_threshold=400.0, ratio_threshold=2.0, strike_range=6, full_chain=False),
+    AlertConfig(change_threshold=100.0, ratio_threshold=1.5, strike_range=4, full_chain=False),
+    AlertConfig(change_threshold=250.0, ratio_threshold=2.5, strike_range=25, full_chain=False),
+    AlertConfig(change_threshold=0.0, ratio_threshold=1.0, strike_range=8, full_chain=False),
+]
+
+
+def _baseline_chain(base_payload: dict) -> StrikeChain:
+    """The baseline as the live loop sees it: parsed, stored as baseline_oi rows, loaded back."""
+    return StrikeChain.from_side_rows(list(StrikeChain.from_payload(base_payload).side_rows()))
+
+
+def _run_both(cur_payload, base_payload, active_ref: dict, active_new: dict, config: AlertConfig):
+    """Evaluate one cycle with both implementations; returns (reference outcome, new outcome)."""
+    ref_current = ref.build_strike_map(cur_payload)
+    spot, step = ref.get_spot_price_and_step(cur_payload)
+    atm = ref.find_atm_strike(spot, sorted(ref_current))
+
+    expected = ref.check_alerts(
+        ref_current, ref.build_strike_map(base_payload), atm, step, TRADING_DATE, active_ref,
+        config.change_threshold, config.ratio_threshold, config.strike_range,
+    )
+    result = evaluate_cycle(
+        StrikeChain.from_payload(cur_payload), _baseline_chain(base_payload), atm, step,
+        TRADING_DATE, active_new, config,
+    )
+    fired = []
+    for i, side in result.fired:
+        v = alert_values(result.ev, i)
+        fired.append((result.strikes[i], side, {
+            k: v[k] for k in ("ce_base", "ce_curr", "pe_base", "pe_curr", "ce_change_pct", "pe_change_pct", "ratio")
+        }))
+    suppressed = [(result.strikes[i], side) for i, side in result.suppressed]
+    return expected, (result.pcr, fired, suppressed, result.cleared)
+
+
+def _assert_same(expected, actual):
+    ref_pcr, ref_fired, ref_suppressed, ref_cleared = expected
+    pcr, fired, suppressed, cleared = actual
+    assert pcr == ref_pcr
+    assert sorted(fired, key=lambda f: (f[0], f[1])) == sorted(ref_fired, key=lambda f: (f[0], f[1]))
+    assert sorted(suppressed) == sorted(ref_suppressed)
+    assert cleared == ref_cleared
+
+
+def _move(rng, value, base, other, config: AlertConfig):
+    """Next cycle's OI for one side, biased towards the thresholds' edges."""
+    value = value or 0
+    r = rng.random()
+    if r < 0.30:
+        return value
+    if r < 0.50:
+        return max(0, int(value * (1 + rng.uniform(-0.3, 0.5))))
+    if r < 0.60 and base:
+        # Exactly on the change threshold, or one contract either side of it
+        return int(base * (1 + config.change_threshold / 100)) + rng.choice([-1, 0, 0, 1])
+    if r < 0.70 and base is not None:
+        return base * rng.randint(3, 10) + rng.randint(0, 1000)
+    if r < 0.80 and other:
+        # Exactly on the ratio threshold, or one contract either side of it
+        return int(other * config.ratio_threshold) + rng.choice([-1, 0, 0, 1])
+    if r < 0.87:
+        return 0
+    if r < 0.93:
+        return None
+    return ref.random_oi(rng)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_matches_per_strike_loop_on_random_cycles(seed):
+    rng = random.Random(seed)
+    config = CONFIGS[seed % len(CONFIGS)]
+    base = {s: (ref.random_oi(rng), ref.random_oi(rng)) for s in STRIKES if rng.random() > 0.05}
+    spot = 22000 + rng.uniform(-300, 300)
+    base_payload = ref.payload([(s, ce, pe) for s, (ce, pe) in base.items()], spot, rng)
+
+    current = dict(base)
+    active_ref, active_new = {}, {}
+    for _ in range(50):
+        spot = min(max(spot + rng.uniform(-120, 120), 20800), 23200)
+        rows = []
+        for s in STRIKES:
+            if rng.random() < 0.03:
+                continue  # strike missing from this payload
+            ce, pe = current.get(s, (None, None))
+            base_ce, base_pe = base.get(s, (None, None))
+            ce = _move(rng, ce, base_ce, pe, config)
+            pe = _move(rng, pe, base_pe, ce, config)
+            current[s] = (ce, pe)
+            rows.append((s, ce, pe))
+        expected, actual = _run_both(ref.payload(rows, spot, rng), base_payload, active_ref, active_new, config)
+        _assert_same(expected, actual)
+        assert active_new == active_ref
+
+
+def _cycle(rows, base_rows, active_ref, active_new, config=CONFIGS[0], spot=22000.0):
+    rng = random.Random(0)
+    expected, actual = _run_both(
+        ref.payload(rows, spot, rng), ref.payload(base_rows, spot, rng), active_ref, active_new, config
+    )
+    _assert_same(expected, actual)
+    assert active_new == active_ref
+    return actual
+
+
+def _flat(ce=100_000, pe=100_000):
+    return [(s, ce, pe) for s in STRIKES]
+
+
+def _with(rows, strike, ce, pe):
+    return [(s, ce, pe) if s == strike else (s, c, p) for s, c, p in rows]
+
+
+def test_ratio_edges():
+    base = _flat(10_000, 10_000)
+    # +400% on CE with the ratio exactly 2x fires; a contract short of 2x does not
+    _, fired, _, _ = _cycle(_with(_flat(), 22000, 50_000, 25_000), base, {}, {})
+    assert [(s, side) for s, side, _ in fired] == [(22000, "CE")]
+    _, fired, _, _ = _cycle(_with(_flat(), 22000, 50_000, 25_001), base, {}, {})
+    assert fired == []
+    # One side at zero or missing: no ratio, so no alert however big the change
+    for pe in (0, None):
+        _, fired, _, _ = _cycle(_with(_flat(), 22000, 90_000, pe), base, {}, {})
+        assert fired == []
+
+
+def test_change_threshold_edge_and_zero_baseline():
+    base = _with(_flat(10_000, 10_000), 22050, 0, 10_000)
+    # Exactly +400% fires, one contract less does not
+    _, fired, _, _ = _cycle(_with(_flat(10_000, 10_000), 22000, 50_000, 10_000), base, {}, {})
+    assert [(s, side) for s, side, _ in fired] == [(22000, "CE")]
+    _, fired, _, _ = _cycle(_with(_flat(10_000, 10_000), 22000, 49_999, 10_000), base, {}, {})
+    assert fired == []
+    # A side that was 0 at baseline is an infinite change
+    _, fired, _, _ = _cycle(_with(_flat(10_000, 10_000), 22050, 30_000, 10_000), base, {}, {})
+    assert [(s, side) for s, side, _ in fired] == [(22050, "CE")]
+    assert fired[0][2]["ce_change_pct"] == float("inf")
+
+
+def test_missing_strikes_are_skipped():
+    base = [r for r in _flat(10_000, 10_000) if r[0] != 22000]
+    breach = _with(_flat(10_000, 10_000), 22000, 60_000, 10_000)
+    # No baseline for the strike, then no current row for it: neither is evaluated
+    _, fired, _, _ = _cycle(breach, base, {}, {})
+    assert fired == []
+    _, fired, _, _ = _cycle([r for r in breach if r[0] != 22000], _flat(10_000, 10_000), {}, {})
+    assert fired == []
+    # A row whose legs carry no OI at all is dropped like a missing row
+    _, fired, _, _ = _cycle(_with(breach, 22000, None, None), _flat(10_000, 10_000), {}, {})
+    assert fired == []
+
+
+def test_dedup_clear_and_refire():
+    base = _flat(10_000, 10_000)
+    breach = _with(_flat(10_000, 10_000), 22000, 60_000, 10_000)
+    active_ref, active_new = {}, {}
+
+    _, fired, suppressed, cleared = _cycle(breach, base, active_ref, active_new)
+    assert [(s, side) for s, side, _ in fired] == [(22000, "CE")] and not suppressed and not cleared
+    _, fired, suppressed, cleared = _cycle(breach, base, active_ref, active_new)
+    assert fired == [] and suppressed == [(22000, "CE")] and not cleared
+    _, fired, suppressed, cleared = _cycle(base, base, active_ref, active_new)
+    assert fired == [] and not suppressed and cleared == [(22000, "CE")]
+    _, fired, _, _ = _cycle(breach, base, active_ref, active_new)
+    assert [(s, side) for s, side, _ in fired] == [(22000, "CE")]
+
+    # A strike that drops out of the payload is not evaluated, so its key stays active
+    _, fired, suppressed, cleared = _cycle(
+        [r for r in base if r[0] != 22000], base, active_ref, active_new
+    )
+    assert not fired and not suppressed and not cleared
+    assert active_new[(TRADING_DATE, 22000, "CE")] is True
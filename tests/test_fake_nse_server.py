@@ -0,0 +1,48 @@
+"""
+fake_nse_server fault injection: each fault kind can be switched on without the others.
+"""
+import json
+
+import pytest
+import requests
+
+from fake_nse_server import FakeNSE, FaultConfig, PayloadSource
+
+
+def _fetch(faults: FaultConfig, n: int = 5):
+    """n API calls after a cookie warmup; returns (status, body) pairs and the server's stats."""
+    fake = FakeNSE(faults=faults, source=PayloadSource(n_strikes=20))
+    base = fake.start()
+    try:
+        with requests.Session() as session:
+            session.get(base + "/", timeout=5)
+            responses = []
+            for _ in range(n):
+                r = session.get(base + "/api/option-chain-v3", params={"symbol": "NIFTY"}, timeout=5)
+                responses.append((r.status_code, r.content))
+        return responses, fake.stats
+    finally:
+        fake.stop()
+
+
+def test_timeout_alone_serves_a_whole_body():
+    responses, stats = _fetch(FaultConfig(p_timeout=1.0, p_malformed=0.0, hang_seconds=0.01, seed=1))
+    assert stats["timeouts"] == 5 and stats["malformed"] == 0
+    for status, body in responses:
+        assert status == 200
+        assert json.loads(body)["records"]["data"]
+
+
+def test_malformed_alone_truncates_without_hanging():
+    responses, stats = _fetch(FaultConfig(p_malformed=1.0, hang_seconds=30.0, seed=1))
+    assert stats["timeouts"] == 0 and stats["malformed"] == 5
+    for status, body in responses:
+        assert status == 200
+        with pytest.raises(json.JSONDecodeError):
+            json.loads(body)
+
+
+def test_timeout_and_malformed_split_one_roll():
+    _, stats = _fetch(FaultConfig(p_timeout=0.5, p_malformed=0.5, hang_seconds=0.01, seed=3), n=20)
+    assert stats["timeouts"] + stats["malformed"] == 20
+    assert stats["timeouts"] and stats["malformed"]
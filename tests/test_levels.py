@@ -0,0 +1,111 @@
+"""
+max_pain_strike() and _walls() against brute force, chain_levels() support/resistance,
+and LevelTracker's confirm_cycles debounce.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from nifty_oi_monitor import ChainLevels, LevelTracker, StrikeChain, _walls, chain_levels, max_pain_strike
+
+
+def _payout(settle: int, strikes: list, ce: list, pe: list) -> int:
+    """What option writers pay if the underlying settles at `settle`."""
+    return sum(
+        c * max(0, settle - k) + p * max(0, k - settle)
+        for k, c, p in zip(strikes, ce, pe)
+    )
+
+
+def _brute_max_pain(strikes: list, ce: list, pe: list) -> int:
+    return min(strikes, key=lambda s: (_payout(s, strikes, ce, pe), s))
+
+
+def _arrays(*cols):
+    return [np.array(c, dtype=np.int64) for c in cols]
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_max_pain_matches_brute_force_payout(seed):
+    rng = random.Random(seed)
+    step = rng.choice([25, 50, 100])
+    strikes = [20000 + step * i for i in range(rng.randint(1, 80))]
+    # Small OI ranges make equal payouts (ties) common; large ones exercise the float sums
+    high = rng.choice([3, 50, 5_000_000])
+    ce = [rng.randint(0, high) if rng.random() > 0.2 else 0 for _ in strikes]
+    pe = [rng.randint(0, high) if rng.random() > 0.2 else 0 for _ in strikes]
+    assert max_pain_strike(*_arrays(strikes, ce, pe)) == _brute_max_pain(strikes, ce, pe)
+
+
+def test_max_pain_tie_goes_to_lower_strike():
+    # Symmetric chain: 22000 and 22050 pay out the same
+    strikes, ce, pe = [21950, 22000, 22050, 22100], [0, 0, 100, 0], [0, 100, 0, 0]
+    assert _payout(22000, strikes, ce, pe) == _payout(22050, strikes, ce, pe)
+    assert max_pain_strike(*_arrays(strikes, ce, pe)) == 22000
+    # No OI at all: every strike pays 0, the lowest wins
+    assert max_pain_strike(*_arrays(strikes, [0] * 4, [0] * 4)) == 21950
+    assert max_pain_strike(*_arrays([], [], [])) is None
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_walls_match_sorted_selection(seed):
+    rng = random.Random(seed)
+    strikes = [22000 + 50 * i for i in range(rng.randint(0, 40))]
+    oi = [rng.choice([0, 0, rng.randint(1, 4), rng.randint(1, 200_000)]) for _ in strikes]
+    n = rng.randint(0, 8)
+    expected = sorted(((s, v) for s, v in zip(strikes, oi) if v > 0), key=lambda w: (-w[1], w[0]))[:n]
+    assert _walls(*_arrays(strikes, oi), n) == expected
+
+
+def test_walls_with_zero_oi():
+    strikes = [22000, 22050, 22100, 22150]
+    assert _walls(*_arrays(strikes, [0, 0, 0, 0]), 3) == []
+    assert _walls(*_arrays(strikes, [0, 700, 0, 0]), 3) == [(22050, 700)]
+    assert _walls(*_arrays(strikes, [5, 0, 5, 9]), 2) == [(22150, 9), (22000, 5)]
+    assert _walls(*_arrays(strikes, [5, 0, 5, 9]), 0) == []
+    assert _walls(*_arrays([], []), 3) == []
+
+
+def test_support_and_resistance_around_spot():
+    strikes = [21900, 22000, 22100, 22200]
+    chain = StrikeChain.from_oi_columns(strikes, [900, 100, 300, 200], [100, 400, 800, 50])
+    levels = chain_levels(chain, 22050.0)
+    assert levels.resistance == 22100   # biggest CE wall at or above spot
+    assert levels.support == 22000      # biggest PE wall at or below spot
+    assert levels.ce_walls[0] == (21900, 900)
+    # A strike exactly at spot counts on both sides; no spot, no support/resistance
+    at_strike = chain_levels(chain, 22100.0)
+    assert (at_strike.support, at_strike.resistance) == (22100, 22100)
+    assert chain_levels(chain, None)[3:] == (None, None)
+
+
+def _levels(max_pain, support=21800, resistance=22200) -> ChainLevels:
+    return ChainLevels(max_pain, [], [], resistance, support)
+
+
+def test_level_tracker_flicker_does_not_report():
+    tracker = LevelTracker(confirm_cycles=3)
+    assert tracker.observe(_levels(22000)) == []
+    # Max pain bouncing between neighbouring strikes never holds for 3 cycles
+    for max_pain in [22050, 22000, 22050, 22050, 22000, 22050, 22100, 22050, 22000] * 3:
+        assert tracker.observe(_levels(max_pain)) == []
+    assert tracker.reported.max_pain == 22000
+
+
+def test_level_tracker_held_move_reports_once():
+    tracker = LevelTracker(confirm_cycles=3)
+    tracker.observe(_levels(22000))
+    shifts = [tracker.observe(_levels(22050, support=21900)) for _ in range(8)]
+    assert shifts[:2] == [[], []]
+    assert shifts[2] == [("max_pain", 22000, 22050), ("support", 21800, 21900)]
+    assert shifts[3:] == [[]] * 5
+    assert tracker.reported == _levels(22050, support=21900)
+
+
+def test_level_tracker_single_cycle_confirm_reports_every_change():
+    tracker = LevelTracker(confirm_cycles=1)
+    tracker.observe(_levels(22000))
+    assert tracker.observe(_levels(22050)) == [("max_pain", 22000, 22050)]
+    assert tracker.observe(_levels(22050)) == []
+    assert tracker.observe(_levels(22000)) == [("max_pain", 22050, 22000)]
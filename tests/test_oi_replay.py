@@ -0,0 +1,30 @@
+"""
+oi_replay's alert config: defaults come from the live monitor's per-symbol settings.
+"""
+from nifty_oi_monitor import SymbolState
+from oi_replay import _config_from_args, build_parser
+
+
+def _config(argv):
+    return _config_from_args(build_parser().parse_args(argv))
+
+
+def test_replay_defaults_follow_symbol_overrides(monkeypatch):
+    monkeypatch.setenv("OI_CHANGE_THRESHOLD_PERCENT_BANKNIFTY", "250")
+    monkeypatch.setenv("OI_RATIO_THRESHOLD_BANKNIFTY", "1.75")
+    monkeypatch.setenv("STRIKE_RANGE_BANKNIFTY", "9")
+    monkeypatch.setenv("VELOCITY_WINDOWS_BANKNIFTY", "5:40,20:90")
+    config = _config(["replay", "2026-03-10", "--symbol", "banknifty"])
+    assert config == SymbolState.from_env("BANKNIFTY").config
+    assert (config.change_threshold, config.ratio_threshold, config.strike_range) == (250.0, 1.75, 9)
+    assert config.velocity_windows == ((5, 40.0), (20, 90.0))
+    # Other symbols keep the global settings
+    assert _config(["replay", "2026-03-10", "--symbol", "NIFTY"]).strike_range != 9
+
+
+def test_replay_flags_override_symbol_settings(monkeypatch):
+    monkeypatch.setenv("STRIKE_RANGE_BANKNIFTY", "9")
+    config = _config(["replay", "2026-03-10", "--symbol", "BANKNIFTY", "--change", "300", "--full-chain"])
+    assert config.change_threshold == 300.0
+    assert config.strike_range == 9
+    assert config.full_chain
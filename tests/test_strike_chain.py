@@ -0,0 +1,101 @@
+"""
+StrikeChain.from_payload() against the build_strike_map() / get_spot_price_and_step() /
+find_atm_strike() it replaced, and content_digest() change detection.
+"""
+import json
+import random
+
+import pytest
+
+import baseline_reference as ref
+from nifty_oi_monitor import StrikeChain, decode_option_chain
+
+
+def _random_rows(rng, shuffle_dupes: bool):
+    step = rng.choice([25, 50, 100])
+    strikes = [20000 + step * i for i in range(rng.randint(1, 60))]
+    if shuffle_dupes:
+        strikes += rng.sample(strikes, k=len(strikes) // 5)
+    return [
+        (s, ref.random_oi(rng, missing=0.2, zero=0.1), ref.random_oi(rng, missing=0.2, zero=0.1))
+        for s in strikes
+    ]
+
+
+def _assert_parity(data: dict):
+    chain = StrikeChain.from_payload(data)
+    old_map = ref.build_strike_map(data)
+    old_spot, old_step = ref.get_spot_price_and_step(data)
+
+    assert chain.spot == old_spot
+    assert chain.step == old_step
+    assert list(chain.strikes) == sorted(old_map)
+    for strike, sides in old_map.items():
+        assert chain.get(strike) == sides
+    if old_map and old_spot is not None:
+        assert chain.atm_strike(old_spot) == ref.find_atm_strike(old_spot, sorted(old_map))
+    return chain
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_dict_of_dicts_parsing(seed):
+    rng = random.Random(seed)
+    shuffled = seed % 2 == 1
+    rows = _random_rows(rng, shuffle_dupes=shuffled)
+    spot = None if seed % 10 == 0 else round(rng.uniform(19500, 26500), 2)
+    data = ref.payload(rows, spot, rng, shuffle=shuffled)
+    _assert_parity(data)
+    # Same again after the pruning decoder
+    _assert_parity(decode_option_chain(json.dumps(data)))
+
+
+def test_strikes_without_oi_count_towards_step_only():
+    rng = random.Random(0)
+    data = ref.payload([(22000, 10, None), (22025, None, None), (22050, None, 5)], 22010.0, rng)
+    chain = _assert_parity(data)
+    assert list(chain.strikes) == [22000, 22050]
+    assert chain.step == 25
+    assert chain.get(22000) == {"CE": 10}
+    assert chain.get(22050) == {"PE": 5}
+    assert chain.get(22025) is None
+
+
+def test_atm_tie_goes_to_lower_strike():
+    chain = _assert_parity(ref.payload([(22000, 1, 1), (22050, 1, 1)], 22025.0, random.Random(0)))
+    assert chain.atm_strike(22025.0) == 22000
+
+
+@pytest.mark.parametrize("data", [
+    {},
+    {"records": {}},
+    {"records": {"data": [], "underlyingValue": 22000.0}},
+    {"records": {"data": [{"strikePrice": 22000, "CE": {"openInterest": 5}}]}},
+])
+def test_empty_and_degenerate_payloads(data):
+    chain = _assert_parity(data)
+    assert chain.step is None
+    assert len(chain) == len(ref.build_strike_map(data))
+
+
+def test_missing_underlying_value():
+    data = ref.payload([(22000, 10, 20), (22050, 30, 40)], None, random.Random(0))
+    chain = _assert_parity(data)
+    assert chain.spot is None and chain.step == 50
+
+
+def test_content_digest_tracks_every_used_field():
+    data = ref.payload([(22000 + 50 * i, 1000 + i, 2000 + i) for i in range(10)], 22210.5, random.Random(1))
+    digest = StrikeChain.from_payload(data).content_digest()
+    assert StrikeChain.from_payload(json.loads(json.dumps(data))).content_digest() == digest
+
+    def changed(edit):
+        copy = json.loads(json.dumps(data))
+        edit(copy["records"])
+        return StrikeChain.from_payload(copy).content_digest()
+
+    # NSE's timestamp alone is not content
+    assert changed(lambda r: r.update(timestamp="10-Mar-2026 10:16:00")) == digest
+    assert changed(lambda r: r.update(underlyingValue=22211.0)) != digest
+    assert changed(lambda r: r["data"][3].pop("CE")) != digest
+    for field in ("openInterest", "totalTradedVolume", "lastPrice", "impliedVolatility"):
+        assert changed(lambda r: r["data"][3]["PE"].update({field: r["data"][3]["PE"][field] + 1})) != digest
@@ -0,0 +1,166 @@
+"""
+OIVelocityTracker ring buffer and evaluate_velocity() dedup, on a fixed clock: window
+deltas against a brute-force scan of the full sample history, plus the wrap, strike
+churn and fire-once / clear / re-fire cases.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from nifty_oi_monitor import AlertConfig, OIVelocityTracker, StrikeChain, evaluate_velocity
+
+TRADING_DATE = "2026-03-10"
+STRIKES = [22000 + 50 * i for i in range(-5, 6)]
+
+
+def _chain(rows: dict) -> StrikeChain:
+    """Chain from {strike: (ce, pe)}; 0 stands in for a missing side, as the tracker reads it."""
+    strikes = sorted(rows)
+    return StrikeChain.from_oi_columns(strikes, [rows[s][0] for s in strikes], [rows[s][1] for s in strikes])
+
+
+def _reference(history: list, capacity: int, window: float):
+    """Newest retained sample at least `window` seconds older than the latest one, or None."""
+    retained = history[-capacity:]
+    latest = history[-1][0]
+    older = [sample for sample in retained if sample[0] <= latest - window]
+    return older[-1] if older else None
+
+
+def _assert_deltas(tracker: OIVelocityTracker, history: list, query: list):
+    strikes = np.array(query, dtype=np.int64)
+    now = history[-1][1]
+    for k, (window, d) in enumerate(zip(tracker.windows, tracker.deltas(strikes))):
+        ref = _reference(history, tracker.capacity, window)
+        if ref is None:
+            assert d is None, f"window {window}s should have no reference yet"
+            continue
+        assert d is not None, f"window {window}s should have a reference"
+        for i, strike in enumerate(query):
+            valid = strike in now and strike in ref[1]
+            assert bool(d["valid"][i]) == valid
+            if valid:
+                assert (d["ce_ref"][i], d["pe_ref"][i]) == ref[1][strike]
+                assert (d["ce_now"][i], d["pe_now"][i]) == now[strike]
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_deltas_match_brute_force_history(seed):
+    rng = random.Random(seed)
+    windows = (60, 300, 900)
+    capacity = rng.choice([3, 5, 8, 40])
+    tracker = OIVelocityTracker(windows, capacity)
+    universe = STRIKES + [23000, 21000]
+    oi = {s: (rng.randint(0, 50_000), rng.randint(0, 50_000)) for s in universe}
+
+    t, history = 1_773_114_000.0, []
+    for _ in range(120):
+        t += rng.choice([15, 30, 60, 60, 60, 90, 299, 300, 301])
+        for s in universe:
+            if rng.random() < 0.3:
+                oi[s] = (max(0, oi[s][0] + rng.randint(-5000, 8000)), max(0, oi[s][1] + rng.randint(-5000, 8000)))
+        present = {s: oi[s] for s in universe if rng.random() > 0.15}
+        if not present:
+            present = {STRIKES[0]: oi[STRIKES[0]]}
+        tracker.update(t, _chain(present))
+        history.append((t, present))
+        _assert_deltas(tracker, history, STRIKES + [23000, 24000])
+
+
+def test_wrap_past_capacity():
+    # 60s polls in a 4-slot ring: 180s of history at most, so a 300s window never has a reference
+    tracker = OIVelocityTracker((120, 300), capacity=4)
+    history = []
+    for n in range(25):
+        rows = {22000: (1000 + n, 2000 + n)}
+        tracker.update(60.0 * n, _chain(rows))
+        history.append((60.0 * n, rows))
+        _assert_deltas(tracker, history, [22000])
+        d120, d300 = tracker.deltas(np.array([22000]))
+        assert d300 is None
+        if n >= 2:
+            assert d120["ce_ref"][0] == 1000 + n - 2 and d120["ce_now"][0] == 1000 + n
+        else:
+            assert d120 is None
+
+
+def test_strikes_appearing_and_disappearing_mid_window():
+    tracker = OIVelocityTracker((300,), capacity=20)
+    flat = {s: (10_000, 10_000) for s in STRIKES}
+    for n in range(6):
+        tracker.update(60.0 * n, _chain(flat))
+    # 22600 is listed from t=360, 22000 drops out at t=420 and comes back at t=480
+    tracker.update(360.0, _chain({**flat, 22600: (500, 700)}))
+    tracker.update(420.0, _chain({s: v for s, v in {**flat, 22600: (900, 700)}.items() if s != 22000}))
+    query = np.array([22000, 22050, 22600])
+    d, = tracker.deltas(query)
+    assert d["valid"].tolist() == [False, True, False]  # 22000 gone now, 22600 not in the reference
+
+    tracker.update(480.0, _chain({**flat, 22000: (40_000, 10_000), 22600: (900, 700)}))
+    d, = tracker.deltas(query)
+    assert d["valid"].tolist() == [True, True, False]
+    assert (d["ce_ref"][0], d["ce_now"][0]) == (10_000, 40_000)
+    # Once the window has slid past 22600's first sample it is compared like any other strike
+    tracker.update(660.0, _chain({**flat, 22600: (1_200, 700)}))
+    d, = tracker.deltas(query)
+    assert d["valid"].tolist() == [True, True, True]
+    assert (d["ce_ref"][2], d["ce_now"][2]) == (500, 1_200)
+
+
+CONFIG = AlertConfig(velocity_windows=((5, 50.0), (15, 50.0), (30, 50.0)), velocity_min_contracts=1000)
+
+
+def _surge_run(minutes: int, ce_at):
+    """One poll a minute with CE at 22000 from `ce_at`; yields (minute, evaluate_velocity result, active)."""
+    tracker = OIVelocityTracker(tuple(m * 60 for m, _ in CONFIG.velocity_windows), capacity=80)
+    active = {}
+    strikes = np.array(STRIKES, dtype=np.int64)
+    for minute in range(minutes):
+        rows = {s: (10_000, 10_000) for s in STRIKES}
+        rows[22000] = (ce_at(minute), 10_000)
+        tracker.update(60.0 * minute, _chain(rows))
+        yield minute, evaluate_velocity(tracker, strikes, TRADING_DATE, active, CONFIG), active
+
+
+def test_surge_fires_once_across_all_windows():
+    events = []
+    for minute, res, _ in _surge_run(80, lambda m: 10_000 if m < 40 else 30_000):
+        events += [(minute, "fired", STRIKES[i], side, k) for i, side, k in res.fired]
+        events += [(minute, "cleared", strike, side, None) for strike, side in res.cleared]
+        if 41 <= minute < 70:
+            # Some window still spans the surge: held, not re-fired
+            assert [(STRIKES[i], side) for i, side, _ in res.suppressed] == [(22000, "CE")]
+    # Reported on the shortest window, cleared once the 30m window has slid past it
+    assert events == [(40, "fired", 22000, "CE", 0), (70, "cleared", 22000, "CE", None)]
+
+
+def test_key_clears_and_refires():
+    def ce_at(minute):
+        return 10_000 if minute < 40 else (30_000 if minute < 75 else 60_000)
+
+    fired, cleared = [], []
+    for minute, res, active in _surge_run(90, ce_at):
+        fired += [(minute, STRIKES[i], side, k) for i, side, k in res.fired]
+        cleared += [(minute, strike, side) for strike, side in res.cleared]
+        if minute == 72:
+            assert active[(TRADING_DATE, 22000, "CE-VEL")] is False
+    assert cleared == [(70, 22000, "CE")]
+    assert fired == [(40, 22000, "CE", 0), (75, 22000, "CE", 0)]
+
+
+def test_min_contracts_and_uncovered_windows():
+    config = CONFIG._replace(velocity_windows=((5, 50.0),))
+    tracker = OIVelocityTracker((300,), capacity=20)
+    active = {}
+    strikes = np.array([22000])
+    # No window covered yet: nothing evaluated, even on a doubling
+    tracker.update(0.0, _chain({22000: (600, 600)}))
+    tracker.update(60.0, _chain({22000: (1_200, 600)}))
+    assert evaluate_velocity(tracker, strikes, TRADING_DATE, active, config).windows == [None]
+    # +100% but only 600 contracts, under velocity_min_contracts
+    for n in range(2, 6):
+        tracker.update(60.0 * n, _chain({22000: (1_200, 600)}))
+    res = evaluate_velocity(tracker, strikes, TRADING_DATE, active, config)
+    assert res.windows[0]["ce_pct"][0] == 100.0
+    assert res.fired == [] and active == {}